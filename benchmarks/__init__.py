@@ -0,0 +1,57 @@
+"""
+Performance benchmarks for natoify (not part of the installed package).
+
+Every bench_*.py module has a cases(sizes) function yielding the Case objects
+it measures, run.py times them and writes the results as JSON.
+
+Run from the repository root with:
+    python -m benchmarks.run --output results.json
+"""
+
+from typing import Callable, NamedTuple
+
+
+class Case(NamedTuple):
+    """A single benchmark.
+
+    Parameters:
+        name (str) : Unique name of the benchmark (ex- "engine.encode")
+        fn (Callable) : The code to time
+        size (int) : Input size in bytes (0 if it doesn't apply)
+        repeat (int) : Number of timed runs
+        setup (Callable) : Called before every run, not timed
+    """
+
+    name: str
+    fn: Callable
+    size: int = 0
+    repeat: int = 5
+    setup: Callable = None
+
+
+def parse_size(size: str) -> int:
+    """Convert a size like "1K", "10M" or "512" to a number of bytes."""
+    units = {"K": 2**10, "M": 2**20, "G": 2**30}
+    size = size.strip().upper().rstrip("B")
+    if size[-1:] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def format_size(size: int) -> str:
+    """Convert a number of bytes to a short size like "1K" or "10M"."""
+    for (unit, factor) in (("G", 2**30), ("M", 2**20), ("K", 2**10)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def corpus(size: int) -> str:
+    """Deterministic plain text message of size characters, with the punctuation,
+    numbers and line breaks found in real messages."""
+    paragraph = (
+        "The quick brown fox jumps over the lazy dog. Pack my box with 5 dozen liquor jugs!\n"
+        "Is 3.14 close to pi? Meet me at 10:30, bring the map & the compass.\n"
+        "How vexingly quick daft zebras jump... STOP\n\n"
+    )
+    return (paragraph * (size // len(paragraph) + 1))[:size]
@@ -0,0 +1,78 @@
+"""
+Benchmarks of Natoify.vigenere_cipher.
+
+Compare with the original character loop from the repository root with:
+    python -m benchmarks.bench_cipher [SIZE_MB]
+"""
+
+import string
+import sys
+import time
+
+from natoify import Natoify
+
+from . import Case, corpus, format_size
+
+
+def loop_vigenere_cipher(message: str, key: str, encrypt: bool) -> str:
+    """The original character by character implementation (reference)."""
+    ciphertext = ""
+    for i in range(len(message)):
+        if message[i] == " ":
+            ciphertext += " "
+            continue
+        message_index = string.ascii_uppercase.find(message[i])
+        key_index = string.ascii_uppercase.find(key[i % len(key)])
+        if encrypt:
+            encryption_value = (message_index + key_index) % 26
+        else:
+            encryption_value = (message_index - key_index) % 26
+        ciphertext += string.ascii_uppercase[encryption_value]
+    return ciphertext
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    """Best wall time of a few runs of fn(*args), in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def cases(sizes: list):
+    nato = Natoify()
+    nato.set_code("NATO")
+    for size in sizes:
+        message = nato.encode(corpus(size))[:size]
+        encrypted = nato.vigenere_cipher(message, "NATO", encrypt=True)
+        repeat = 5 if size <= 2**20 else 1
+        label = format_size(size)
+        yield Case(f"cipher.encrypt_{label}", lambda m=message: nato.vigenere_cipher(m, "NATO", True), size, repeat)
+        yield Case(f"cipher.decrypt_{label}", lambda m=encrypted: nato.vigenere_cipher(m, "NATO", False), size, repeat)
+
+
+def main(size_mb: float = 1.0) -> dict:
+    nato = Natoify()
+    nato.set_code("NATO")
+    message = nato.encode(corpus(int(size_mb * 2**20)))[: int(size_mb * 2**20)]
+
+    encrypted = nato.vigenere_cipher(message, "NATO", encrypt=True)
+    assert encrypted == loop_vigenere_cipher(message, "NATO", True)
+    assert nato.vigenere_cipher(encrypted, "NATO", encrypt=False) == loop_vigenere_cipher(encrypted, "NATO", False)
+
+    loop = best_of(1, loop_vigenere_cipher, message, "NATO", True)
+    vectorized = best_of(5, nato.vigenere_cipher, message, "NATO", True)
+    return {
+        "size_bytes": len(message),
+        "loop_mb_per_s": len(message) / 2**20 / loop,
+        "vectorized_mb_per_s": len(message) / 2**20 / vectorized,
+        "speedup": loop / vectorized,
+    }
+
+
+if __name__ == "__main__":
+    results = main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
+    for (name, value) in results.items():
+        print(f"{name:>20}: {value:,.1f}")
@@ -0,0 +1,25 @@
+"""
+Benchmarks of natocli cold starts (a new Python process every run).
+"""
+
+import subprocess
+import sys
+
+from . import Case
+
+
+def natocli(*args: str, message: bytes = b"") -> None:
+    """Run natocli in a new process."""
+    subprocess.run(
+        [sys.executable, "-m", "natoify.natocli", *args],
+        input=message,
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+
+
+def cases(sizes: list):
+    yield Case("cli.encode_cold", lambda: natocli(message=b"Hello World!"))
+    yield Case("cli.decode_cold", lambda: natocli("-d", message=b"HOTEL ECHO LIMA LIMA OSCAR"))
+    yield Case("cli.encrypt_cold", lambda: natocli("-e", "-c", "REDNECK", message=b"Hello World!"))
+    yield Case("cli.list_codes_cold", lambda: natocli("-l"))
@@ -0,0 +1,40 @@
+"""
+Benchmarks of the Natoify engine: construction, code libraries and encode/decode.
+"""
+
+from natoify import Natoify
+from natoify.natocore.registry import CODE_REGISTRY
+
+from . import Case, corpus, format_size
+
+
+def cases(sizes: list):
+    nato = Natoify()
+    codes = sorted(CODE_REGISTRY)
+
+    def cold() -> None:
+        # Forget every indexed and parsed code library
+        CODE_REGISTRY.invalidate()
+
+    yield Case("engine.construct", Natoify, repeat=20)
+    yield Case("engine.construct_cold", Natoify, repeat=10, setup=cold)
+    yield Case("engine.load_codes", lambda: nato.load_codes(nato.CODE_LIB_DIR), repeat=10, setup=cold)
+
+    def switch_codes() -> None:
+        for code in codes:
+            nato.set_code(code)
+
+    yield Case(f"engine.set_code_all_{len(codes)}", switch_codes, repeat=10)
+    yield Case(f"engine.set_code_all_{len(codes)}_cold", lambda: (nato.load_codes(nato.CODE_LIB_DIR), switch_codes()), repeat=5, setup=cold)
+
+    for size in sizes:
+        message = corpus(size)
+        nato.set_code("NATO")
+        encoded = nato.encode(message)
+        encrypted = nato.encode(message, encrypt=True)
+        repeat = 5 if size <= 2**20 else 1
+        label = format_size(size)
+        yield Case(f"engine.encode_{label}", lambda m=message: nato.encode(m), size, repeat)
+        yield Case(f"engine.decode_{label}", lambda m=encoded: nato.decode(m), size, repeat)
+        yield Case(f"engine.encode_encrypt_{label}", lambda m=message: nato.encode(m, encrypt=True), size, repeat)
+        yield Case(f"engine.decode_decrypt_{label}", lambda m=encrypted: nato.decode(m, decrypt=True), size, repeat)
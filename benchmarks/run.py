@@ -0,0 +1,160 @@
+"""
+Run the natoify benchmarks and write the results as JSON.
+
+Examples (from the repository root):
+    python -m benchmarks.run
+        run every benchmark with the default input sizes
+    python -m benchmarks.run --sizes 1K,1M,100M --output v0.2.0.json
+        run with larger inputs and save the results
+    python -m benchmarks.run --only engine.encode --compare v0.2.0.json
+        compare with saved results, exit status is 1 if anything got slower
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import natoify
+
+from . import parse_size
+
+
+# Benchmark modules, run in this order
+MODULES = ["bench_engine", "bench_cipher", "bench_cli"]
+DEFAULT_SIZES = "1K,100K,1M"
+# Slowdown (fraction of the baseline median) reported as a regression
+DEFAULT_TOLERANCE = 0.25
+
+
+def time_case(case) -> dict:
+    """Time a benchmark case (after one untimed warm up run).
+
+    Returns:
+        result (dict): Timings of the case in seconds (and throughput if sized)
+    """
+
+    if case.setup is not None:
+        case.setup()
+    case.fn()
+
+    times = []
+    for _ in range(case.repeat):
+        if case.setup is not None:
+            case.setup()
+        start = time.perf_counter()
+        case.fn()
+        times.append(time.perf_counter() - start)
+
+    result = {
+        "name": case.name,
+        "size": case.size,
+        "repeat": case.repeat,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+    }
+    if case.size:
+        result["mb_per_s"] = case.size / 2**20 / result["median_s"]
+    return result
+
+
+def run_benchmarks(sizes: list, only: list = ()) -> dict:
+    """Run the benchmarks.
+
+    Args:
+        sizes (list): Input sizes in bytes for the sized benchmarks
+        only (list): Only run benchmarks whose name starts with one of these
+
+    Returns:
+        report (dict): Environment details ("meta") and a list of "results"
+    """
+
+    results = []
+    for module in MODULES:
+        module = importlib.import_module(f"{__package__}.{module}")
+        for case in module.cases(sizes):
+            if only and not case.name.startswith(tuple(only)):
+                continue
+            results.append(time_case(case))
+            print(format_result(results[-1]), file=sys.stderr)
+
+    meta = {
+        "natoify": natoify.__version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """Compare benchmark results with a baseline report.
+
+    Args:
+        report (dict): The new results
+        baseline (dict): Results of an earlier run
+        tolerance (float): Slowdown (fraction of the baseline) that is ignored
+
+    Returns:
+        regressions (list): (name, baseline median, new median) of the slower benchmarks
+    """
+
+    before = {result["name"]: result["median_s"] for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = before.get(result["name"])
+        if old is not None and result["median_s"] > old * (1 + tolerance):
+            regressions.append((result["name"], old, result["median_s"]))
+    return regressions
+
+
+def format_result(result: dict) -> str:
+    """One line summary of a benchmark result."""
+    line = f"{result['name']:<36} {result['median_s'] * 1000:>12.3f} ms"
+    if "mb_per_s" in result:
+        line += f" {result['mb_per_s']:>10.1f} MB/s"
+    return line
+
+
+def main(args: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Run the natoify benchmarks")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Input sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--only", action="append", default=[], help="Only run benchmarks starting with this name")
+    parser.add_argument("-o", "--output", help="Write the JSON results to this file (default: stdout)")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Slowdown ignored when comparing (default: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args(args)
+
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    report = run_benchmarks(sizes, args.only)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for (name, old, new) in regressions:
+            print(f"REGRESSION {name}: {old * 1000:.3f} ms -> {new * 1000:.3f} ms ({new / old:.2f}x)", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
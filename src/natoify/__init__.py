@@ -21,6 +21,15 @@ finally:
     del version, PackageNotFoundError
 
 from .natocore.engine import Natoify
-from .natocore.natogpt import NatoGPT
+
+
+def __getattr__(name):
+    # NatoGPT pulls in openai and tiktoken, only import it when asked for
+    if name == "NatoGPT":
+        from .natocore.natogpt import NatoGPT
+
+        return NatoGPT
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __version__ = "0.1.5"
\ No newline at end of file
@@ -19,19 +19,32 @@ Features:
 # Imports
 import os
 import shutil
+import asyncio
 import threading
+import queue
 import json
+import collections
+from typing import Callable, Iterator, Tuple
 from tkinter import filedialog, messagebox
 
 import customtkinter as ctk
 
 from natoify import Natoify
+from natoify.natocore.codec import clean_message
 from natoify import NatoGPT
 
 
 # Constants
 __version__ = "0.1.5"
 THEME_COLORS = ["blue", "dark-blue", "green"]
+CHAT_FRAME_MS = 33  # Playground refresh period (ms) while a chatGPT reply streams in
+CHAT_LOGS_PAGE = 50  # Number of saved chat sessions listed at a time
+CHAT_SEARCH_RESULTS = 50  # Number of messages listed by a chat log search
+MORE_SESSIONS = "More Sessions..."
+NATO_FRAME_MS = 16  # Natoified Text refresh period (ms) while a message is encoded/decoded
+NATO_FRAME_CHARS = 1 << 18  # Most characters added to the Natoified Text editor per frame
+NATO_CHUNK_CHARS = 1 << 16  # Characters of the message encoded/decoded at a time
+NATO_CACHE_ENTRIES = 4  # Number of Natoified Texts kept to show again without encoding/decoding
 
 # Classes
 
@@ -44,6 +57,10 @@ class NatoApp(ctk.CTk):
         encrypt (int): The encryption level to use.
         code_lib_list (list): A list of all code libraries.
         current_code_lib (str): The current code library.
+        nato_job (int): Number of the latest encode/decode job (older jobs are cancelled).
+        nato_cache (OrderedDict): Natoified Texts by (message hash, library, decode, encrypt), least recently used first.
+        nato_shown (tuple): Key of the Natoified Text in the editor (or being added to it).
+        message_hash (int): Hash of the message text (None once the message is edited).
         chat_eng (NatoGPT): The engine used to chat with chatGPT.
         log_names_list (list): A list of all chat logs.
         current_file_path (str): The path to the current file.
@@ -52,7 +69,10 @@ class NatoApp(ctk.CTk):
 
     Methods:
         tabview_callback(event Event) -> None: The callback for the tabview.
-        generate_nato_text() -> None: Generate the NATO text.
+        generate_nato_text() -> None: Generate the NATO text (in a background thread, unless cached).
+        run_nato_job(job int, txt str, decode bool, encrypt bool, results SimpleQueue) -> None: Queue the pieces of the NATO text as they are made.
+        check_nato_job(job int, key tuple, results SimpleQueue, made list) -> None: Show the queued NATO text and progress, once per frame.
+        clear_nato_cache() -> None: Forget the Natoified Texts made with the code libraries loaded.
         update_code_lib_display() -> None: Update the code library display.
         reload_code_libs() -> None: Reload the code libraries.
         open_txt_file() -> None: Open a text file.
@@ -60,9 +80,13 @@ class NatoApp(ctk.CTk):
         load_code_lib_file() -> None: Load a code library file.
         set_play_mode() -> None: Set the playground mode.
         update_playground() -> None: Update the playground.
-        add_to_chat_thread() -> None: Add to the chat thread.
+        start_chat_loop() -> None: Start the event loop that talks to chatGPT.
+        stream_chat_reply(txt str, deltas SimpleQueue) -> None: Queue the chatGPT reply as it streams in.
+        check_chat_reply(future Future, deltas SimpleQueue) -> None: Show the queued chatGPT reply, once per frame.
+        close_app() -> None: Stop the chatGPT event loop and close the window.
         save_chat_session() -> None: Save the chat session.
         update_chat_session_ddlist() -> None: Update the chat session dropdown list.
+        search_chat_sessions() -> None: Search the saved chat sessions.
         
     """
     
@@ -76,6 +100,10 @@ class NatoApp(ctk.CTk):
         self.encrypt = 0
         self.code_lib_list = []
         self.current_code_lib = "NATO"
+        self.nato_job = 0
+        self.nato_cache = collections.OrderedDict()
+        self.nato_shown = None
+        self.message_hash = None
 
         
         # When a message is open and in editor
@@ -121,9 +149,13 @@ class NatoApp(ctk.CTk):
         else:
             gpt_key = os.environ.get('OPENAI_API_KEY')
 
-        # Setup the chatGPT engine
-        self.chat_eng = NatoGPT(gpt_key)
+        # Setup the chatGPT engine, its requests run on one background event loop.
+        # Messages are journaled as they arrive, sessions lost in a crash are saved back.
+        self.chat_eng = NatoGPT(gpt_key, journal=True)
+        self.chat_eng.recover_chat_logs()
         self.log_names_list = []
+        self.start_chat_loop()
+        self.protocol("WM_DELETE_WINDOW", self.close_app)
 
     def tabview_callback(self):
         """ Callback function for when the tabview changes tab. """
@@ -148,14 +180,98 @@ class NatoApp(ctk.CTk):
             self.toppanel.file_btn.configure(state="disabled")
             
     def generate_nato_text(self):
-        """ Encode/decode and update the text in the editor. """
-        txt = self.tabview.text_msg.get("0.0", "end")
+        """ Encode/decode and update the text in the editor. The text is converted in a
+        background thread and shown as it is made, a job still running is cancelled.
+        Nothing is done if the editor already shows the text for the current message,
+        library and flags, a recently made text is shown again without converting. """
+        # The modified flags of the editors tell if the message (or the NATO text) was edited
+        txt = None
+        if self.message_hash is None or self.tabview.text_msg.edit_modified():
+            txt = self.tabview.text_msg.get("0.0", "end")
+            self.message_hash = hash(txt)
+            self.tabview.text_msg.edit_modified(False)
+        # The library is read here, the job converts with it even if it is changed meanwhile
+        code = self.nato_eng.nato.current_code
+        key = (self.message_hash, code, self.decode, bool(self.encrypt))
+        if key == self.nato_shown and not self.tabview.text_enc.edit_modified():
+            return
+
+        self.nato_job += 1
+        self.nato_shown = key
         self.tabview.text_enc.delete("0.0", "end")
-        if self.decode:
-            nato_txt = self.nato_eng.decode(txt, bool(self.encrypt))
+        self.tabview.nato_progress.set(0)
+        self.tabview.nato_progress.grid()
+
+        results = queue.SimpleQueue()
+        nato_txt = self.nato_cache.get(key)
+        if nato_txt is not None:
+            # Show the cached text a frame at a time, it is not cached again
+            self.nato_cache.move_to_end(key)
+            for start in range(0, len(nato_txt), NATO_FRAME_CHARS):
+                end = min(start + NATO_FRAME_CHARS, len(nato_txt))
+                results.put((nato_txt[start:end], end / len(nato_txt)))
+            results.put(None)
+            key = None
         else:
-            nato_txt = self.nato_eng.encode(txt, bool(self.encrypt))
-        self.tabview.text_enc.insert("0.0", nato_txt)
+            if txt is None:
+                txt = self.tabview.text_msg.get("0.0", "end")
+            args = (self.nato_job, txt, code, self.decode, bool(self.encrypt), results)
+            threading.Thread(target=self.run_nato_job, args=args, daemon=True).start()
+        self.after(NATO_FRAME_MS, self.check_nato_job, self.nato_job, key, results, [])
+
+    def run_nato_job(self, job: int, txt: str, code: str, decode: bool, encrypt: bool, results: queue.SimpleQueue):
+        """ Encode/decode the text with the given library a chunk at a time and queue each piece
+        with the progress, then None once done. Stops as soon as a newer job is started. """
+        try:
+            for piece in self.nato_eng.convert_chunks(txt, decode, encrypt, code):
+                if job != self.nato_job:
+                    return
+                results.put(piece)
+        except Exception as e:
+            results.put((f"Error: {e}", 1.0))
+        results.put(None)
+
+    def check_nato_job(self, job: int, key: tuple, results: queue.SimpleQueue, made: list):
+        """ Add the NATO text made since the last frame to the editor (in one insert, at most
+        NATO_FRAME_CHARS) and update the progress bar, check again next frame until done.
+        The pieces are kept in made, the whole text is cached under key once done (if any). """
+        if job != self.nato_job:
+            # A newer job replaced this one
+            return
+
+        pieces, size, done = [], 0, False
+        while size < NATO_FRAME_CHARS:
+            try:
+                item = results.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                done = True
+                break
+            piece, progress = item
+            pieces.append(piece)
+            size += len(piece)
+            self.tabview.nato_progress.set(progress)
+        if pieces:
+            self.tabview.text_enc.insert("end", "".join(pieces))
+            self.tabview.text_enc.edit_modified(False)
+            if key is not None:
+                made += pieces
+
+        if not done:
+            self.after(NATO_FRAME_MS, self.check_nato_job, job, key, results, made)
+            return
+
+        self.tabview.nato_progress.grid_remove()
+        if key is not None:
+            self.nato_cache[key] = "".join(made)
+            while len(self.nato_cache) > NATO_CACHE_ENTRIES:
+                self.nato_cache.popitem(last=False)
+
+    def clear_nato_cache(self):
+        """ Forget the cached Natoified Texts (ex- the code libraries were reloaded). """
+        self.nato_cache.clear()
+        self.nato_shown = None
 
     def update_code_lib_display(self):
         """ Update the code library dropdown. """
@@ -167,6 +283,7 @@ class NatoApp(ctk.CTk):
     def reload_code_libs(self):
         """ Reload the code libraries. """
         self.nato_eng.reload_libraries()
+        self.clear_nato_cache()
         self.update_code_lib_display()
 
     def open_txt_file(self):
@@ -222,12 +339,14 @@ class NatoApp(ctk.CTk):
 
         if file_path:
             self.nato_eng.add_library(file_path)
+            self.clear_nato_cache()
             self.update_code_lib_display()
             self.generate_nato_text()
 
     def set_play_mode(self, btn_name: str):
         """ Set the play mode. """
         self.tabview.save_chat_btn.configure(state="disabled")
+        self.tabview.search_chat_btn.configure(state="disabled")
         self.tabview.chat_list_dd.configure(state="disabled")
         if btn_name == "All":
             self.play_mode = "All"
@@ -239,6 +358,7 @@ class NatoApp(ctk.CTk):
             # Set the encode button to disabled
             # self.toppanel.enc_dec_btn.configure(state="disabled")
             self.tabview.save_chat_btn.configure(state="normal")
+            self.tabview.search_chat_btn.configure(state="normal")
             self.update_chat_session_ddlist()
         else:
             self.play_mode = "Current"
@@ -273,7 +393,6 @@ class NatoApp(ctk.CTk):
 
             # Encode/decode the text using each code, collect all, and update the editor
             ntxt = ""
-            curr_code = self.current_code_lib
 
             # Get the len of longest code name
             max_len = max([len(code) for code in self.code_lib_list])    
@@ -282,16 +401,13 @@ class NatoApp(ctk.CTk):
             for code in self.code_lib_list:
                 title = f"{code}:{'-'*(max_len-len(code))} "
                 ntxt += title
-                self.nato_eng.load_library(code)
+                # Use each library directly, the current library is left as is
                 if self.decode:
-                    ntxt += self.nato_eng.decode(txt, bool(self.encrypt))
+                    ntxt += self.nato_eng.decode(txt, bool(self.encrypt), code)
                 else:
-                    ntxt += self.nato_eng.encode(txt, bool(self.encrypt))
+                    ntxt += self.nato_eng.encode(txt, bool(self.encrypt), code)
                 ntxt += "\n\n"
             
-            # Reset the code library to original
-            self.nato_eng.load_library(curr_code)
-            
             # Update the editor
             self.tabview.text_play.insert("0.0", ntxt)
             # self.tabview.text_play.see("end")
@@ -307,14 +423,44 @@ class NatoApp(ctk.CTk):
             wait_txt = f"Last message tokens: {self.chat_eng.current_tokens}\nWaiting for AI response..."
             self.tabview.play_entry.insert("0.0", wait_txt) 
             
-            # Run the add_to_chat method in another thread
-            t = threading.Thread(target=self.add_to_chat_thread, args=(txt,))
-            t.start()
+            # Stream the reply on the chat event loop, and show it from Tk as it arrives
+            deltas = queue.SimpleQueue()
+            future = asyncio.run_coroutine_threadsafe(self.stream_chat_reply(txt, deltas), self.chat_loop)
+            self.after(CHAT_FRAME_MS, self.check_chat_reply, future, deltas)
+
+    def start_chat_loop(self):
+        """ Start the event loop that sends messages to chatGPT (in a background thread). """
+        self.chat_loop = asyncio.new_event_loop()
+        threading.Thread(target=self.chat_loop.run_forever, daemon=True).start()
+
+    async def stream_chat_reply(self, txt: str, deltas: queue.SimpleQueue):
+        """ Send a message to chatGPT and queue the pieces of the reply as they arrive. """
+        async for delta in self.chat_eng.astream_chat(txt):
+            deltas.put(delta)
+
+    def check_chat_reply(self, future, deltas: queue.SimpleQueue):
+        """ Add the pieces of the chatGPT reply that arrived since the last frame to the editor
+        (in one insert), check again next frame until the reply is complete. """
+        done = future.done()
+        pieces = []
+        while True:
+            try:
+                pieces.append(deltas.get_nowait())
+            except queue.Empty:
+                break
+        if pieces:
+            self.tabview.text_play.insert("end", "".join(pieces))
+            self.tabview.text_play.see("end")
 
+        if not done:
+            self.after(CHAT_FRAME_MS, self.check_chat_reply, future, deltas)
+            return
 
-    def add_to_chat_thread(self, txt: str):
-        # Send message to chatbot
-        prompt, response = self.chat_eng.add_to_chat(txt)
+        response = ""
+        try:
+            future.result()
+        except Exception as e:
+            response = f"\nError: {e}"
         
         # Update the editor
         self.tabview.play_entry.delete("0.0", "end")
@@ -322,16 +468,59 @@ class NatoApp(ctk.CTk):
         self.tabview.text_play.insert("end", f"Last Message Tokens: {self.chat_eng.current_tokens}\n{'='*60}\n")
         self.tabview.text_play.see("end")
 
+    def close_app(self):
+        """ Close the chatGPT http session, stop its event loop, drop the unsaved chat session
+        and close the window. """
+        try:
+            asyncio.run_coroutine_threadsafe(self.chat_eng.aclose(), self.chat_loop).result(timeout=5)
+        except Exception as e:
+            print(f"Error closing the chatGPT session: {e}")
+        # Closes the http session on the loop if aclose didn't finish
+        self.chat_eng.close()
+        self.chat_loop.call_soon_threadsafe(self.chat_loop.stop)
+        self.destroy()
+
     def save_chat_session(self):
         self.chat_eng.save_chat_log()
         self.update_chat_session_ddlist()
-        self.tabview.chat_list_dd.set(self.log_names_list[0])
+        if self.log_names_list:
+            self.tabview.chat_list_dd.set(self.log_names_list[0])
+
+    def update_chat_session_ddlist(self, more: bool = False):
+        """ List the newest saved chat sessions in the dropdown, or the next page of them if more. """
+        before = ""
+        if more and self.log_names_list:
+            before = self.log_names_list[-1]
+        else:
+            self.log_names_list = []
+
+        page = self.chat_eng.get_chat_logs(CHAT_LOGS_PAGE, before)
+        self.log_names_list += page
+        values = list(self.log_names_list)
+        if len(page) == CHAT_LOGS_PAGE:
+            values.append(MORE_SESSIONS)
+        values.append("New Session")
+        self.tabview.chat_list_dd.configure(values=values, state="readonly")
+        self.tabview.chat_list_dd.set((more and self.chat_eng.session_name) or "New Session")
+
+    def search_chat_sessions(self):
+        """ Search the saved chat sessions, show the messages found in the playground
+        and list their sessions (best match first) in the dropdown. """
+        query = ctk.CTkInputDialog(text="Search the saved chat logs for", title="Search Chat Logs").get_input()
+        if not query or not query.strip():
+            return
 
-    def update_chat_session_ddlist(self):
-        self.log_names_list = [os.path.basename(name) for name in self.chat_eng.get_chat_logs()]
-        self.log_names_list.append("New Session")
-        self.tabview.chat_list_dd.configure(values=self.log_names_list, state="readonly")
-        self.tabview.chat_list_dd.set("New Session")
+        hits = self.chat_eng.search_chat_logs(query, CHAT_SEARCH_RESULTS)
+        self.tabview.text_play.delete("0.0", "end")
+        self.tabview.text_play.insert("end", f"Search: {query}\n{'='*60}\n")
+        for hit in hits:
+            self.tabview.text_play.insert("end", f"{hit.session} [{hit.role} #{hit.seq}]\n{hit.snippet}\n{'*'*60}\n")
+        if not hits:
+            self.tabview.text_play.insert("end", "No saved chat log found.\n")
+
+        self.log_names_list = list(dict.fromkeys(hit.session for hit in hits))
+        self.tabview.chat_list_dd.configure(values=self.log_names_list + ["New Session"], state="readonly")
+        self.tabview.chat_list_dd.set(f"{len(self.log_names_list)} sessions found")
 
 
 
@@ -430,6 +619,7 @@ class MainTabView(ctk.CTkTabview):
         clear_code: Clear the code editor.
         set_chat_log: Set the chat log to the given chat log.
         save_chat: Save the current chat log to a file.
+        search_chat: Search the saved chat logs.
 
     """
     def __init__(self, master, **kwargs):
@@ -465,6 +655,11 @@ class MainTabView(ctk.CTkTabview):
         self.text_enc = ctk.CTkTextbox(master=self.enc_tab)
         self.text_enc.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
         self.text_enc.insert("0.0", "THIS IS THE ENCODE/DECODE EDITOR.\n")
+
+        # Progress of the encoding/decoding in the background (hidden when idle)
+        self.nato_progress = ctk.CTkProgressBar(master=self.enc_tab)
+        self.nato_progress.grid(row=1, column=0, padx=5, pady=5, sticky="ew")
+        self.nato_progress.grid_remove()
         
         self.text_play = ctk.CTkTextbox(master=self.play_tab)
         self.text_play.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
@@ -503,6 +698,11 @@ class MainTabView(ctk.CTkTabview):
         self.save_chat_btn.grid(row=1, column=0, padx=5, pady=5, sticky="sw")
         self.save_chat_btn.configure(state="disabled")
 
+        self.search_chat_btn = ctk.CTkButton(master=self.play_btns_frm, text="Search Chat Logs",
+                                             command=self.search_chat)
+        self.search_chat_btn.grid(row=2, column=0, padx=5, pady=5, sticky="sw")
+        self.search_chat_btn.configure(state="disabled")
+
         self.play_entry = ctk.CTkTextbox(master=self.play_btns_frm)
         self.play_entry.grid(row=0, column=1, rowspan=2, padx=5, pady=5, sticky="ew")
 
@@ -580,6 +780,9 @@ class MainTabView(ctk.CTkTabview):
             self.text_play.delete("0.0", "end")
             self.master.chat_eng.set_new_session()
             return
+        elif chat_log == MORE_SESSIONS:
+            self.master.update_chat_session_ddlist(more=True)
+            return
         else:
             self.chat_list_dd.set(chat_log)
             session_txt = self.master.chat_eng.load_chat_log(chat_log)
@@ -590,14 +793,19 @@ class MainTabView(ctk.CTkTabview):
         """ Save the current chat log to a file. """
         self.master.save_chat_session()
 
+    def search_chat(self) -> None:
+        """ Search the saved chat logs. """
+        self.master.search_chat_sessions()
+
 
 
 class NatoEngine():
     """ The main engine for natoify. 
     
     Methods:
-        encode(text str, encrypt bool) -> str: Encode the given text using the given library.
-        decode(text str, encrypt bool) -> str: Decode the given text using the given library.
+        encode(text str, encrypt bool, code str) -> str: Encode the given text using the given library.
+        decode(text str, encrypt bool, code str) -> str: Decode the given text using the given library.
+        convert_chunks(text str, decode bool, encrypt bool, code str) -> Iterator: Encode/decode the given text a chunk at a time.
         load_library(library str) -> None: Load and set the given library.
         add_library(lib_file_path str) -> None: Add the given library (json file) to the code library.
         list_libs() -> list: Return a list of the available code libraries.
@@ -610,13 +818,42 @@ class NatoEngine():
         self.code_lib_path = self.nato.CODE_LIB_DIR
         self.current_code = self.nato.current_code
 
-    def encode(self, text: str, encrypt: bool) -> str:
-        """ Encode the given text using the given library. """
-        return self.nato.encode(text, encrypt)
-
-    def decode(self, text: str, encrypt: bool) -> str:
-        """ Decode the given text using the given library. """
-        return self.nato.decode(text, encrypt)
+    def encode(self, text: str, encrypt: bool, code: str = "") -> str:
+        """ Encode the given text using the given library (default: the current library). """
+        return self.nato.encode(text, encrypt, code=code)
+
+    def decode(self, text: str, encrypt: bool, code: str = "") -> str:
+        """ Decode the given text using the given library (default: the current library). """
+        return self.nato.decode(text, encrypt, code=code)
+
+    def convert_chunks(self, text: str, decode: bool, encrypt: bool, code: str = "") -> Iterator[Tuple[str, float]]:
+        """ Encode/decode the given text NATO_CHUNK_CHARS at a time, returning an iterator of
+        each piece of the result with the fraction of the text done. The joined pieces are the
+        same as encode/decode, with the library given (default: the one current when called). """
+        codec = self.nato.codec(code)
+        if decode:
+            convert = codec.decode_stream
+        else:
+            # Web encoding may span chunks, remove it from the whole text first (as encode does)
+            if "&" in text:
+                text = clean_message(text)
+                if text == "":
+                    return iter(())
+            convert = codec.encode_stream
+        return self._convert_pieces(convert, text, encrypt)
+
+    def _convert_pieces(self, convert: Callable, text: str, encrypt: bool) -> Iterator[Tuple[str, float]]:
+        """ Yield the pieces converted from the chunks of text with the fraction of the text done. """
+        done = 0
+
+        def chunks() -> Iterator[str]:
+            nonlocal done
+            for start in range(0, len(text), NATO_CHUNK_CHARS):
+                done = min(start + NATO_CHUNK_CHARS, len(text))
+                yield text[start:done]
+
+        for piece in convert(chunks(), encrypt):
+            yield piece, done / len(text)
 
     def load_library(self, library: str) -> None:
         """ Load and set the given library. """
@@ -643,7 +880,9 @@ class NatoEngine():
                 lib_dest_path = os.path.join(self.nato.CODE_LIB_DIR, os.path.basename(lib_file_name))
 
         shutil.copy(lib_file_path, lib_dest_path)
+        self.nato.CODE_LIBRARY.invalidate()
         self.nato.load_codes()
+        self.current_code = self.nato.current_code
 
     def list_libraries(self) -> list:
         """ Return a list of all available libraries. """
@@ -651,7 +890,7 @@ class NatoEngine():
     
     def reload_libraries(self) -> None:
         """ Reload the list of libraries. """
-        self.nato.CODE_LIBRARY = {}
+        self.nato.CODE_LIBRARY.invalidate()
         self.nato.load_codes()
         self.current_code = self.nato.current_code
 
@@ -12,6 +12,10 @@ Options:
     -c, --code CODE          Code library to use for encryption/decryption
     -l, --list-codes         List available code libraries
     -r, --repl               Run in interactive mode. Type input -> get output
+    -s, --stream             Encode/decode the input in chunks as it is read (constant memory)
+    --chunk-size BYTES       Number of bytes read at a time in stream mode (default: 65536)
+    -j, --jobs N             Encode/decode in N processes (streams the input, chunk-size per task)
+    --search-chats QUERY     Search the chat logs saved by the desktop app and exit
     --help                   Show this message and exit.
 
 Examples:   
@@ -33,18 +37,36 @@ Examples:
     >>>natoify -m - -o output.txt
         encode stdin using NATO code and write to output.txt
 
+    >>>natoify -m - -o - --stream
+        encode stdin in chunks as it arrives and write each chunk to stdout
+
+    >>>natoify -m big.txt -o output.txt -j 8 --chunk-size 1048576
+        encode big.txt using 8 processes, 1MB of text per task
+
     >>>natoify -r
         run in interactive mode. Type input -> get output
 
     >>>natoify -l
         list available code libraries
 
+    >>>natoify --search-chats "code library"
+        list the saved chat messages containing 'code' and 'library', best match first
+
 
 """
 
+import codecs
+import itertools
+import os
+from typing import BinaryIO, Iterator
+
 import click
 
 from natoify import Natoify
+from natoify.natocore.chatstore import ChatLogStore
+
+# Chat logs saved by the desktop app (see NatoGPT.CHAT_LOG_DIR)
+CHAT_LOG_STORE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "chat_log", "chat_logs.sqlite3")
 
 
 def show_codes(nato: Natoify) -> None:
@@ -83,6 +105,59 @@ def try_set_code(code: str, nato: Natoify) -> bool:
     return success
 
 
+def search_chat_logs(query: str, store_path: str = CHAT_LOG_STORE, limit: int = 20) -> None:
+    """Send the saved chat messages matching a search to stdout, best match first
+
+    Args:
+        query (str): The words to search for
+        store_path (str): Path of the chat log store
+        limit (int): Maximum number of messages listed
+
+    Returns:
+        None
+
+    """
+    if not os.path.exists(store_path):
+        click.echo("No saved chat logs.")
+        return
+    store = ChatLogStore(store_path)
+    try:
+        hits = store.search(query, limit)
+    finally:
+        store.close()
+    if not hits:
+        click.echo(f"No saved chat log found for '{query}'.")
+    for hit in hits:
+        click.echo(f"{hit.session} [{hit.role} #{hit.seq}]")
+        click.echo(f"\t{hit.snippet}")
+
+
+def read_chunks(message: BinaryIO, chunk_size: int) -> Iterator[str]:
+    """Read a binary file (or stdin) in chunks and decode them as UTF-8 text.
+    Decoding is incremental, so characters split between chunks are kept whole.
+
+    Args:
+        message (BinaryIO): File to read
+        chunk_size (int): Maximum number of bytes to read at a time
+
+    Yields:
+        str: The next piece of text
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    # Prefer read1 so pipes are processed as data arrives, not a full chunk later
+    read = getattr(message, "read1", message.read)
+    while True:
+        data = read(chunk_size)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
 def interactive_mode(code: str = "NATO") -> None:
     """Run natoify in interactive mode
 
@@ -175,7 +250,10 @@ def interactive_mode(code: str = "NATO") -> None:
     help="Message is to be encrypted (or decrypted if decoding))",
 )
 @click.option(
-    "-c", "--code", default="NATO", help="Code library to use for encryption/decryption"
+    "-c",
+    "--code",
+    default="NATO",
+    help="Code library to use for encryption/decryption ('auto' to detect it and any encryption when decoding)",
 )
 @click.option(
     "-l", "--list-codes", is_flag=True, default=False, help="List available codes"
@@ -187,7 +265,34 @@ def interactive_mode(code: str = "NATO") -> None:
     default=False,
     help="Run in interactive mode. Type input -> get output",
 )
-def run(message, output, decode, encrypted, code, list_codes, repl):
+@click.option(
+    "-s",
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="Encode/decode the input in chunks as it is read (constant memory)",
+)
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=65536,
+    show_default=True,
+    help="Number of bytes read at a time in stream mode (and per task with --jobs)",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of processes used to encode/decode (more than 1 implies --stream)",
+)
+@click.option(
+    "--search-chats",
+    metavar="QUERY",
+    default=None,
+    help="Search the chat logs saved by the desktop app (end a word with * to match a prefix)",
+)
+def run(message, output, decode, encrypted, code, list_codes, repl, stream, chunk_size, jobs, search_chats):
     """
     Welcome to the NATOify command line interface!
     This program will encode or decode a message using the NATO phonetic alphabet.
@@ -207,6 +312,11 @@ def run(message, output, decode, encrypted, code, list_codes, repl):
 
             decode message.txt using REDNECK code without decryption
 
+        >>>natoify -m message.txt -o output.txt -d -c auto
+
+            decode message.txt using the code detected from the message
+            (decrypted if it is found to be encrypted)
+
         >>>natoify -m message.txt -o -
 
             encode message.txt using NATO code and write to stdout
@@ -219,6 +329,14 @@ def run(message, output, decode, encrypted, code, list_codes, repl):
 
             encode stdin using NATO code and write to output.txt
 
+        >>>natoify -m - -o - --stream
+
+            encode stdin in chunks as it arrives and write each chunk to stdout
+
+        >>>natoify -m big.txt -o output.txt -j 8 --chunk-size 1048576
+
+            encode big.txt using 8 processes, 1MB of text per task
+
         >>>natoify -r
 
             run in interactive mode. Type input -> get output
@@ -227,6 +345,10 @@ def run(message, output, decode, encrypted, code, list_codes, repl):
 
             list available code libraries
 
+        >>>natoify --search-chats "code library"
+
+            list the saved chat messages containing 'code' and 'library', best match first
+
         >>>natoify -h
 
             show this help message
@@ -243,6 +365,10 @@ def run(message, output, decode, encrypted, code, list_codes, repl):
         nato = Natoify()
         show_codes(nato)
         exit(0)
+    elif search_chats is not None:
+        # Search the saved chat logs and exit
+        search_chat_logs(search_chats, CHAT_LOG_STORE)
+        exit(0)
     elif repl:
         # Run in interactive mode and exit
         interactive_mode(code)
@@ -252,13 +378,60 @@ def run(message, output, decode, encrypted, code, list_codes, repl):
         # Initialize natoify engine
         nato = Natoify()
 
+        # Detect the code library from the start of the message
+        auto_code = code.upper() == "AUTO"
+        if auto_code and not decode:
+            click.echo("Error: code 'auto' can only be used when decoding (-d).")
+            exit(1)
+
         # Set code for encoding/decoding
-        if not try_set_code(code, nato):
+        if not auto_code and not try_set_code(code, nato):
             click.echo(
                 f"Error: '{code}' is not a valid code. Use --list-codes to see available options."
             )
             exit(1)
 
+        if stream or jobs > 1:
+            # Encode or decode chunk by chunk, writing each one as soon as it is ready
+            chunks = read_chunks(message, chunk_size)
+            first = next(chunks, "")
+            if not first:
+                click.echo("Error reading input. Input cannot be empty.")
+                exit(1)
+            chunks = itertools.chain([first], chunks)
+            if auto_code:
+                # Detect the code from the start of the message, then put it back
+                start = []
+                for chunk in chunks:
+                    start.append(chunk)
+                    if sum(map(len, start)) >= 1024:
+                        break
+                detected = nato.detect_encryption("".join(start), True if encrypted else None)
+                try_set_code(detected.code or nato.current_code, nato)
+                encrypted = detected.encrypted
+                chunks = itertools.chain(start, chunks)
+            if jobs > 1:
+                # Shards of the input are handled by a pool of processes
+                from natoify.natocore.parallel import decode_parallel, encode_parallel
+
+                code = nato.current_code
+                if decode:
+                    nato_chunks = decode_parallel(chunks, code, encrypted, jobs, chunk_size)
+                else:
+                    nato_chunks = encode_parallel(chunks, code, encrypted, jobs, chunk_size)
+            elif decode:
+                nato_chunks = nato.decode_stream(chunks, encrypted)
+            else:
+                nato_chunks = nato.encode_stream(chunks, encrypted)
+            try:
+                for nato_chunk in nato_chunks:
+                    output.write(nato_chunk.encode("utf-8"))
+                    output.flush()
+            except ValueError as e:
+                click.echo(f"Error: {e}")
+                exit(1)
+            return
+
         # Read message from file or stdin
         msg = message.read()
         if msg == "" or msg == None:
@@ -270,7 +443,7 @@ def run(message, output, decode, encrypted, code, list_codes, repl):
 
         # Encode or decode message using natoify engine
         if decode:
-            nato_msg = nato.decode(msg, encrypted)
+            nato_msg = nato.decode(msg, encrypted, code="auto" if auto_code else "")
         else:
             nato_msg = nato.encode(msg, encrypted)
 
@@ -8,6 +8,20 @@ decrypting messages. A command line interface and customtkinter desktop app is a
 included for easy use. 
 """
 
+from .codec import Codec
 from .engine import Natoify
-from .natogpt import NatoGPT
+from .registry import CodeRegistry, CODE_REGISTRY
 
+
+def __getattr__(name):
+    # NatoGPT pulls in openai and tiktoken, only import it when asked for
+    if name == "NatoGPT":
+        from .natogpt import NatoGPT
+
+        return NatoGPT
+    # The reply cache is only used with NatoGPT
+    if name == "ResponseCache":
+        from .chatcache import ResponseCache
+
+        return ResponseCache
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
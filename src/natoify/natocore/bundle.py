@@ -0,0 +1,285 @@
+"""
+Precompiled binary bundle of the json code libraries found in a directory.
+
+Parsing 100+ small json files is the main cost of listing or loading code libraries,
+so they are compiled once into a single bundle that is opened with mmap. The bundle
+is rebuilt automatically when a code.json file is added, removed or modified
+(detected from the file names, sizes and modification times).
+
+Build a bundle by hand with:
+    python -m natoify.natocore.bundle [DIRECTORY]
+
+Layout (little-endian):
+    header    : magic, version, string count, library count, source fingerprint
+    strings   : (offset, length) per interned string, then the utf-8 string data
+    libraries : (name, file, forward offset, forward count, reverse offset, reverse count)
+    pairs     : (letter, word) string ids of the forward tables and
+                (word, letter) string ids of the reverse tables
+"""
+
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+
+BUNDLE_MAGIC = b"NATOBNDL"
+BUNDLE_VERSION = 1
+BUNDLE_NAME = "_codes.bundle"
+
+_HEADER = struct.Struct("<8sIII32s")
+_STRING = struct.Struct("<II")
+_LIBRARY = struct.Struct("<IIIIII")
+_PAIR = struct.Struct("<II")
+
+
+def source_fingerprint(json_files: list) -> bytes:
+    """Fingerprint a list of code.json files from their names, sizes and mtimes.
+
+    Args:
+        json_files (list): Paths to the code.json files
+
+    Returns:
+        fingerprint (bytes): sha256 digest identifying the state of the files
+    """
+
+    digest = hashlib.sha256()
+    for json_file in sorted(json_files):
+        stat = os.stat(json_file)
+        digest.update(f"{os.path.basename(json_file)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.digest()
+
+
+def default_bundle_paths(directory: str) -> list:
+    """Candidate bundle locations for a directory, in order of preference.
+    The bundle lives next to the code.json files, or in the user cache directory
+    when the code library directory is read-only.
+
+    Args:
+        directory (str): The directory containing the code.json files
+
+    Returns:
+        paths (list): Bundle file paths
+    """
+
+    directory = os.path.realpath(directory)
+    dir_hash = hashlib.sha256(directory.encode("utf-8")).hexdigest()[:16]
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return [
+        os.path.join(directory, BUNDLE_NAME),
+        os.path.join(cache_dir, "natoify", f"codes-{dir_hash}.bundle"),
+    ]
+
+
+def build_bundle(directory: str, bundle_path: str = "") -> str:
+    """Compile the code.json files of a directory into a binary bundle.
+    Libraries are added in file name order, a name already added is kept.
+
+    Args:
+        directory (str): The directory containing the code.json files
+        bundle_path (str): Where to write the bundle (default: next to the code.json files)
+
+    Raises:
+        FileNotFoundError: If the directory has no code.json files
+        json.decoder.JSONDecodeError: If a code.json file is improperly formatted
+
+    Returns:
+        bundle_path (str): Path of the written bundle
+    """
+
+    if bundle_path == "":
+        bundle_path = default_bundle_paths(directory)[0]
+
+    json_files = sorted(glob.glob(f"{directory}/*.json"))
+    if len(json_files) == 0:
+        raise FileNotFoundError(f"No code.json files found in: {directory}")
+    fingerprint = source_fingerprint(json_files)
+
+    # Intern every string (names, letters and words are stored once)
+    strings = {}
+
+    def intern(s: str) -> int:
+        return strings.setdefault(s, len(strings))
+
+    libraries = []
+    for json_file in json_files:
+        with open(json_file, "r") as f:
+            codes = json.load(f)
+        file_id = intern(os.path.basename(json_file))
+        for name, table in codes.items():
+            if any(lib[0] == name for lib in libraries):
+                continue
+            forward = [(intern(letter), intern(word)) for (letter, word) in table.items()]
+            # Later letters win on duplicate words, same as a reversed dict
+            reverse = {word: letter for (letter, word) in forward}
+            libraries.append((name, intern(name), file_id, forward, list(reverse.items())))
+
+    # Lay out the sections one after the other
+    encoded = [s.encode("utf-8") for s in strings]
+    offset = _HEADER.size + _STRING.size * len(encoded) + _LIBRARY.size * len(libraries)
+    string_index = []
+    for data in encoded:
+        string_index.append(_STRING.pack(offset, len(data)))
+        offset += len(data)
+
+    library_index = []
+    pair_data = []
+    for (_, name_id, file_id, forward, reverse) in libraries:
+        fwd_offset = offset
+        offset += _PAIR.size * len(forward)
+        rev_offset = offset
+        offset += _PAIR.size * len(reverse)
+        library_index.append(
+            _LIBRARY.pack(name_id, file_id, fwd_offset, len(forward), rev_offset, len(reverse))
+        )
+        pair_data.extend(_PAIR.pack(*pair) for pair in forward)
+        pair_data.extend(_PAIR.pack(*pair) for pair in reverse)
+
+    header = _HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(encoded), len(libraries), fingerprint)
+
+    # Write to a temporary file first so readers never see a partial bundle
+    os.makedirs(os.path.dirname(bundle_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(bundle_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(b"".join(string_index))
+            f.write(b"".join(library_index))
+            f.write(b"".join(encoded))
+            f.write(b"".join(pair_data))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, bundle_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return bundle_path
+
+
+class CodeBundle:
+    """
+    Read-only view of a binary code library bundle, backed by mmap.
+
+    Parameters:
+        path (str) : Path of the bundle file
+        fingerprint (bytes) : Fingerprint of the code.json files the bundle was built from
+
+    Methods:
+        names () -> list : Library names in the bundle
+        source (name str) -> str : File name of the code.json file a library came from
+        forward (name str) -> dict : Code words keyed by letter
+        reverse (name str) -> dict : Letters keyed by code word
+        close () -> None : Release the mapped file
+    """
+
+    def __init__(self, path: str):
+        """Map the bundle file and read its library index.
+
+        Args:
+            path (str): Path of the bundle file
+
+        Raises:
+            ValueError: If the file is not a bundle of the current version
+        """
+
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mm) < _HEADER.size:
+            self.close()
+            raise ValueError(f"Not a code library bundle: {path}")
+        magic, version, n_strings, n_libraries, self.fingerprint = _HEADER.unpack_from(self._mm, 0)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            self.close()
+            raise ValueError(f"Not a version {BUNDLE_VERSION} code library bundle: {path}")
+
+        self._strings = [None] * n_strings
+        self._libraries = {}
+        lib_offset = _HEADER.size + _STRING.size * n_strings
+        for entry in _LIBRARY.iter_unpack(self._mm[lib_offset : lib_offset + _LIBRARY.size * n_libraries]):
+            self._libraries[self._string(entry[0])] = entry[1:]
+
+    def _string(self, string_id: int) -> str:
+        """Decode an interned string (once)."""
+        s = self._strings[string_id]
+        if s is None:
+            offset, length = _STRING.unpack_from(self._mm, _HEADER.size + _STRING.size * string_id)
+            s = self._strings[string_id] = self._mm[offset : offset + length].decode("utf-8")
+        return s
+
+    def _pairs(self, offset: int, count: int) -> dict:
+        """Decode a table of string id pairs."""
+        string = self._string
+        return {
+            string(key): string(value)
+            for (key, value) in _PAIR.iter_unpack(self._mm[offset : offset + _PAIR.size * count])
+        }
+
+    def names(self) -> list:
+        """Library names in the bundle."""
+        return list(self._libraries)
+
+    def source(self, name: str) -> str:
+        """File name of the code.json file a library was compiled from."""
+        return self._string(self._libraries[name][0])
+
+    def forward(self, name: str) -> dict:
+        """Code words of a library keyed by letter."""
+        _, fwd_offset, fwd_count, _, _ = self._libraries[name]
+        return self._pairs(fwd_offset, fwd_count)
+
+    def reverse(self, name: str) -> dict:
+        """Letters of a library keyed by code word."""
+        _, _, _, rev_offset, rev_count = self._libraries[name]
+        return self._pairs(rev_offset, rev_count)
+
+    def close(self) -> None:
+        """Release the mapped file."""
+        self._mm.close()
+
+
+def load_bundle(directory: str):
+    """Open the up to date bundle of a directory, building it if it is missing or stale.
+
+    Args:
+        directory (str): The directory containing the code.json files
+
+    Returns:
+        bundle (CodeBundle): The bundle, or None if none could be opened or built
+            (ex- read-only locations or an improperly formatted code.json file)
+    """
+
+    json_files = glob.glob(f"{directory}/*.json")
+    if len(json_files) == 0:
+        return None
+    fingerprint = source_fingerprint(json_files)
+
+    paths = default_bundle_paths(directory)
+    for path in paths:
+        try:
+            bundle = CodeBundle(path)
+        except (OSError, ValueError):
+            continue
+        if bundle.fingerprint == fingerprint:
+            return bundle
+        bundle.close()
+
+    for path in paths:
+        try:
+            return CodeBundle(build_bundle(directory, path))
+        except OSError:
+            continue
+        except ValueError:
+            # Improperly formatted code.json file, let the json loader report it
+            return None
+    return None
+
+
+if __name__ == "__main__":
+    CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+    code_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(CURRENT_DIR, "../code_lib")
+    print(f"Bundle written to: {build_bundle(code_dir)}")
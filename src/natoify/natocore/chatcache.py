@@ -0,0 +1,185 @@
+"""
+On-disk cache of chatGPT replies, keyed by the state of the conversation.
+
+Sending the same messages to the same model (ex- generating a code library from
+chat_log/gpt_library_prompt.txt again) returns the cached reply instead of calling
+the api. Replies are stored as one small json file each, named by the sha256 of the
+model, the messages and the request parameters. Recently used replies are also kept
+in memory. The least recently used files are evicted once the cache grows past its
+size limit (a hit refreshes the modification time of its file, so the order of use
+carries over to the next session).
+
+A cache directory filled beforehand can be used offline, ex- for tests.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+class ResponseCache:
+    """
+    Cache of chatGPT replies on disk, with an in-memory front cache.
+
+    Parameters:
+        directory (str) : Directory holding the cached replies
+        max_bytes (int) : Size limit of the cached files
+        memory_entries (int) : Number of replies also kept in memory
+        hits (int) : Number of replies found in the cache
+        misses (int) : Number of replies not found in the cache
+
+    Methods:
+        key (model str, messages list, **params) -> str : Cache key of a request
+        get (key str) -> str : Cached reply of a request (None if not cached)
+        put (key str, reply str) -> None : Cache the reply of a request
+        clear () -> None : Remove every cached reply
+
+    Examples:
+        >>> cache = ResponseCache()
+        >>> key = ResponseCache.key("gpt-3.5-turbo", [{"role": "user", "content": "Hi"}])
+        >>> cache.put(key, "Hello!")
+        >>> cache.get(key)
+        'Hello!'
+    """
+
+    def __init__(self, directory: str = "", max_bytes: int = 64 << 20, memory_entries: int = 256):
+        """Open (or create) a cache directory.
+
+        Args:
+            directory (str): Directory holding the cached replies (default: the user cache directory)
+            max_bytes (int): Size limit of the cached files (default: 64 MiB)
+            memory_entries (int): Number of replies also kept in memory (default: 256)
+        """
+
+        if directory == "":
+            cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+            directory = os.path.join(cache_dir, "natoify", "chat")
+        os.makedirs(directory, exist_ok=True)
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = collections.OrderedDict()  # Key -> reply, least recently used first
+        self._sizes = collections.OrderedDict()  # Key -> size of its file, least recently used first
+        files = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.is_file():
+                    stat = entry.stat()
+                    files.append((stat.st_mtime_ns, entry.name[:-5], stat.st_size))
+        for (_, key, size) in sorted(files):
+            self._sizes[key] = size
+        self._total = sum(self._sizes.values())
+
+    @staticmethod
+    def key(model: str, messages: list, **params) -> str:
+        """Cache key of a chat completion request.
+
+        Args:
+            model (str): The chatGPT model
+            messages (list): The messages sent (after trimming)
+            **params: Other parameters changing the reply (ex- temperature)
+
+        Returns:
+            key (str): sha256 hex digest of the request
+        """
+
+        request = json.dumps([model, messages, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key: str, reply: str) -> None:
+        """Keep a reply in memory, forgetting the least recently used one if full."""
+        self._memory[key] = reply
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> str:
+        """Cached reply of a request.
+
+        Args:
+            key (str): Cache key of the request (see key)
+
+        Returns:
+            reply (str): The cached reply, or None if not cached
+        """
+
+        with self._lock:
+            path = self._path(key)
+            reply = self._memory.get(key)
+            if reply is None:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        reply = json.load(f)["reply"]
+                except (OSError, ValueError, KeyError):
+                    self.misses += 1
+                    return None
+
+            self._remember(key, reply)
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+            self.hits += 1
+            return reply
+
+    def put(self, key: str, reply: str) -> None:
+        """Cache the reply of a request, evicting the least recently used replies
+        if the cache grows past max_bytes.
+
+        Args:
+            key (str): Cache key of the request (see key)
+            reply (str): The reply
+        """
+
+        data = json.dumps({"reply": reply}, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._remember(key, reply)
+
+            # Write to a temporary file first so readers never see a partial reply
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+            self._total += len(data) - self._sizes.get(key, 0)
+            self._sizes[key] = len(data)
+            self._sizes.move_to_end(key)
+
+            # Remove the least recently used files (never the one just written)
+            while self._total > self.max_bytes and len(self._sizes) > 1:
+                old_key, size = self._sizes.popitem(last=False)
+                try:
+                    os.unlink(self._path(old_key))
+                except OSError:
+                    pass
+                self._total -= size
+                self._memory.pop(old_key, None)
+
+    def clear(self) -> None:
+        """Remove every cached reply (the hit and miss counters are kept)."""
+
+        with self._lock:
+            for key in self._sizes:
+                try:
+                    os.unlink(self._path(key))
+                except OSError:
+                    pass
+            self._sizes.clear()
+            self._memory.clear()
+            self._total = 0
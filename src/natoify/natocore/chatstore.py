@@ -0,0 +1,394 @@
+"""
+Indexed store of saved chatGPT sessions, kept in a SQLite database next to the chat logs.
+
+Every session is one row of an index (name, timestamps, message count and token
+total) and its messages are rows of a second table. Listing sessions reads one page
+of the index (most recently updated first) and loading a session reads its messages
+a page at a time, so neither depends on how many sessions are saved.
+
+Chat logs saved by older versions (one chat_<date-time>.json file per session) are
+imported the first time the store sees them. Every file looked at is recorded with
+its modification time (and the session it became, if any), so later imports only
+read files that are new or changed since.
+
+Message contents are also indexed for full-text search (a SQLite FTS5 table using
+the messages table as its content). Triggers keep the index up to date as messages
+are saved, so a search only reads the posting lists of its terms and returns the
+best matches (bm25 ranking) whatever the number of sessions. If the sqlite3 library
+was built without FTS5, searching falls back to scanning the messages.
+
+Tables:
+    sessions     : id, name, created, updated, message_count, token_total
+    messages     : id, session_id, seq, role, content, name, tokens
+    messages_fts : full-text index of messages.content (rowid = messages.id)
+    json_logs    : file, mtime, session (NULL if the file could not be imported)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable, NamedTuple
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    token_total INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_by_update ON sessions (updated, id);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    name TEXT,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS json_logs (
+    file TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    session TEXT
+);
+"""
+
+_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE messages_fts USING fts5 (content, content='messages', content_rowid='id', prefix='2 3');
+CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+
+class ChatSession(NamedTuple):
+    """Index entry of a saved chat session (timestamps are seconds since the epoch)."""
+
+    name: str
+    created: float
+    updated: float
+    message_count: int
+    token_total: int
+
+
+class ChatSearchHit(NamedTuple):
+    """A message matching a search (lower scores are better matches)."""
+
+    session: str
+    seq: int
+    role: str
+    snippet: str
+    score: float
+
+
+def _match_query(query: str) -> str:
+    """FTS5 query matching messages with every word of a search (a trailing * matches a prefix)."""
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class ChatLogStore:
+    """
+    Saved chat sessions, indexed in a SQLite database.
+
+    Parameters:
+        path (str) : Path of the database file
+
+    Methods:
+        save_session (name str, messages list, tokens list) -> str : Save a new chat session
+        append_messages (name str, messages list, tokens list) -> None : Add messages to a saved session
+        list_sessions (limit int, before ChatSession) -> list : One page of the saved sessions, newest first
+        session (name str) -> ChatSession : Index entry of a saved session
+        load_messages (name str, offset int, limit int) -> list : One page of the messages of a session
+        search (query str, limit int) -> list : Messages matching a search, best matches first
+        import_json_logs (directory str, count_tokens Callable) -> list : Import chat logs saved as json files
+        close () -> None : Close the database
+
+    Examples:
+        >>> store = ChatLogStore("chat_log/chat_logs.sqlite3")
+        >>> store.save_session("chat_2023-06-01-12-00-00", [{"role": "user", "content": "Hi"}], [5])
+        'chat_2023-06-01-12-00-00'
+        >>> [s.name for s in store.list_sessions(limit=10)]
+        ['chat_2023-06-01-12-00-00']
+    """
+
+    def __init__(self, path: str):
+        """Open (or create) the database of a chat log store.
+
+        Args:
+            path (str): Path of the database file
+        """
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("PRAGMA foreign_keys = ON")
+            self._db.executescript(_SCHEMA)
+        self.full_text = self._create_search_index()
+
+    def _create_search_index(self) -> bool:
+        """Create the full-text index of the messages (indexing the messages saved
+        before it existed). Returns False if FTS5 is not available."""
+
+        if self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone():
+            return True
+        try:
+            self._db.executescript(
+                "BEGIN;" + _SEARCH_SCHEMA + "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild');COMMIT;"
+            )
+        except sqlite3.OperationalError:
+            if self._db.in_transaction:
+                self._db.rollback()
+            return False
+        return True
+
+    def _unique_name(self, name: str) -> str:
+        """Add a numbered suffix to a session name already used."""
+        unique, n = name, 1
+        while self._db.execute("SELECT 1 FROM sessions WHERE name = ?", (unique,)).fetchone():
+            unique, n = f"{name}-{n}", n + 1
+        return unique
+
+    def save_session(self, name: str, messages: list, tokens: list, created: float = 0) -> str:
+        """Save a new chat session (a numbered suffix is added if the name is taken).
+
+        Args:
+            name (str): Name of the session, ex- chat_2023-06-01-12-00-00
+            messages (list): The messages of the session
+            tokens (list): Number of tokens of each message
+            created (float): Time the session was saved (default: now)
+
+        Returns:
+            name (str): The name the session was saved as
+        """
+
+        with self._lock, self._db:
+            return self._insert_session(name, messages, tokens, created or time.time())
+
+    def _insert_session(self, name: str, messages: list, tokens: list, created: float) -> str:
+        """Insert a new session and its messages, returns the name it was saved as."""
+        name = self._unique_name(name)
+        cursor = self._db.execute(
+            "INSERT INTO sessions (name, created, updated, message_count, token_total) VALUES (?, ?, ?, ?, ?)",
+            (name, created, created, len(messages), sum(tokens)),
+        )
+        self._insert_messages(cursor.lastrowid, 0, messages, tokens)
+        return name
+
+    def append_messages(self, name: str, messages: list, tokens: list) -> None:
+        """Add messages to the end of a saved session.
+
+        Args:
+            name (str): Name of the session
+            messages (list): The new messages
+            tokens (list): Number of tokens of each message
+
+        Raises:
+            KeyError: If there is no such session
+        """
+
+        with self._lock, self._db:
+            row = self._db.execute("SELECT id, message_count FROM sessions WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                raise KeyError(name)
+            self._db.execute(
+                "UPDATE sessions SET updated = ?, message_count = message_count + ?, token_total = token_total + ? WHERE id = ?",
+                (time.time(), len(messages), sum(tokens), row["id"]),
+            )
+            self._insert_messages(row["id"], row["message_count"], messages, tokens)
+
+    def _insert_messages(self, session_id: int, first_seq: int, messages: Iterable, tokens: Iterable) -> None:
+        """Insert messages of a session, numbered from first_seq."""
+        self._db.executemany(
+            "INSERT INTO messages (session_id, seq, role, content, name, tokens) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (session_id, seq, m["role"], m["content"], m.get("name"), n)
+                for (seq, (m, n)) in enumerate(zip(messages, tokens), first_seq)
+            ),
+        )
+
+    def list_sessions(self, limit: int = 50, before: ChatSession = None) -> list:
+        """One page of the saved sessions, most recently updated first.
+
+        Args:
+            limit (int): Maximum number of sessions (default: 50)
+            before (ChatSession): Last session of the previous page (default: start with the newest)
+
+        Returns:
+            sessions (list): ChatSession index entries
+        """
+
+        query = "SELECT name, created, updated, message_count, token_total FROM sessions"
+        params = ()
+        if before is not None:
+            query += " WHERE (updated, id) < (?, (SELECT id FROM sessions WHERE name = ?))"
+            params = (before.updated, before.name)
+        query += " ORDER BY updated DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(query, params + (limit,)).fetchall()
+        return [ChatSession(*row) for row in rows]
+
+    def session(self, name: str) -> ChatSession:
+        """Index entry of a saved session.
+
+        Args:
+            name (str): Name of the session
+
+        Returns:
+            session (ChatSession): The index entry, or None if there is no such session
+        """
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name, created, updated, message_count, token_total FROM sessions WHERE name = ?", (name,)
+            ).fetchone()
+        return None if row is None else ChatSession(*row)
+
+    def load_messages(self, name: str, offset: int = 0, limit: int = -1) -> list:
+        """One page of the messages of a saved session, in order.
+
+        Args:
+            name (str): Name of the session
+            offset (int): Number of messages to skip (default: 0)
+            limit (int): Maximum number of messages (default: all of them)
+
+        Raises:
+            KeyError: If there is no such session
+
+        Returns:
+            messages (list): The messages (dicts with role, content and name if any)
+        """
+
+        with self._lock:
+            row = self._db.execute("SELECT id FROM sessions WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                raise KeyError(name)
+            rows = self._db.execute(
+                "SELECT role, content, name FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (row["id"], offset, limit),
+            ).fetchall()
+
+        messages = []
+        for (role, content, msg_name) in rows:
+            message = {"role": role, "content": content}
+            if msg_name is not None:
+                message["name"] = msg_name
+            messages.append(message)
+        return messages
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Messages of the saved sessions containing every word of a query, best
+        matches first. Words are matched whole, case insensitive (end a word with *
+        to match words starting with it).
+
+        Args:
+            query (str): The words to search for
+            limit (int): Maximum number of messages (default: 20)
+
+        Returns:
+            hits (list): ChatSearchHit of each message found, with a snippet of its content
+        """
+
+        match = _match_query(query)
+        if not match:
+            return []
+
+        with self._lock:
+            if self.full_text:
+                rows = self._db.execute(
+                    "SELECT s.name, m.seq, m.role, snippet(messages_fts, 0, '[', ']', '...', 12), bm25(messages_fts)"
+                    " FROM messages_fts JOIN messages AS m ON m.id = messages_fts.rowid"
+                    " JOIN sessions AS s ON s.id = m.session_id"
+                    " WHERE messages_fts MATCH ? ORDER BY bm25(messages_fts) LIMIT ?",
+                    (match, limit),
+                ).fetchall()
+                return [ChatSearchHit(*row) for row in rows]
+
+            # No full-text index, scan the messages of the most recently updated sessions first
+            words = [word.rstrip("*") for word in query.split() if word.rstrip("*")]
+            where = " AND ".join("m.content LIKE ? ESCAPE '\\'" for _ in words)
+            patterns = ["%" + w.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" for w in words]
+            rows = self._db.execute(
+                "SELECT s.name, m.seq, m.role, substr(m.content, 1, 80), 0.0"
+                " FROM messages AS m JOIN sessions AS s ON s.id = m.session_id"
+                f" WHERE {where} ORDER BY s.updated DESC, m.seq LIMIT ?",
+                patterns + [limit],
+            ).fetchall()
+        return [ChatSearchHit(*row) for row in rows]
+
+    def import_json_logs(self, directory: str, count_tokens: Callable[[dict], int]) -> list:
+        """Import the chat logs of a directory saved as json files (a list of messages each),
+        named after the file without its extension. Files already imported are skipped,
+        improperly formatted files are left alone (and read again once they change).
+
+        Args:
+            directory (str): The directory containing the chat_*.json files
+            count_tokens (Callable): Returns the number of tokens of a message
+
+        Returns:
+            names (list): Names of the sessions imported
+        """
+
+        with self._lock:
+            seen = {
+                file: (mtime, session)
+                for (file, mtime, session) in self._db.execute("SELECT file, mtime, session FROM json_logs")
+            }
+        try:
+            with os.scandir(directory) as entries:
+                files = sorted(
+                    (entry.name, entry.stat().st_mtime)
+                    for entry in entries
+                    if entry.name.endswith(".json") and entry.is_file()
+                )
+        except FileNotFoundError:
+            return []
+
+        imported = []
+        for (file, mtime) in files:
+            if file in seen and (seen[file][1] is not None or seen[file][0] == mtime):
+                continue
+            name = os.path.splitext(file)[0]
+            try:
+                with open(os.path.join(directory, file), "r") as f:
+                    messages = json.load(f)
+                for m in messages:
+                    if not isinstance(m["role"], str) or not isinstance(m["content"], str):
+                        raise TypeError("Message role and content must be strings")
+                tokens = [count_tokens(m) for m in messages]
+            except (OSError, ValueError, TypeError, KeyError, AttributeError):
+                messages = None
+
+            with self._lock, self._db:
+                session = None
+                if file not in seen and self._db.execute("SELECT 1 FROM sessions WHERE name = ?", (name,)).fetchone():
+                    # Imported before files were recorded
+                    session = name
+                elif messages is not None:
+                    session = self._insert_session(name, messages, tokens, mtime)
+                    imported.append(session)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO json_logs (file, mtime, session) VALUES (?, ?, ?)", (file, mtime, session)
+                )
+        return imported
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,695 @@
+"""
+Immutable encoder and decoder for a single code library.
+
+A Codec holds the tables of one code library, built once and never changed, so a
+single Codec can be used from any number of threads at the same time. Natoify
+keeps one Codec per library (shared by every instance) and forwards to the Codec
+of its current library.
+"""
+
+import functools
+import html
+import itertools
+import re
+import string
+from types import MappingProxyType
+from typing import Iterable, Iterator, Mapping
+
+
+# Private-use character standing in for a period that ends a sentence ("STOP")
+_STOP_MARK = "\uE000"
+# A period followed by a space or newline ends a sentence
+_SENTENCE_END = re.compile(r"\.(?=[ \n])")
+# Private-use character separating messages joined for a batch encode
+_BATCH_SEP = "\uE001"
+# Private-use character marking the end of a decoded word
+_WORD_BREAK = "\uE002"
+# Whitespace other than spaces and line breaks (messages with it take the slow decode path)
+_OTHER_SPACE = re.compile(r"[^\S \n]")
+# Returned by decode when nothing in the message could be decoded
+_DECODE_ERROR = "ERROR: Message was either not NATOIFY encoded, is encrypted, or code library is incorrect."
+
+
+class Codec:
+    """
+    Encodes and decodes messages with one code library. Codecs are immutable,
+    every method can be called from several threads at once.
+
+    Parameters:
+        name (str) : Name of the code library (also the encryption key)
+        codes_by_letter (Mapping) : Read-only code words keyed by letter
+        codes_by_word (Mapping) : Read-only letters keyed by code word
+
+    Methods:
+        encode (message str) -> str : Encode a message string to code words
+        decode (message str) -> str : Decode a message of code words into plain English
+        encrypt (message str) -> str : Encrypt an encoded message (key is the library name)
+        decrypt (message str) -> str : Decrypt an encrypted message
+        encode_many (messages list) -> list : Encode many messages in a single pass
+        encode_stream (chunks Iterable[str]) -> Iterator[str] : Encode text chunks as they arrive
+        decode_stream (chunks Iterable[str]) -> Iterator[str] : Decode chunks of code words as they arrive
+        can_decode_compact () -> bool : Check if messages without spaces can be decoded
+
+    Examples:
+        >>> codec = Codec("NATO", {"A": "ALFA", "B": "BRAVO"})
+        >>> codec.encode("Ab ba")
+        'ALFA BRAVO  BRAVO ALFA'
+        >>> codec.decode("ALFA BRAVO  BRAVO ALFA")
+        'AB BA'
+    """
+
+    __slots__ = ("name", "codes_by_letter", "codes_by_word", "_encode_table", "_decode_table", "_compact")
+
+    def __init__(self, name: str, codes_by_letter: Mapping):
+        """Build the encode and decode tables of a code library.
+
+        Args:
+            name (str): Name of the code library
+            codes_by_letter (Mapping): Code words keyed by letter (kept as is when
+                already read-only, copied otherwise)
+        """
+
+        if not isinstance(codes_by_letter, MappingProxyType):
+            codes_by_letter = MappingProxyType(dict(codes_by_letter))
+        codes_by_word = _codes_by_word(codes_by_letter)
+
+        init = functools.partial(object.__setattr__, self)
+        init("name", name)
+        init("codes_by_letter", codes_by_letter)
+        init("codes_by_word", MappingProxyType(codes_by_word))
+        init("_encode_table", _compile_encoder(codes_by_letter))
+        init("_decode_table", _compile_decoder(codes_by_word))
+        init("_compact", None)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r})"
+
+    def encode_text(self, text: str) -> str:
+        """
+        Translates cleaned, uppercase text into code words (each followed by a space).
+        A period at the very end of the text is not treated as a STOP, callers add the
+        following character (or a space at the end of a message) when it is known.
+
+        Args:
+            text (str): The text to translate
+
+        Raises:
+            KeyError: If a character has no code word in the library
+
+        Returns:
+            nato_text (str): The translated text
+        """
+
+        # Mark the periods that end a sentence, they are encoded as STOP
+        text = _SENTENCE_END.sub(_STOP_MARK, text)
+
+        # Translate every character into its code word in one pass
+        return "".join(map(self._encode_table.__getitem__, text))
+
+    def decode_group(self, group: str) -> str:
+        """
+        Decodes a group of code words separated by single spaces (a single word
+        of the original message). Unknown code words are skipped.
+
+        Args:
+            group (str): The code words to decode
+
+        Returns:
+            decoded (str): The decoded characters
+        """
+
+        symbols = group.strip().split(" ")
+        return "".join(filter(None, map(self.codes_by_word.get, symbols)))
+
+    def decode_text(self, message: str) -> str:
+        """Decodes a (decrypted) message of code words.
+
+        Args:
+            message (str): The message to decode
+
+        Returns:
+            decoded_msg (str): The decoded message (empty if nothing could be decoded)
+        """
+
+        decode_table = self._decode_table
+
+        # Ensure message is uppercase
+        message = message.upper()
+
+        if "" in decode_table and not _OTHER_SPACE.search(message):
+            # Look up every symbol in one pass: code words become characters, double
+            # spaces word breaks and unknown symbols nothing. Lines are then rebuilt
+            # from the non-empty words
+            symbols = message.replace("\n", " \n ").split(" ")
+            decoded = "".join(map(decode_table.get, symbols, itertools.repeat("")))
+            lines = (" ".join(filter(None, line.split(_WORD_BREAK))) for line in decoded.split("\n"))
+            return "\n".join(filter(None, lines))
+
+        # Word by word decode, for messages with other whitespace (tabs, etc.)
+
+        # Initialize the decoded message variable
+        decoded_msg = ""
+
+        # Split message into a list of lines (list containing a string)
+        lines = message.split("\n")
+
+        # Split each line's string into a list of code word
+        # groups that represent a single word
+        lines = [line.split("  ") for line in lines]
+
+        # Decode each line (list containing lists of code word groups)
+        for line in lines:
+            # Strip whitespace from each word group(of symbols (code words))
+            line = [word.strip() for word in line]
+            decoded_line = ""  # Collects a decoded line of words
+
+            # Decode each group of symbols (that form a word)
+            for word in line:
+                symbols = word.split(" ")
+                word = [
+                    decode_table.get(symbol) for symbol in symbols if symbol != ""
+                ]
+                word = [w for w in word if w != None]
+
+                # Check if word is not empty before joining
+                if len(word) != 0:
+                    word = "".join(word) + " "
+                    # Append decoded word to decoded line
+                    decoded_line += word
+
+            # Append decoded line to decoded message
+            if decoded_line != "":
+                decoded_msg += decoded_line.strip() + "\n"
+
+        # Remove trailing newline
+        if decoded_msg != "":
+            decoded_msg = decoded_msg.strip()
+
+        return decoded_msg
+
+    def _compact_decoder(self) -> tuple:
+        """
+        Returns the automaton decoding messages written without spaces, built the
+        first time it is needed. This is only possible when no code word is the
+        start of another one (the code words are prefix-free).
+
+        Returns:
+            decoder (tuple): (compiled pattern or None if not prefix-free, decoded characters keyed by code word)
+        """
+
+        compact = self._compact
+        if compact is None:
+            # Code words are matched with their inner spaces removed, whitespace letters are skipped
+            table = {"".join(word.split()): letter for (word, letter) in self.codes_by_word.items() if word.strip()}
+            words = sorted(table)
+            prefix_free = all(not b.startswith(a) for (a, b) in zip(words, words[1:]))
+            pattern = re.compile(_trie_pattern(words)) if prefix_free and words else None
+            compact = (pattern, table)
+            # Built the same way by any thread, the first one stored wins
+            object.__setattr__(self, "_compact", compact)
+        return compact
+
+    def can_decode_compact(self) -> bool:
+        """Check if messages can be decoded without spaces between the code words (see decode).
+
+        Returns:
+            bool: True if the code words of the library are prefix-free
+        """
+
+        return self._compact_decoder()[0] is not None
+
+    def encode(self, message: str, encrypt: bool = False) -> str:
+        """Encode a message string to code words.
+
+        Args:
+            message (str): The message to encode
+            encrypt (bool): Encrypt the message after encoding. Defaults to False
+
+        Raises:
+            ValueError: If message is empty or None
+            KeyError: If a character has no code word in the library
+
+        Returns:
+            str: The encoded message
+        """
+
+        # Catch empty message
+        if message == "" or message == None:
+            raise ValueError("Message cannot be empty")
+
+        # Clean up message, remove non-ascii characters, and convert to uppercase
+        message = clean_message(message)
+        message = message.upper()
+        message += " "  # Add a space so a final period is treated as a STOP
+
+        # Translate every character into its code word
+        nato_message = self.encode_text(message)
+
+        # Remove trailing space
+        nato_message = nato_message.strip()
+
+        # Encrypt message if encrypt is True
+        if encrypt:
+            nato_message = self.encrypt(nato_message)
+
+        return nato_message
+
+    def decode(self, message: str, decrypt: bool = False, compact: bool = False) -> str:
+        """Decode a message of code words into plain English.
+
+        If message was not encoded with this library, it will return a error
+        string or a few random words that matched.
+
+        Compact messages have the whitespace between code words removed
+        (ex- "HOTELECHOLIMA"), they decode to text without spaces. This only
+        works with prefix-free code words (see can_decode_compact).
+
+        Args:
+            message (str): The message to decode
+            decrypt (bool, optional): Decrypt the message before decoding. Defaults to False.
+            compact (bool, optional): The message has no spaces between code words. Defaults to False.
+
+        Raises:
+            ValueError: If message is empty or None, or compact is used with
+                a code library that isn't prefix-free
+
+        Returns:
+            str: The decoded message
+        """
+
+        # Catch empty message
+        if message == "" or message == None:
+            raise ValueError("Message cannot be empty")
+
+        # Decrypt message if decrypt is True
+        if decrypt:
+            message = self.decrypt(message)
+
+        if compact:
+            pattern, table = self._compact_decoder()
+            if pattern is None:
+                raise ValueError(f"Code words of {self.name} are not prefix-free, compact messages can't be decoded")
+            # Find every code word in one scan, anything else is skipped
+            decoded_msg = "".join(map(table.__getitem__, pattern.findall("".join(message.upper().split()))))
+        else:
+            decoded_msg = self.decode_text(message)
+
+        # Check for empty message
+        if decoded_msg == "":
+            decoded_msg = _DECODE_ERROR
+
+        return decoded_msg
+
+    def encrypt(self, message: str) -> str:
+        """Encrypt a message using the Vigenere cipher (the library name is the key).
+        """
+        return vigenere_cipher(message, self.name, encrypt=True)
+
+    def decrypt(self, message: str) -> str:
+        """Decrypt a message using the Vigenere cipher (the library name is the key).
+        """
+        return vigenere_cipher(message, self.name, encrypt=False)
+
+    def encode_many(self, messages: list, encrypt: bool = False) -> list:
+        """Encode many messages. They are cleaned up, joined and translated in a
+        single pass, then split back into messages.
+
+        Args:
+            messages (list): The messages to encode
+            encrypt (bool): Encrypt the messages after encoding. Defaults to False
+
+        Raises:
+            ValueError: If a message is empty or None
+            KeyError: If a character has no code word in the library
+
+        Returns:
+            list: The encoded messages, in the same order
+        """
+
+        # Clean up each message, remove non-ascii characters, and convert to uppercase.
+        # A space after each message makes a final period a STOP
+        cleaned = []
+        for message in messages:
+            if message == "" or message == None:
+                raise ValueError("Message cannot be empty")
+            cleaned.append(clean_message(message).upper() + " ")
+
+        nato_messages = [nato_message.strip() for nato_message in self.encode_text(_BATCH_SEP.join(cleaned)).split(_BATCH_SEP)]
+        if encrypt:
+            nato_messages = [self.encrypt(nato_message) for nato_message in nato_messages]
+        return nato_messages
+
+    def encode_stream(self, chunks: Iterable[str], encrypt: bool = False) -> Iterator[str]:
+        """Encode a message arriving as chunks of text, yielding the encoded message
+        in chunks as soon as they can be produced. Memory use does not depend on
+        the size of the message.
+
+        The joined output is the same as encode() on the joined input, except
+        that html entities are not unescaped (non-ascii characters are dropped).
+
+        Args:
+            chunks (Iterable[str]): The message, in pieces of any size
+            encrypt (bool): Encrypt the message after encoding. Defaults to False
+
+        Raises:
+            ValueError: If the message is empty
+
+        Yields:
+            str: The next piece of the encoded message
+        """
+
+        empty = True  # No characters received yet
+        started = False  # Leading whitespace skipped
+        pending = ""  # Cleaned text held back until the next character is known
+        held = ""  # Spaces held back from the output (stripped at the end)
+        offset = 0  # Characters sent so far, gives the Vigenere key position
+
+        for chunk in chunks:
+            if not chunk:
+                continue
+            empty = False
+
+            # Clean up chunk, remove non-ascii characters, and convert to uppercase
+            if not chunk.isascii():
+                chunk = chunk.encode("ascii", "ignore").decode("ascii")
+            chunk = chunk.upper()
+            if not started:
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+                started = True
+
+            # Hold back trailing whitespace (stripped if the message ends here)
+            # and a final period (STOP or POINT depends on the next character)
+            text = pending + chunk
+            body = text.rstrip()
+            if body.endswith("."):
+                body = body[:-1]
+            pending = text[len(body):]
+            if not body:
+                continue
+
+            # Only the trailing spaces of the output are held back
+            nato_text = held + self.encode_text(body)
+            ready = nato_text.rstrip(" ")
+            held = nato_text[len(ready):]
+            if encrypt:
+                ready = vigenere_cipher(ready, self.name, encrypt=True, offset=offset)
+            offset += len(ready)
+            yield ready
+
+        if empty:
+            raise ValueError("Message cannot be empty")
+
+        # Whatever is left is a final period (a STOP) and trailing whitespace
+        tail = pending.rstrip()
+        if tail:
+            ready = (held + self.encode_text(tail + " ")).rstrip(" ")
+            if encrypt:
+                ready = vigenere_cipher(ready, self.name, encrypt=True, offset=offset)
+            yield ready
+
+    def decode_stream(self, chunks: Iterable[str], decrypt: bool = False) -> Iterator[str]:
+        """Decode a message arriving as chunks of text, yielding the decoded
+        message in chunks as soon as they can be produced. Memory use does not
+        depend on the size of the message.
+
+        The joined output is the same as decode() on the joined input.
+
+        Args:
+            chunks (Iterable[str]): The encoded message, in pieces of any size
+            decrypt (bool): Decrypt the message before decoding. Defaults to False
+
+        Raises:
+            ValueError: If the message is empty
+
+        Yields:
+            str: The next piece of the decoded message
+        """
+
+        empty = True  # No characters received yet
+        emitted = False  # Some decoded text was sent
+        newlines = 0  # Line breaks owed before the next decoded text
+        line_used = False  # Current line decoded to something (even whitespace)
+        line_started = False  # Current line sent non-whitespace text
+        held = ""  # Trailing whitespace of the current line held back
+        pending = ""  # Start of a word group not complete yet
+        offset = 0  # Characters received so far, gives the Vigenere key position
+
+        # A final empty chunk flushes the last word group
+        for chunk in itertools.chain(chunks, [None]):
+            final = chunk is None
+            if final:
+                if empty:
+                    raise ValueError("Message cannot be empty")
+                chunk = ""
+            elif not chunk:
+                continue
+            empty = False
+
+            # Decrypt chunk if decrypt is True and ensure it is uppercase
+            if decrypt:
+                chunk = vigenere_cipher(chunk, self.name, encrypt=False, offset=offset)
+                offset += len(chunk)
+            chunk = chunk.upper()
+
+            lines = (pending + chunk).split("\n")
+            out = []
+            for i, line in enumerate(lines):
+                last_line = i == len(lines) - 1
+                groups = line.split("  ")
+                # The last group may continue in the next chunk
+                if last_line and not final:
+                    pending = groups.pop()
+
+                for group in groups:
+                    word = self.decode_group(group)
+                    if not word:
+                        continue
+                    line_used = True
+                    # Decoded words are joined by a space, each line is stripped
+                    text = held + word + " "
+                    if not line_started:
+                        text = text.lstrip()
+                        if not text:
+                            continue
+                        line_started = True
+                        if emitted:
+                            out.append("\n" * newlines)
+                        newlines = 0
+                    body = text.rstrip()
+                    held = text[len(body):]
+                    out.append(body)
+                    emitted = True
+
+                # Close the line unless it continues in the next chunk
+                if not last_line:
+                    if line_used:
+                        newlines += 1
+                    line_used = line_started = False
+                    held = ""
+
+            if out:
+                yield "".join(out)
+
+        if not emitted:
+            yield _DECODE_ERROR
+
+
+def _codes_by_word(codes_by_letter: Mapping) -> dict:
+    """
+    Returns the reverse of the key, value pairs in codes_by_letter for
+    simplified decode lookup.
+
+    Args:
+        codes_by_letter (Mapping): Dictionary of NATO phonetic code words keyed by letter
+
+    Returns:
+        codes_by_word (dict): Dictionary of NATO phonetic code words keyed by word
+
+    """
+
+    by_words = {value: key for (key, value) in codes_by_letter.items()}
+    by_words["STOP"] = "."
+    return by_words
+
+
+def _compile_encoder(codes_by_letter: Mapping) -> dict:
+    """
+    Builds the lookup table used to convert every character of a message
+    into its code word (plus trailing space) in a single pass.
+
+    Spaces pass through as a single space and the _STOP_MARK placeholder
+    becomes "STOP " (see _SENTENCE_END).
+
+    Args:
+        codes_by_letter (Mapping): Dictionary of NATO phonetic code words keyed by letter
+
+    Returns:
+        table (dict): Code word (plus trailing space) keyed by character
+
+    """
+
+    table = {char: word + " " for (char, word) in codes_by_letter.items()}
+    table[" "] = " "
+    table[_STOP_MARK] = "STOP "
+    table[_BATCH_SEP] = _BATCH_SEP
+    return table
+
+
+def _compile_decoder(codes_by_word: dict) -> dict:
+    """
+    Builds the lookup table used to decode a whole message in a single pass.
+    On top of the code words, an empty symbol (from a double space) maps to
+    a word break and a line break maps to itself.
+
+    If a code word decodes to whitespace, words and lines can't be told apart
+    from decoded text, so the table has no word break and the slower word by
+    word decode is used instead.
+
+    Args:
+        codes_by_word (dict): Dictionary of NATO phonetic code words keyed by word
+
+    Returns:
+        table (dict): Decoded characters keyed by symbol
+    """
+
+    table = dict(codes_by_word)
+    if not any(
+        letter.isspace() or _WORD_BREAK in letter
+        for (word, letter) in codes_by_word.items()
+        if not _OTHER_SPACE.search(word) and " " not in word and "\n" not in word
+    ):
+        table[""] = _WORD_BREAK
+    table["\n"] = "\n"
+    return table
+
+
+def _ultimately_unescape(s: str) -> str:
+    """A relentless loop for cleaning out web encoding from a string.
+
+    Args:
+        s (str): The string to clean up
+
+    Returns:
+        s (str): The cleaned up string
+
+    """
+
+    unescaped = ""
+    while unescaped != s:
+        s = html.unescape(s)
+        unescaped = html.unescape(s)
+    return s
+
+
+def clean_message(message: str) -> str:
+    """
+    Cleans up a message string before encoding or decoding.
+    Attempts to remove any web encoding and non-ascii characters.
+
+    Args:
+        message (str): The message to clean up
+
+    Returns:
+        cleaned (str): The cleaned up message
+
+    """
+
+    cleaned = message.strip()
+    # Nothing to unescape or remove (skips the unescape loop)
+    if "&" not in message and message.isascii():
+        return cleaned
+    # Try removing web encoding
+    message = _ultimately_unescape(message)
+    if not message.isascii():
+        cleaned = "".join(char for char in message if char.isascii())
+    return cleaned
+
+
+def vigenere_cipher(message: str, key: str, encrypt: bool, offset: int = 0) -> str:
+    """Encrypt or decrypt a message using the Vigenere cipher.
+
+    Args:
+        message (str): The message to encrypt or decrypt
+        key (str): The key to use for encryption or decryption
+        encrypt (bool): Encrypt the message if True, decrypt if False
+        offset (int): Position of the message in a longer message (for streams)
+
+    Returns:
+        str: The encrypted or decrypted message
+
+    """
+
+    if not message.isascii():
+        # Non-ascii characters encrypt like any other non-letter
+        message = message.encode("ascii", "replace").decode("ascii")
+    data = message.encode("ascii")
+
+    # Every key letter is a byte translation applied to the characters it
+    # lines up with, message[i] uses key[(i + offset) % len(key)]
+    ciphertext = bytearray(len(data))
+    for i in range(min(len(key), len(data))):
+        table = _vigenere_table(key[(i + offset) % len(key)], encrypt)
+        ciphertext[i::len(key)] = data[i::len(key)].translate(table)
+    return ciphertext.decode("ascii")
+
+
+@functools.lru_cache(maxsize=None)
+def _vigenere_table(key_letter: str, encrypt: bool) -> bytes:
+    """Byte translation table shifting every character by one key letter.
+    Spaces are kept, any other non-letter is treated as the letter before 'A'
+    (so it becomes a letter too).
+
+    Args:
+        key_letter (str): The letter of the key
+        encrypt (bool): Shift forward if True, backward if False
+
+    Returns:
+        table (bytes): Table for bytes.translate
+    """
+
+    key_index = string.ascii_uppercase.find(key_letter)
+    if not encrypt:
+        key_index = -key_index
+    table = bytearray()
+    for byte in range(256):
+        message_index = string.ascii_uppercase.find(chr(byte))
+        table.append(ord(string.ascii_uppercase[(message_index + key_index) % 26]))
+    table[ord(" ")] = ord(" ")
+    return bytes(table)
+
+
+def _trie_pattern(words: list) -> str:
+    """Regular expression matching any of the words, laid out as a trie so
+    matching follows a single path character by character.
+
+    Args:
+        words (list): The words (non-empty)
+
+    Returns:
+        pattern (str): The regular expression
+    """
+
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def branch(node: dict) -> str:
+        if not node:
+            return ""
+        alternatives = [re.escape(char) + branch(child) for (char, child) in node.items()]
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    return branch(trie)
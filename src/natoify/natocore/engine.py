@@ -2,22 +2,77 @@
 Utilities to encode and decode text messages into NATO phonetic alphabet code words.
 """
 
-import html
+import collections
 import json
-import glob
 import os
-import string
-from tkinter import messagebox
+import sys
+from types import MappingProxyType
+from typing import Iterable, Iterator, NamedTuple
+
+from .codec import Codec, _DECODE_ERROR, vigenere_cipher
+from .registry import CODE_REGISTRY
+
+
+# Number of symbols at the start of a message used to detect its code library
+_DETECT_SAMPLE = 64
+# Number of symbols used to shortlist the keys of an encrypted message
+_KEY_SAMPLE = 16
+# Share of known code words above which a detected code is a clear winner
+_CLEAR_WIN = 0.9
+# Codec of each code library, shared by every Natoify instance
+_CODECS = {}
+# Batches with at least this many messages may be split across worker processes
+BATCH_POOL_THRESHOLD = 20000
+
+
+class CodeDetection(NamedTuple):
+    """
+    Result of Natoify.detect_encryption.
+
+    Parameters:
+        code (str) : Detected code library name (empty if no library matched)
+        encrypted (bool) : The message is encrypted (with the code library name as key)
+        confidence (float) : Share of the sampled symbols that are code words of the library (0 to 1)
+    """
+
+    code: str
+    encrypted: bool
+    confidence: float
+
+
+def show_error(title: str, message: str) -> None:
+    """Report an error in a message box, or on stderr when there is no GUI.
+    tkinter is only imported here so headless use never loads it.
+
+    Args:
+        title (str): Title of the error
+        message (str): The error message
+    """
+
+    try:
+        from tkinter import TclError, messagebox
+    except ImportError:
+        print(f"{title}: {message}", file=sys.stderr)
+        return
+
+    try:
+        messagebox.showerror(title, message)
+    except TclError:
+        # No display available
+        print(f"{title}: {message}", file=sys.stderr)
 
 
 class Natoify:
     """
     Contains the encoders and decoders for NATO phonetic alphabet text messages.
+    The work is done by the immutable Codec of the current code library (see codec.py),
+    set_code only swaps which Codec is used.
 
     Parameters:
-        codes_by_letter (dict) : Dictionary of NATO phonetic code words keyed by letter
-        codes_by_word (dict) : Dictionary of NATO phonetic code words keyed by word
-        CODE_LIBRARY (dict) : Dictionary of valid code options
+        current_code (str) : Name of the current code library
+        codes_by_letter (Mapping) : Read-only NATO phonetic code words keyed by letter
+        codes_by_word (Mapping) : Read-only NATO phonetic code words keyed by word
+        CODE_LIBRARY (CodeRegistry) : Process-wide, lazily loaded mapping of valid code options
         CODE_LIB_DIR (str) : Directory containing code.json files
 
     Methods:
@@ -25,7 +80,15 @@ class Natoify:
         decode (message str) -> str : Decode a NATO message string into plain English
         encrypt (message str) -> str : Encrypt after encoding a message to NATO phonetic words
         decrypt (message str) -> str : Decrypt an encrypted NATO message
+        encode_many (messages Iterable[str]) -> list : Encode many messages in one call
+        decode_many (messages Iterable[str]) -> list : Decode many messages in one call
+        encode_stream (chunks Iterable[str]) -> Iterator[str] : Encode text chunks as they arrive
+        decode_stream (chunks Iterable[str]) -> Iterator[str] : Decode NATO chunks as they arrive
         set_code (code str) -> None : Set the code to use for encoding and decoding
+        codec (code str) -> Codec : Get the Codec of a code library (default: the current code)
+        detect_code (message str) -> str : Find the code library a NATO message uses
+        detect_encryption (message str) -> CodeDetection : Find the code library and if a message is encrypted
+        can_decode_compact (code str) -> bool : Check if messages without spaces can be decoded
         list_codes () -> list : Generate list of available code libraries
         load_codes (directory str) -> None : Loads json code libraries from a directory (default: ../code_lib)
 
@@ -49,76 +112,81 @@ class Natoify:
     CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
     CODE_LIB_DIR = os.path.join(CURRENT_DIR, "../code_lib")
 
-    CODE_LIBRARY = {}
+    CODE_LIBRARY = CODE_REGISTRY
 
     def __init__(self):
         """Load the default codes (also sets current code to prevent errors - Default is NATO)."""
 
-        self.codes_by_letter = {}
-        self.current_code = ""
+        self._codec = None
         # Load the default codes (also sets current code to prevent errors - Default is NATO)
+        # Library names are indexed once per process, so this is cheap after the first call
         self.load_codes(self.CODE_LIB_DIR)
-        # Generate dictionary of phonetic code words keyed by word (reverse of codes_by_letter)
-        self.codes_by_word = self._codes_by_word(self.codes_by_letter)
 
-    def _codes_by_word(self, codes_by_letter: dict) -> dict:
-        """
-        Returns the reverse of the key, value pairs in codes_by_letter for 
-        simplified decode lookup.
+    @property
+    def current_code(self) -> str:
+        """Name of the current code library."""
+        return self._codec.name if self._codec is not None else ""
 
-        Args:
-            codes_by_letter (dict): Dictionary of NATO phonetic code words keyed by letter
+    @property
+    def codes_by_letter(self) -> MappingProxyType:
+        """Code words of the current code library keyed by letter (read-only)."""
+        return self._codec.codes_by_letter if self._codec is not None else MappingProxyType({})
 
-        Returns:
-            codes_by_word (dict): Dictionary of NATO phonetic code words keyed by word
-    
-        """
+    @property
+    def codes_by_word(self) -> MappingProxyType:
+        """Letters of the current code library keyed by code word (read-only)."""
+        return self._codec.codes_by_word if self._codec is not None else MappingProxyType({})
 
-        by_words = {value: key for (key, value) in codes_by_letter.items()}
-        by_words["STOP"] = "."
-        return by_words
+    def codec(self, code: str = "") -> Codec:
+        """
+        Returns the Codec of a code library, built only the first time a library
+        is used in the process (or after it was reloaded). Codecs are immutable
+        and can be shared between threads.
 
-    def _ultimately_unescape(self, s: str) -> str:
-        """A relentless loop for cleaning out web encoding from a string.
-        
         Args:
-            s (str): The string to clean up
+            code (str): The code library name (default: the current code)
+
+        Raises:
+            KeyError: If the code library does not exist
+            json.decoder.JSONDecodeError: If the code.json file is improperly formatted
 
         Returns:
-            s (str): The cleaned up string
-        
+            codec (Codec): The Codec of the library
+
+        Examples:
+            >>> nato = Natoify()
+            >>> nato.codec("redneck").encode("World!")
+            'WUZUP ORNERY REDNECK LARDASS DANGIT OSHIT'
         """
 
-        unescaped = ""
-        while unescaped != s:
-            s = html.unescape(s)
-            unescaped = html.unescape(s)
-        return s
+        if code == "" and self._codec is not None:
+            return self._codec
+        code = code.upper() or self.current_code
+        codes_by_letter = self.CODE_LIBRARY[code]
+        codec = _CODECS.get(code)
+        if codec is None or codec.codes_by_letter is not codes_by_letter:
+            codec = _CODECS[code] = Codec(code, codes_by_letter)
+        return codec
 
-    def _clean_message(self, message: str) -> str:
-        """
-        Cleans up a message string before encoding or decoding.
-        Attempts to remove any web encoding and non-ascii characters.
+    def can_decode_compact(self, code: str = "") -> bool:
+        """Check if messages of a code library can be decoded without spaces
+        between the code words (see decode).
 
         Args:
-            message (str): The message to clean up
+            code (str): The code library name (default: the current code)
 
         Returns:
-            cleaned (str): The cleaned up message
-        
+            bool: True if the code words of the library are prefix-free
         """
 
-        cleaned = message.strip()
-        # Try removing web encoding
-        message = self._ultimately_unescape(message)
-        if not message.isascii():
-            cleaned = "".join(char for char in message if char.isascii())
-        return cleaned
+        return self.codec(code).can_decode_compact()
 
     def load_codes(self, directory: str = "") -> None:
         """
         Loads custom code libraries from a directory containing code.json files.
         The code.json file contains a json object of letter:word pairs.
+        Only the library names are read here, from the precompiled code
+        library bundle when available (see CodeRegistry and bundle.py).
 
         Expected JSON: {"NATO": {"A": "ALPHA", "B": "BRAVO", ...}}
 
@@ -136,29 +204,10 @@ class Natoify:
         if directory == "":
             directory = self.CODE_LIB_DIR
 
-        # Get a list of all the json files in the directory
-        json_files = glob.glob(f"{directory}/*.json")
-
-        # If there is a problem with the directory, raise an error
-        if len(json_files) == 0:
-            raise FileNotFoundError(f"No code.json files found in: {directory}")
-
-        # Iterate through each file and load the codes
-        try:
-            for json_file in json_files:
-                with open(json_file, "r") as f:
-                    codes = json.load(f)
-                    # Check if the file contains a valid code library
-                    # TODO: Add more validation
-
-                    # Check for duplicate code names
-                    if not codes.keys() <= self.CODE_LIBRARY.keys():
-                        # Add the code to the CODE_LIBRARY dictionary
-                        self.CODE_LIBRARY.update(codes)
-        except json.decoder.JSONDecodeError:
-            messagebox.showerror("Error", "Improperly formatted json code library. Check the files.")
-            return
-        
+        # Index the library names in the directory, each library
+        # is parsed on first use and shared by all Natoify instances
+        self.CODE_LIBRARY.index(directory)
+
         # Set the code library to NATO or the first code in the library
         self.reset_current_code()
 
@@ -207,79 +256,68 @@ class Natoify:
             self.reset_current_code()
             print("Invalid code library name. Library does not exist.")
         else:
-            self.codes_by_letter = self.CODE_LIBRARY[code]
-            self.codes_by_word = self._codes_by_word(self.codes_by_letter)
-            self.current_code = code
-
-    def encode(self, message: str, encrypt: bool = False) -> str:
+            try:
+                codec = self.codec(code)
+            except json.decoder.JSONDecodeError:
+                show_error("Error", "Improperly formatted json code library. Check the files.")
+                return
+            # A single assignment, readers see either the old or the new library
+            self._codec = codec
+
+    def encode(self, message: str, encrypt: bool = False, code: str = "") -> str:
         """Encode a message string to NATO phonetic words. Code used
-        is stored in self.current_code.
+        is stored in self.current_code, unless another code is given.
+
+        Encoding with an explicit code doesn't change the current code. Each call
+        uses a single immutable Codec, so threads can share one Natoify instance.
         
         Args:
             message (str): The message to encode
             encrypt (bool): Encrypt the message after encoding. Defaults to False
+            code (str): Code library to use. Defaults to the current code
 
         Raises:
             ValueError: If message is empty or None
+            KeyError: If the code library does not exist
 
         Examples:
             >>> nato = Natoify()
             >>> nato.encode("Hello World!")
             'HOTEL ECHO LIMA LIMA OSCAR  WHISKEY OSCAR ROMEO LIMA DELTA EXCLAMARK'
+            >>> nato.encode("World!", code="redneck")
+            'WUZUP ORNERY REDNECK LARDASS DANGIT OSHIT'
         """
 
         # Catch empty message
         if message == "" or message == None:
             raise ValueError("Message cannot be empty")
 
-        # Clean up message, remove non-ascii characters, and convert to uppercase
-        message = self._clean_message(message)
-        message = message.upper()
-        message += " "  # Add a space to prevent out of index errors
-
-        # Initialize the NATO message variable
-        nato_message = ""
-
-        # Iterate through each character in the message and translate to NATO word
-        for i, char in enumerate(message):
-            # Check if character is a period
-            if char == ".":
-                # Check if period is at end of sentence
-                if message[i + 1] == " " or message[i + 1] == "\n":
-                    nato_message += "STOP "
-                else:
-                    # Period is part of a number or abbreviation
-                    nato_message += self.codes_by_letter[char] + " "
-
-            # Only add a single space if character is a space
-            elif char == " ":
-                nato_message += " "
-            else:
-                # Translate character into NATO word
-                nato_message += self.codes_by_letter[char] + " "
-
-        # Remove trailing space
-        nato_message = nato_message.strip()
-
-        # Encrypt message if encrypt is True
-        if encrypt:
-            nato_message = self.encrypt(nato_message)
-
-        return nato_message
-
-    def decode(self, message: str, decrypt: bool = False) -> str:
+        return self.codec(code).encode(message, encrypt)
+
+    def decode(self, message: str, decrypt: bool = False, compact: bool = False, code: str = "") -> str:
         """Decode a NATO message string into plain English. Code used
-        is stored in self.current_code.
+        is stored in self.current_code, unless another code is given.
 
         If message was not encoded or incorrect code library is set,
         it will return a error string or a few random words that matched.
 
+        Compact messages have the whitespace between code words removed
+        (ex- "HOTELECHOLIMA"), they decode to text without spaces. This only
+        works with code libraries where no code word is the start of another
+        one (see can_decode_compact).
+
         Args:
             message (str): The message to decode
             decrypt (bool, optional): Decrypt the message before decoding. Defaults to False.
+            compact (bool, optional): The message has no spaces between code words. Defaults to False.
+            code (str, optional): Code library to use (the current code is not changed),
+                or "auto" to detect it from the message (see detect_encryption). Defaults to the current code.
+                When detecting, messages found to be encrypted are decrypted even if decrypt is False.
 
         Raises: 
-            ValueError: If message is empty or None
+            ValueError: If message is empty or None, or compact is used with
+                a code library that isn't prefix-free
+            KeyError: If the code library does not exist
 
         Returns:
             str: The decoded message
@@ -289,76 +327,267 @@ class Natoify:
             >>> nato.set_code("NATO")
             >>> nato.decode("HOTEL ECHO LIMA LIMA OSCAR  WHISKEY OSCAR ROMEO LIMA DELTA EXCLAMARK")
             'HELLO WORLD!'
+            >>> nato.decode("WUZUP ORNERY REDNECK LARDASS DANGIT OSHIT", code="auto")
+            'WORLD!'
         """
 
         # Catch empty message
         if message == "" or message == None:
             raise ValueError("Message cannot be empty")
 
-        # Decrypt message if decrypt is True
-        if decrypt:
-            message = self.decrypt(message)
-
-        # Ensure message is uppercase
-        message = message.upper()
-
-        # Initialize the decoded message variable
-        decoded_msg = ""
-
-        # Split message into a list of lines (list containing a string)
-        lines = message.split("\n")
-
-        # Split each line's string into a list of code word
-        # groups that represent a single word
-        lines = [line.split("  ") for line in lines]
-
-        # Decode each line (list containing lists of code word groups)
-        for line in lines:
-            # Strip whitespace from each word group(of symbols (code words))
-            line = [word.strip() for word in line]
-            decoded_line = ""  # Collects a decoded line of words
-
-            # Decode each group of symbols (that form a word)
-            for word in line:
-                symbols = word.split(" ")
-                word = [
-                    self.codes_by_word.get(symbol) for symbol in symbols if symbol != ""
-                ]
-                word = [w for w in word if w != None]
-                
-                # Check if word is not empty before joining
-                if len(word) != 0:
-                    word = "".join(word) + " "
-                    # Append decoded word to decoded line
-                    decoded_line += word
-
-            # Append decoded line to decoded message
-            if decoded_line != "":
-                decoded_msg += decoded_line.strip() + "\n"
-
-        # Remove trailing newline
-        if decoded_msg != "":
-            decoded_msg = decoded_msg.strip()
-
-        # Check for empty message
-        if decoded_msg == "":
-            decoded_msg = "ERROR: Message was either not NATOIFY encoded, is encrypted, or code library is incorrect."
-
-        return decoded_msg
+        if code.upper() == "AUTO":
+            code, decrypt, _ = self.detect_encryption(message, True if decrypt else None)
+            if code == "":
+                return _DECODE_ERROR
+
+        return self.codec(code).decode(message, decrypt, compact)
+
+    def detect_code(self, message: str) -> str:
+        """Find the code library a (not encrypted) NATO message was most likely
+        encoded with. Only the first code words of the message are looked at,
+        the library using most of them wins (ties go to the library using more
+        of the rarer words, then to the current code).
+
+        Args:
+            message (str): The NATO message
+
+        Returns:
+            code (str): The library name, or an empty string if no library matched
+        """
+
+        index = self.CODE_LIBRARY.libraries_by_word()
+        sample = message[: _DETECT_SAMPLE * 16].upper().split()
+        if len(message) > _DETECT_SAMPLE * 16:
+            # The last symbol may have been cut
+            sample.pop()
+        sample = [index[symbol] for symbol in sample[:_DETECT_SAMPLE] if symbol in index]
+
+        hits = collections.Counter()
+        for libraries in sample:
+            hits.update(libraries)
+        if not hits:
+            return ""
+
+        best = max(hits.values())
+        candidates = [name for (name, count) in hits.items() if count == best]
+        if len(candidates) > 1:
+            # Words used by fewer libraries tell more about the code
+            rarity = dict.fromkeys(candidates, 0.0)
+            for libraries in sample:
+                for name in libraries & rarity.keys():
+                    rarity[name] += 1 / len(libraries)
+            candidates.sort(key=lambda name: (-rarity[name], name != self.current_code, name))
+        return candidates[0]
+
+    def detect_encryption(self, message: str, encrypted: bool = None) -> CodeDetection:
+        """Find the code library of a NATO message and whether it was encrypted.
+        Every library name is tried as the Vigenere key on the first few symbols,
+        the best keys are then checked on a longer sample. A plain message that is
+        a clear match skips the keys altogether.
+
+        Args:
+            message (str): The NATO message
+            encrypted (bool, optional): True if the message is known to be encrypted,
+                False if it is known not to be. Defaults to None (unknown)
+
+        Returns:
+            detection (CodeDetection): The code library, if it is encrypted and the confidence
+        """
+
+        index = self.CODE_LIBRARY.libraries_by_word()
+        sample = message[: _DETECT_SAMPLE * 16]
+        if len(message) > len(sample):
+            # Drop the last symbol, it may have been cut
+            sample = sample[: sample.rstrip().rfind(" ") + 1] or sample
+
+        def score(text: str, code: str) -> float:
+            # Share of the symbols that are code words of the library
+            symbols = text.upper().split()[:_DETECT_SAMPLE]
+            if not symbols:
+                return 0.0
+            hits = sum(1 for symbol in symbols if symbol == "STOP" or code in index.get(symbol, ()))
+            return hits / len(symbols)
+
+        candidates = []
+        if not encrypted:
+            code = self.detect_code(sample)
+            if code:
+                candidates.append(CodeDetection(code, False, score(sample, code)))
+                if candidates[0].confidence >= _CLEAR_WIN or encrypted is False:
+                    return candidates[0]
+            elif encrypted is False:
+                return CodeDetection("", False, 0.0)
+
+        # Shortlist the keys on the first symbols (each key only decrypts those few),
+        # then check the best ones on the whole sample
+        short = " ".join(sample.split(" ")[: _KEY_SAMPLE * 2])
+        shortlist = sorted(
+            ((score(vigenere_cipher(short, code, encrypt=False), code), code) for code in self.CODE_LIBRARY),
+            reverse=True,
+        )
+        for (short_score, code) in shortlist[:3]:
+            if short_score == 0:
+                break
+            candidate = CodeDetection(code, True, score(vigenere_cipher(sample, code, encrypt=False), code))
+            candidates.append(candidate)
+            if candidate.confidence >= _CLEAR_WIN:
+                break
+
+        if not candidates:
+            return CodeDetection("", False, 0.0)
+        return max(candidates, key=lambda candidate: candidate.confidence)
+
+    def encode_many(self, messages: Iterable[str], code=None, encrypt: bool = False, jobs: int = 0) -> list:
+        """Encode many messages in one call. Setup is shared by the whole batch and
+        messages using the same code library are translated in a single pass.
+
+        Args:
+            messages (Iterable[str]): The messages to encode
+            code (str | Iterable[str]): Code library for every message, or one per
+                message (default: the current code). The current code is not changed
+            encrypt (bool): Encrypt the messages after encoding. Defaults to False
+            jobs (int): Worker processes to use for batches of BATCH_POOL_THRESHOLD
+                messages or more (default: no worker processes)
+
+        Raises:
+            ValueError: If a message is empty or None
+            KeyError: If a code library does not exist
+
+        Returns:
+            list: The NATO messages, in the same order
+
+        Examples:
+            >>> nato = Natoify()
+            >>> nato.encode_many(["Hello", "World!"], code=["NATO", "REDNECK"])
+            ['HOTEL ECHO LIMA LIMA OSCAR', 'WUZUP ORNERY REDNECK LARDASS DANGIT OSHIT']
+        """
+
+        messages, codes = self._batch(messages, code)
+        if jobs > 1 and len(messages) >= BATCH_POOL_THRESHOLD:
+            from .parallel import map_batch
+            return map_batch("encode_many", messages, codes, encrypt, jobs, self.current_code)
+
+        nato_messages = [None] * len(messages)
+        for (code, indexes) in self._group_by_code(codes).items():
+            # Messages using the same code are translated in a single pass
+            nato_texts = self.codec(code).encode_many([messages[i] for i in indexes], encrypt)
+            for (i, nato_message) in zip(indexes, nato_texts):
+                nato_messages[i] = nato_message
+        return nato_messages
+
+    def decode_many(self, messages: Iterable[str], code=None, decrypt: bool = False, jobs: int = 0) -> list:
+        """Decode many messages in one call, sharing setup across the whole batch.
+
+        Args:
+            messages (Iterable[str]): The messages to decode
+            code (str | Iterable[str]): Code library for every message, or one per
+                message (default: the current code). The current code is not changed
+            decrypt (bool): Decrypt the messages before decoding. Defaults to False
+            jobs (int): Worker processes to use for batches of BATCH_POOL_THRESHOLD
+                messages or more (default: no worker processes)
+
+        Raises:
+            ValueError: If a message is empty or None
+            KeyError: If a code library does not exist
+
+        Returns:
+            list: The decoded messages (or error strings), in the same order
+        """
+
+        messages, codes = self._batch(messages, code)
+        if jobs > 1 and len(messages) >= BATCH_POOL_THRESHOLD:
+            from .parallel import map_batch
+            return map_batch("decode_many", messages, codes, decrypt, jobs, self.current_code)
+
+        decoded_messages = [None] * len(messages)
+        for (code, indexes) in self._group_by_code(codes).items():
+            codec = self.codec(code)
+            for i in indexes:
+                decoded_messages[i] = codec.decode(messages[i], decrypt)
+        return decoded_messages
+
+    def _batch(self, messages: Iterable[str], code) -> tuple:
+        """Returns the messages of a batch and the code library name of each one."""
+        messages = list(messages)
+        if code is None or code == "":
+            code = self.current_code
+        if isinstance(code, str):
+            codes = [code.upper()] * len(messages)
+        else:
+            codes = [c.upper() for c in code]
+            if len(codes) != len(messages):
+                raise ValueError("One code library per message is required")
+        return messages, codes
+
+    def _group_by_code(self, codes: list) -> dict:
+        """Returns the indexes of the messages using each code library."""
+        groups = {}
+        for (i, code) in enumerate(codes):
+            groups.setdefault(code, []).append(i)
+        return groups
+
+    def encode_stream(self, chunks: Iterable[str], encrypt: bool = False) -> Iterator[str]:
+        """Encode a message arriving as chunks of text, yielding the NATO message
+        in chunks as soon as they can be produced. Memory use does not depend on
+        the size of the message.
+
+        The joined output is the same as encode() on the joined input, except
+        that html entities are not unescaped (non-ascii characters are dropped).
+
+        Args:
+            chunks (Iterable[str]): The message, in pieces of any size
+            encrypt (bool): Encrypt the message after encoding. Defaults to False
+
+        Raises:
+            ValueError: If the message is empty
+
+        Yields:
+            str: The next piece of the NATO message
+
+        Examples:
+            >>> nato = Natoify()
+            >>> "".join(nato.encode_stream(["Hello Wo", "rld!"]))
+            'HOTEL ECHO LIMA LIMA OSCAR  WHISKEY OSCAR ROMEO LIMA DELTA EXCLAMARK'
+        """
+
+        return self.codec().encode_stream(chunks, encrypt)
+
+    def decode_stream(self, chunks: Iterable[str], decrypt: bool = False) -> Iterator[str]:
+        """Decode a NATO message arriving as chunks of text, yielding the decoded
+        message in chunks as soon as they can be produced. Memory use does not
+        depend on the size of the message.
+
+        The joined output is the same as decode() on the joined input.
+
+        Args:
+            chunks (Iterable[str]): The NATO message, in pieces of any size
+            decrypt (bool): Decrypt the message before decoding. Defaults to False
+
+        Raises:
+            ValueError: If the message is empty
+
+        Yields:
+            str: The next piece of the decoded message
+
+        Examples:
+            >>> nato = Natoify()
+            >>> "".join(nato.decode_stream(["HOTEL ECHO LIMA LIMA OSCAR  WHIS", "KEY OSCAR ROMEO"]))
+            'HELLO WOR'
+        """
+
+        return self.codec().decode_stream(chunks, decrypt)
 
     def encrypt(self, message: str) -> str:
         """Encrypt a message using the Vigenere cipher.
         """
-        enc_msg = self.vigenere_cipher(message, self.current_code, encrypt=True)
-        return enc_msg
+        return self.codec().encrypt(message)
 
     def decrypt(self, message: str) -> str:
         """Decrypt a message using the Vigenere cipher.
         """
-        dec_msg = self.vigenere_cipher(message, self.current_code, encrypt=False)
-        return dec_msg
+        return self.codec().decrypt(message)
 
-    def vigenere_cipher(self, message: str, key: str, encrypt: bool) -> str:
+    def vigenere_cipher(self, message: str, key: str, encrypt: bool, offset: int = 0) -> str:
         """Encrypt or decrypt a message using the Vigenere cipher.
         Key used here is the name of the current code library.
         
@@ -366,34 +595,15 @@ class Natoify:
             message (str): The message to encrypt or decrypt
             key (str): The key to use for encryption or decryption
             encrypt (bool): Encrypt the message if True, decrypt if False
+            offset (int): Position of the message in a longer message (for streams)
 
         Returns:
             str: The encrypted or decrypted message
 
         """
 
-        ciphertext = ""
-        for i in range(len(message)):
-            # Check if character is a space and add it to the ciphertext
-            if message[i] == " ":
-                ciphertext += " "
-                continue
-            # Find the index of the letter in the message
-            message_index = string.ascii_uppercase.find(message[i])
-            # Find the index of the letter in the key
-            key_index = string.ascii_uppercase.find(key[i % len(key)])
-            
-            # Calculate the encryption value
-            if encrypt:
-                encryption_value = (message_index + key_index) % 26
-            else:
-                encryption_value = (message_index - key_index) % 26
-            
-            # Convert the encryption value to a letter
-            encrypted_letter = string.ascii_uppercase[encryption_value]
-            # Append the encrypted letter to the ciphertext
-            ciphertext += encrypted_letter
-        return ciphertext
+        return vigenere_cipher(message, key, encrypt, offset)
+
 
 if __name__ == "__main__":
     nato = Natoify()
@@ -0,0 +1,193 @@
+"""
+Append-only journal of the chat session in progress, so it survives a crash.
+
+Every message is appended to a JSON Lines file as soon as it is produced. Lines are
+flushed to the operating system right away and fsync'ed in batches (every few
+messages, or about a second after the first message not synced yet, even if no other
+message follows) so a long chat does not wait on the disk for every message. Saving
+the session compacts the journal: its messages are moved into the chat log store and
+the file is removed.
+
+The process writing a journal holds a lock on the file (released by the operating
+system if the process dies). A journal nobody holds belongs to a session that was
+never saved (ex- the app crashed) and is recovered into the store, the journals of
+other running instances are left alone.
+
+Layout (one json object per line):
+    header  : {"session": name} name of the saved session the messages continue ("" if new)
+    message : {"role": ..., "content": ..., "tokens": n} a message and its token count
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock_file(f) -> None:
+    """Lock a journal file for this process, without waiting.
+
+    Raises:
+        BlockingIOError: If another process (or another open journal) holds the lock
+    """
+
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            # Lock a byte past any journal size, the messages stay readable
+            os.lseek(f.fileno(), 0x7FFFFFFF, os.SEEK_SET)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError as e:
+        raise BlockingIOError(f"The journal {f.name} is in use") from e
+
+
+class ChatJournal:
+    """
+    Append-only JSON Lines journal of the messages of a chat session not saved yet,
+    locked by the process writing it until closed (can be used as a context manager).
+
+    Parameters:
+        path (str) : Path of the journal file
+        session (str) : Name of the saved session the messages continue ("" if new)
+
+    Methods:
+        append (message dict, tokens int) -> None : Add a message to the journal
+        sync () -> None : Write the journal to disk now
+        close () -> None : Write the journal to disk and close it (the file is kept)
+        discard () -> None : Close and remove the journal (ex- once its messages are saved)
+        read (path str) -> Tuple[str, list, list] : Read back a journal (static)
+    """
+
+    def __init__(self, path: str, session: str = "", sync_every: int = 16, sync_interval: float = 1.0):
+        """Create a journal file, or continue an existing one.
+
+        Args:
+            path (str): Path of the journal file
+            session (str): Name of the saved session the messages continue (default: a new session)
+            sync_every (int): Number of messages written between two fsyncs at most (default: 16)
+            sync_interval (float): Seconds a message waits for its fsync at most (default: 1.0)
+
+        Raises:
+            BlockingIOError: If the journal is in use (by another running instance)
+        """
+
+        self.path = path
+        self.session = session
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._timer = None  # Syncs the messages left unsynced by the last batch
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        try:
+            _lock_file(self._file)
+        except BlockingIOError:
+            self._file.close()
+            raise
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._write({"session": session})
+            self.sync()
+
+    def __enter__(self) -> "ChatJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def append(self, message: dict, tokens: int) -> None:
+        """Add a message to the journal. It reaches the operating system right away
+        and the disk with the next batch.
+
+        Args:
+            message (dict): The message
+            tokens (int): Number of tokens of the message
+        """
+
+        with self._lock:
+            self._write({**message, "tokens": tokens})
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+            elif self._timer is None:
+                # Sync this message in time even if no other message follows
+                self._timer = threading.Timer(self.sync_interval, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _sync(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._file.closed:
+            return
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self) -> None:
+        """Write the journal to disk now."""
+        with self._lock:
+            self._sync()
+
+    def close(self) -> None:
+        """Write the journal to disk and close it (releasing its lock). The file is kept."""
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+    def discard(self) -> None:
+        """Close and remove the journal (removed before its lock is released)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._file.closed:
+                return
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self._file.close()
+
+    @staticmethod
+    def read(path: str) -> Tuple[str, list, list]:
+        """Read back a journal. A line cut short by a crash is skipped.
+
+        Args:
+            path (str): Path of the journal file
+
+        Returns:
+            session (str): Name of the saved session the messages continue ("" if new)
+            messages (list): The messages
+            tokens (list): Number of tokens of each message
+        """
+
+        session, messages, tokens = "", [], []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if "session" in record:
+                    session = record["session"]
+                elif "role" in record and "content" in record:
+                    tokens.append(record.pop("tokens", 0))
+                    messages.append(record)
+        return session, messages, tokens
@@ -3,13 +3,41 @@ This module adds chatGPT functionality to the Natoity app.
 """
 
 import os
-import json
 import glob
+import asyncio
 import datetime
-from typing import Tuple
+import functools
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Iterator, Tuple
+import aiohttp
 import openai
 import tiktoken
-from tkinter import messagebox
+
+from .chatcache import ResponseCache
+from .chatstore import ChatLogStore
+from .engine import show_error
+from .journal import ChatJournal
+
+
+# Tokens the chat format adds to every message, and to a message with a name
+_CHAT_FORMAT = {"gpt-3.5-turbo-0301": (4, -1), "gpt-4-0314": (3, 1)}
+# Models that may change over time are counted as their snapshot
+_MODEL_SNAPSHOTS = {"gpt-3.5-turbo": "gpt-3.5-turbo-0301", "gpt-4": "gpt-4-0314"}
+# Other models are counted as gpt-4 (cl100k_base encoding and its chat format)
+_DEFAULT_SNAPSHOT = "gpt-4-0314"
+# Every reply is primed with <|start|>assistant<|message|>
+_REPLY_TOKENS = 3
+# Token counts kept (the most recently used), cleared when the session changes
+TOKEN_COUNT_ENTRIES = 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str):
+	"""Get the tiktoken encoding of a model (loaded once per model)."""
+	try:
+		return tiktoken.encoding_for_model(model)
+	except KeyError:
+		return tiktoken.get_encoding("cl100k_base")
 
 
 class NatoGPT():
@@ -18,26 +46,60 @@ class NatoGPT():
 
 	Parameters:
 		CHAT_LOG_DIR (str): The path to the chat log directory.
+		chat_store (ChatLogStore): The saved chat sessions (in CHAT_LOG_DIR, opened on first use).
+		session_name (str): The name of the saved session being continued ("" if not saved yet).
 		messages (list): A list of messages in the chat session.
 		default_msg_len (int): The default length of the messages list.
+		api_base (str): The url of the openai api (default: the openai api).
+		request_timeout (float): Seconds to wait for a reply before giving up.
+		max_requests (int): Maximum number of connections of the pooled http session used by aadd_to_chat.
+		model (str): The chatGPT model to use.
+		max_context_tokens (int): Maximum number of tokens of the messages sent with a prompt.
+		summarize (Callable): Optional hook summarizing the messages trimmed from the context.
+		cache (ResponseCache): Optional cache of the replies (hits and misses are counted there).
+		journal (bool): Write every message to a journal in CHAT_LOG_DIR/journal as it is produced.
 
 	Methods:
 		set_new_session() -> None: Set a new chat session.
 		add_to_chat(message: str) -> Tuple[str, str]: Add a message to the chat session.
-		save_chat_log() -> None: Save the chat session to the chat_log directory.
-		load_chat_log(chat_log str) -> str: Load a chat log from the chat_log directory.
-		get_chat_logs() -> list Get a list of all chat logs in the chat_log directory.
+		aadd_to_chat(message: str) -> Tuple[str, str]: Add a message to the chat session (async).
+		stream_chat(message: str) -> Iterator[str]: Add a message to the chat session, yielding the reply as it arrives.
+		astream_chat(message: str) -> AsyncIterator[str]: Add a message to the chat session, yielding the reply as it arrives (async).
+		aclose() -> None: Close the http session used by aadd_to_chat (on its event loop).
+		save_chat_log() -> None: Save the chat session to the chat log store.
+		load_chat_log(chat_log str) -> str: Load a chat session from the chat log store.
+		get_chat_logs(limit int, before str) -> list Get a page of the saved chat sessions, newest first.
+		search_chat_logs(query str, limit int) -> list: Search the messages of the saved chat sessions.
+		recover_chat_logs() -> list: Save the sessions left in the journal by a crash.
+		close() -> None: Drop the journal of the unsaved session and close the chat log store.
+		trim_messages(messages list) -> list: Drop the oldest messages until the rest fit in max_context_tokens.
+		num_tokens_from_message(message dict) -> int: Get the number of tokens in a message.
 		num_tokens_from_messages(messages list) -> int: Get the number of tokens in a list of messages.
 	
 	:noindex:
 	"""
 
-	def __init__(self, api_key: str):
+	def __init__(self, api_key: str, api_base: str = "", request_timeout: float = 60.0,
+				 max_requests: int = 4, model: str = "gpt-3.5-turbo", max_context_tokens: int = 2500,
+				 summarize: Callable[[list], str] = None, cache: ResponseCache = None,
+				 journal: bool = False):
 		'''Get current directory and path to code_lib directory. 
 		Set the api key and system message storage.
 		
 		Args:
 			api_key (str): The api key for the openai api.
+			api_base (str): The url of the openai api (default: the openai api).
+			request_timeout (float): Seconds to wait for a reply before giving up. (default: 60)
+			max_requests (int): Maximum number of connections of the pooled http session used by aadd_to_chat. (default: 4)
+			model (str): The chatGPT model to use. (default: "gpt-3.5-turbo")
+			max_context_tokens (int): Maximum number of tokens of the messages sent with a prompt,
+				the rest of the model's context is left for the reply. (default: 2500)
+			summarize (Callable): Called with the messages trimmed from the context, returns a
+				summary of them kept as a system message (default: None, trimmed messages are dropped)
+			cache (ResponseCache): Replies to reuse when the same messages are sent to the same
+				model again, instead of calling the api (default: None, no cache)
+			journal (bool): Write every message to a journal as it is produced, so the session
+				can be recovered (recover_chat_logs) if it is lost before being saved. (default: False)
 		
 		:noindex:
 		'''
@@ -46,9 +108,29 @@ class NatoGPT():
 
 		# Set the api key and system message
 		openai.api_key = api_key
+		self.api_base = api_base
+		self.request_timeout = request_timeout
+		self.max_requests = max_requests
+		self.model = model
+		self.max_context_tokens = max_context_tokens
+		self.summarize = summarize
+		self.cache = cache
 		self.all_messages = []
+		self._token_counts = OrderedDict()  # Tokens of recent messages (keyed by model and message items)
+		self._chat_store = None
+		self.journal = journal
+		self._journal = None  # ChatJournal of the unsaved messages, opened with the first one
+		self._journaled = 0  # Number of messages of all_messages written to the journal
+		self._messages_tokens = None  # Tokens of self.messages, None until counted
 		self.set_new_session()
 		self.current_tokens = 0
+
+		# Pooled http session of aadd_to_chat and the lock taking turns in the conversation,
+		# bound to one event loop (a task of the loop closes the session when it is cancelled)
+		self._loop = None
+		self._session = None
+		self._turn_lock = None
+		self._session_task = None
 	
 	def set_new_session(self) -> None:
 		"""Set defaults for a new chat session.
@@ -60,6 +142,13 @@ class NatoGPT():
 					"You are a intelligent, friendly, and funny assistant."} ]
 		self.all_messages.append(self.messages[0])
 		self.default_msg_len = len(self.messages)
+		self._messages_tokens = None
+		self._token_counts.clear()
+
+		# The new session is saved from its system message on
+		self.session_name = ""
+		self._saved_len = len(self.all_messages) - 1
+		self._discard_journal()
 		
 	def add_to_chat(self, message: str) -> Tuple[str, str]:
 		"""Send message to chatGPT and return the reply.
@@ -74,84 +163,381 @@ class NatoGPT():
 		"""
 
 		prompt = message
+		reply = ""
 		
 		if message:
-			# Check token count and shorten messages if necessary
-			msg = {"role": "user", "content": message}
-			msgs_tokens = self.num_tokens_from_messages(self.messages)
-			msgs_tokens += self.num_tokens_from_messages([msg])
-
-			if msgs_tokens > 2500:
-				num_back = int(len(self.messages) / 2) * -1
-				self.messages = self.messages[num_back:]
-		
-			self.messages.append(msg)
-			self.all_messages.append(msg)
-
-			chat = openai.ChatCompletion.create(
-				model="gpt-3.5-turbo", messages=self.messages
-			)
-			reply = chat.choices[0].message.content
-			
-			# Add the reply to the messages list
-			rply = {"role": "assistant", "content": reply}
-			self.messages.append(rply)
-			self.all_messages.append(rply)
+			messages = self._add_prompt(message)
+			key, reply = self._cache_get(messages)
+			if reply is None:
+				chat = openai.ChatCompletion.create(**self._chat_params(messages))
+				reply = chat.choices[0].message.content
+				self._cache_put(key, reply)
+			self._add_reply(reply)
+		
+		return prompt, reply
 
-			msgs_tokens = self.num_tokens_from_messages(self.messages)
-			self.current_tokens = msgs_tokens
-			print(f'Last msg total tokens: {msgs_tokens}')
+	async def aadd_to_chat(self, message: str) -> Tuple[str, str]:
+		"""Send message to chatGPT and return the reply, without blocking the event loop.
+		Requests share one pooled http session and each one gives up after
+		request_timeout seconds. Calls made at the same time take turns, so every
+		prompt is followed by its own reply.
 		
+		Args:
+			message (str): The message to send to chatGPT (prompt).
+
+		Returns:	
+			prompt (str): The message sent to chatGPT.
+			reply (str): The reply from chatGPT.
+		:noindex:
+		"""
+
+		prompt = message
+		reply = ""
+
+		if message:
+			async with self._async_session()[1]:
+				messages = self._add_prompt(message)
+				key, reply = self._cache_get(messages)
+				if reply is None:
+					chat = await self._acreate(messages)
+					reply = chat.choices[0].message.content
+					self._cache_put(key, reply)
+				self._add_reply(reply)
+
 		return prompt, reply
 
+	def stream_chat(self, message: str) -> Iterator[str]:
+		"""Send message to chatGPT and yield the reply piece by piece as it is generated.
+		The whole reply is added to the chat session once the stream ends (or is closed).
+		A cached reply is yielded in one piece.
+		
+		Args:
+			message (str): The message to send to chatGPT (prompt).
+
+		Yields:
+			delta (str): The next piece of the reply.
+		:noindex:
+		"""
+
+		if not message:
+			return
+
+		messages = self._add_prompt(message)
+		key, cached = self._cache_get(messages)
+		if cached is not None:
+			self._add_reply(cached)
+			if cached:
+				yield cached
+			return
+
+		reply = []
+		try:
+			for chunk in openai.ChatCompletion.create(stream=True, **self._chat_params(messages)):
+				delta = chunk.choices[0].delta.get("content")
+				if delta:
+					reply.append(delta)
+					yield delta
+		finally:
+			self._add_reply("".join(reply))
+		# Only a complete reply is cached
+		self._cache_put(key, "".join(reply))
+
+	async def astream_chat(self, message: str) -> AsyncIterator[str]:
+		"""Send message to chatGPT and yield the reply piece by piece as it is generated,
+		without blocking the event loop (see aadd_to_chat). The whole reply is added to
+		the chat session once the stream ends (or is closed). A cached reply is yielded in one piece.
+		
+		Args:
+			message (str): The message to send to chatGPT (prompt).
+
+		Yields:
+			delta (str): The next piece of the reply.
+		:noindex:
+		"""
+
+		if not message:
+			return
+
+		async with self._async_session()[1]:
+			messages = self._add_prompt(message)
+			key, cached = self._cache_get(messages)
+			if cached is not None:
+				self._add_reply(cached)
+				if cached:
+					yield cached
+				return
+
+			reply = []
+			try:
+				async for chunk in await self._acreate(messages, stream=True):
+					delta = chunk.choices[0].delta.get("content")
+					if delta:
+						reply.append(delta)
+						yield delta
+			finally:
+				self._add_reply("".join(reply))
+			# Only a complete reply is cached
+			self._cache_put(key, "".join(reply))
+
+	async def aclose(self) -> None:
+		"""Close the http session used by aadd_to_chat (call it on the event loop that used it).
+		
+		:noindex:
+		"""
+
+		session, task = self._session, self._session_task
+		self._loop = self._session = self._turn_lock = self._session_task = None
+		if task is not None:
+			task.cancel()
+		if session is not None:
+			await session.close()
+
+	def _close_session(self) -> None:
+		"""Close the http session from outside of its event loop: its task is cancelled on the
+		loop, which closes it. A session whose loop was closed by asyncio.run was already closed
+		with it (asyncio.run cancels the tasks left before closing the loop)."""
+
+		loop, task = self._loop, self._session_task
+		self._loop = self._session = self._turn_lock = self._session_task = None
+		if task is not None and not loop.is_closed():
+			loop.call_soon_threadsafe(task.cancel)
+
+	@staticmethod
+	async def _hold_session(session: aiohttp.ClientSession) -> None:
+		"""Keep the http session open until cancelled, then close it (on its own event loop)."""
+
+		try:
+			await asyncio.get_running_loop().create_future()
+		finally:
+			await session.close()
+
+	def _async_session(self) -> Tuple[aiohttp.ClientSession, asyncio.Lock]:
+		"""Get the http session and turn lock of the running event loop, created on
+		first use (and again if the event loop changed, closing the old session)."""
+
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop or self._session.closed:
+			self._close_session()
+			connector = aiohttp.TCPConnector(limit=self.max_requests)
+			self._session = aiohttp.ClientSession(connector=connector)
+			self._turn_lock = asyncio.Lock()
+			self._session_task = loop.create_task(self._hold_session(self._session))
+			self._loop = loop
+		return self._session, self._turn_lock
+
+	async def _acreate(self, messages: list, **params):
+		"""Send a chat completion request on the pooled http session of the running event loop."""
+
+		# openai reads the session to use from a context variable (local to this task)
+		token = openai.aiosession.set(self._async_session()[0])
+		try:
+			return await openai.ChatCompletion.acreate(**self._chat_params(messages), **params)
+		finally:
+			openai.aiosession.reset(token)
+
+	def _cache_get(self, messages: list) -> Tuple[str, str]:
+		"""Look up the cached reply to a list of messages.
+
+		Returns:
+			key (str): Cache key of the request ("" without a cache).
+			reply (str): The cached reply, or None if there is none.
+		"""
+
+		if self.cache is None:
+			return "", None
+		key = ResponseCache.key(self.model, messages)
+		return key, self.cache.get(key)
+
+	def _cache_put(self, key: str, reply: str) -> None:
+		"""Cache the reply to a request (see _cache_get)."""
+
+		if key:
+			self.cache.put(key, reply)
+
+	def _chat_params(self, messages: list) -> dict:
+		"""Arguments of a chat completion request for a list of messages."""
+
+		params = {"model": self.model, "messages": messages,
+				  "request_timeout": self.request_timeout}
+		if self.api_base:
+			params["api_base"] = self.api_base
+		return params
+
+	def _add_prompt(self, message: str) -> list:
+		"""Add a prompt to the chat session, shortening the messages if necessary.
+		
+		Returns:
+			messages (list): The messages to send to chatGPT.
+		"""
+
+		msg = {"role": "user", "content": message}
+		msgs_tokens = self._context_tokens() + self.num_tokens_from_message(msg, self.model)
+		self.messages.append(msg)
+		self.all_messages.append(msg)
+		self._messages_tokens = msgs_tokens
+		self._journal_messages()
+
+		# Check token count and shorten messages if necessary
+		if msgs_tokens > self.max_context_tokens:
+			self.messages = self.trim_messages(self.messages)
+			self._messages_tokens = None
+		return list(self.messages)
+
+	def _add_reply(self, reply: str) -> None:
+		"""Add the reply from chatGPT to the chat session."""
+
+		# Add the reply to the messages list
+		rply = {"role": "assistant", "content": reply}
+		msgs_tokens = self._context_tokens() + self.num_tokens_from_message(rply, self.model)
+		self.messages.append(rply)
+		self.all_messages.append(rply)
+		self._messages_tokens = msgs_tokens
+		self.current_tokens = msgs_tokens
+		self._journal_messages()
+
+	@property
+	def chat_store(self) -> ChatLogStore:
+		"""The store of saved chat sessions, opened on first use. Chat logs saved
+		as json files in the chat_log directory are imported into it."""
+
+		if self._chat_store is None:
+			self._chat_store = ChatLogStore(os.path.join(self.CHAT_LOG_DIR, "chat_logs.sqlite3"))
+			self._chat_store.import_json_logs(self.CHAT_LOG_DIR, self._count_tokens)
+		return self._chat_store
+
+	def _count_tokens(self, message: dict) -> int:
+		return self.num_tokens_from_message(message, self.model)
+
+	def _journal_messages(self) -> None:
+		"""Write the unsaved messages not in the journal yet to the journal (if enabled)."""
+
+		if not self.journal:
+			return
+		if self._journal is None:
+			# Name the journal after the session it will be saved as
+			name = self.session_name or datetime.datetime.now().strftime("chat_%Y-%m-%d-%H-%M-%S")
+			path = os.path.join(self.CHAT_LOG_DIR, "journal", f"{name}.jsonl")
+			n = 1
+			while os.path.exists(path):
+				path = os.path.join(self.CHAT_LOG_DIR, "journal", f"{name}-{n}.jsonl")
+				n += 1
+			self._journal = ChatJournal(path, self.session_name)
+			self._journaled = self._saved_len
+
+		for message in self.all_messages[self._journaled:]:
+			self._journal.append(message, self._count_tokens(message))
+		self._journaled = len(self.all_messages)
+
+	def _discard_journal(self) -> None:
+		"""Remove the journal (its messages are saved, or dropped with their session)."""
+
+		if self._journal is not None:
+			self._journal.discard()
+			self._journal = None
+
+	def recover_chat_logs(self) -> list:
+		"""Save the chat sessions left in the journal directory, ex- by a crash before they
+		were saved. Messages continuing a saved session are added to it, other sessions
+		are saved under the name of their journal. Journals of other instances still
+		running (holding their journal's lock) are left alone.
+		
+		Returns:
+			names (list): The names of the sessions recovered.
+		:noindex:
+		"""
+
+		own_journal = self._journal.path if self._journal is not None else ""
+		recovered = []
+		for path in sorted(glob.glob(os.path.join(self.CHAT_LOG_DIR, "journal", "*.jsonl"))):
+			if path == own_journal:
+				continue
+			try:
+				journal = ChatJournal(path)
+			except BlockingIOError:
+				continue
+			with journal:
+				session, messages, tokens = ChatJournal.read(path)
+				if messages:
+					if session and self.chat_store.session(session) is not None:
+						self.chat_store.append_messages(session, messages, tokens)
+					else:
+						name = os.path.splitext(os.path.basename(path))[0]
+						session = self.chat_store.save_session(name, messages, tokens)
+					recovered.append(session)
+				journal.discard()
+		return recovered
+
+	def close(self) -> None:
+		"""Drop the journal of the unsaved session (as the session itself is dropped),
+		close the http session of aadd_to_chat (if aclose was not awaited) and the chat log store.
+		
+		:noindex:
+		"""
+
+		self._discard_journal()
+		self._close_session()
+		if self._chat_store is not None:
+			self._chat_store.close()
+			self._chat_store = None
+
 	def save_chat_log(self) -> None:
-		"""Save the chat log to the chat_log directory.
-		It will be saved as chat_<date-time>.json if a
-		chat session has occurred.
+		"""Save the chat session to the chat log store, if a chat session has occurred.
+		A new session is saved as chat_<date-time>, a session saved (or loaded) before
+		only gets its new messages added.
 		:noindex:
 		"""
 
 		# Check if a chat session has occurred, if not, return
-		if len(self.all_messages) == self.default_msg_len:
+		unsaved = self.all_messages[self._saved_len:]
+		if len(unsaved) == 0 or (not self.session_name and len(unsaved) <= self.default_msg_len):
 			return
 
-		# Get the current date and time to form the chat log name
-		now = datetime.datetime.now()
-		chat_fname = now.strftime("chat_%Y-%m-%d-%H-%M-%S.json")
-		chat_fpath = os.path.join(self.CHAT_LOG_DIR, chat_fname)
+		tokens = [self._count_tokens(m) for m in unsaved]
+		if self.session_name:
+			self.chat_store.append_messages(self.session_name, unsaved, tokens)
+		else:
+			# Get the current date and time to form the chat log name
+			now = datetime.datetime.now()
+			chat_name = now.strftime("chat_%Y-%m-%d-%H-%M-%S")
+			self.session_name = self.chat_store.save_session(chat_name, unsaved, tokens)
+		self._saved_len = len(self.all_messages)
 
-		# Save the chat log to the chat_log directory
-		with open(chat_fpath, 'w') as f:
-			json.dump(self.all_messages, f, indent=4)
+		# The journal is compacted into the store, the next messages start a new one
+		self._discard_journal()
 
-	def load_chat_log(self, chat_log: str) -> str:
-		"""Load a chat log by name from the chat_log directory.
+	def load_chat_log(self, chat_log: str, max_messages: int = 200) -> str:
+		"""Load a saved chat session by name, to continue it. Only its system message
+		and last max_messages messages are read.
 		
 		Args:
-			chat_log (str): The name of the chat log to load.
+			chat_log (str): The name of the chat session to load.
+			max_messages (int): The number of messages to load. (default: 200)
 			
 		Returns:
-			chat_log (str): All messages in the chat log as a single string.
+			chat_log (str): The messages loaded as a single string.
 		:noindex:
 		"""
 
-		# Get the path to the chat log
-		fpath = os.path.join(self.CHAT_LOG_DIR, chat_log)
-
-		# Load the chat log
-		try:
-			with open(fpath, 'r') as f:
-				self.all_messages = json.load(f)
-		except json.decoder.JSONDecodeError:
-			messagebox.showerror("Error", "Improperly formatted json. Probably a failed final response. Check the file.")
+		session = self.chat_store.session(chat_log)
+		if session is None:
+			show_error("Error", f"Chat log not found: {chat_log}")
 			return
 
-		# Load the all_messages list and reduce the messages list if necessary
-		tks = self.num_tokens_from_messages(self.all_messages)
-		if tks > 2500:
-			num_back = int(len(self.all_messages) * (2500/tks)) * -1
-			self.messages = self.all_messages[num_back:]
-			print(len(self.all_messages), len(self.messages))
+		# Load the last messages, and the system message starting the session
+		offset = max(session.message_count - max_messages, 0)
+		self.all_messages = self.chat_store.load_messages(chat_log, offset)
+		if offset:
+			first = self.chat_store.load_messages(chat_log, 0, 1)
+			if first[0]["role"] == "system":
+				self.all_messages.insert(0, first[0])
+		self.session_name = chat_log
+		self._saved_len = len(self.all_messages)
+		self._discard_journal()
+
+		# Continue the chat from the loaded messages, reduced if necessary
+		self._token_counts.clear()
+		self.messages = self.trim_messages(self.all_messages)
+		self._messages_tokens = None
 
 		# Get the user and assistant messages
 		user_messages = [m['content'] for m in self.all_messages if m['role'] == 'user']
@@ -159,6 +545,9 @@ class NatoGPT():
 
 		# Sort the messages so that the user and assistant messages are in order
 		messages = []
+		if offset:
+			messages.append(f"({offset} earlier messages not shown)")
+			messages.append(f"{'='*60}")
 		
 		# If there are more user messages than assistant messages, add a missing assistant message
 		if len(user_messages) > len(assistant_messages):
@@ -174,55 +563,119 @@ class NatoGPT():
 		messages = '\n'.join(messages)
 		return messages
 
-	def get_chat_logs(self) -> list:
-		"""Get a list of all chat logs in the chat_log directory.
+	def get_chat_logs(self, limit: int = 50, before: str = "") -> list:
+		"""Get a page of the saved chat sessions, most recently updated first.
 		
+		Args:
+			limit (int): The maximum number of sessions. (default: 50)
+			before (str): The name of the last session of the previous page. (default: start with the newest)
+
 		Returns:
-			chat_logs (list): A list of all chat logs in the chat_log directory.
+			chat_logs (list): The names of the chat sessions.
 		:noindex:
 		"""
 
-		# Get the path to the chat log
-		chat_files = glob.glob(f"{self.CHAT_LOG_DIR}/*.json")
-		return sorted(chat_files, key=os.path.getmtime, reverse=True)
-	
-	def num_tokens_from_messages(self, messages, model="gpt-3.5-turbo-0301"):
-		"""Returns the number of tokens used by a list of messages.
+		store = self.chat_store
+		last = store.session(before) if before else None
+		return [session.name for session in store.list_sessions(limit, last)]
+
+	def search_chat_logs(self, query: str, limit: int = 20) -> list:
+		"""Search the messages of the saved chat sessions, best matches first.
+		
+		Args:
+			query (str): The words to search for (every word must be found, end a word with * to match a prefix).
+			limit (int): The maximum number of messages. (default: 20)
+
+		Returns:
+			hits (list): ChatSearchHit (session, seq, role, snippet, score) of each message found.
+		:noindex:
+		"""
+
+		return self.chat_store.search(query, limit)
+
+	def _context_tokens(self) -> int:
+		"""Get the number of tokens in self.messages (kept up to date as messages are added)."""
+
+		if self._messages_tokens is None:
+			self._messages_tokens = self.num_tokens_from_messages(self.messages, self.model)
+		return self._messages_tokens
+
+	def trim_messages(self, messages: list) -> list:
+		"""Drop the oldest messages until the rest fit in max_context_tokens.
+		The system message (first message) and the last message are always kept, and
+		a reply is never kept without its prompt. When a summarize hook is set, the
+		dropped messages are replaced by a system message with their summary.
 		
 		Args:
 			messages (list): A list of messages.
-			model (str): The model to use for tokenization. (default: "gpt-3.5-turbo-0301")
 
 		Returns:
-			num_tokens (int): The number of tokens that will be used by the messages.
+			messages (list): The messages that fit (a new list).
+		:noindex:
+		"""
+
+		head = messages[:1] if messages and messages[0]["role"] == "system" else []
+		turns = messages[len(head):]
+		tokens = [self.num_tokens_from_message(m, self.model) for m in turns]
+		total = self.num_tokens_from_messages(head, self.model) + sum(tokens)
+
+		def drop_oldest(start: int, total: int) -> Tuple[int, int]:
+			# Drop messages until the budget is met, then any reply left without its prompt
+			while start < len(turns) - 1 and (total > self.max_context_tokens
+											  or start and turns[start]["role"] == "assistant"):
+				total -= tokens[start]
+				start += 1
+			return start, total
+
+		start, total = drop_oldest(0, total)
+		if start and self.summarize is not None:
+			summary = {"role": "system", "content": self.summarize(turns[:start])}
+			head = head + [summary]
+			start, total = drop_oldest(start, total + self.num_tokens_from_message(summary, self.model))
+		return head + turns[start:]
+
+	def num_tokens_from_message(self, message: dict, model: str = "gpt-3.5-turbo-0301") -> int:
+		"""Returns the number of tokens used by a message, without the tokens priming the reply.
+		The counts of the last TOKEN_COUNT_ENTRIES messages used are kept.
+		
+		Args:
+			message (dict): A message.
+			model (str): The model to use for tokenization, unknown models are counted as gpt-4. (default: "gpt-3.5-turbo-0301")
+
+		Returns:
+			num_tokens (int): The number of tokens that will be used by the message.
 
 		"""
-		try:
-			encoding = tiktoken.encoding_for_model(model)
-		except KeyError:
-			print("Warning: model not found. Using cl100k_base encoding.")
-			encoding = tiktoken.get_encoding("cl100k_base")
-		if model == "gpt-3.5-turbo":
-			print("Warning: gpt-3.5-turbo may change over time. Returning num tokens assuming gpt-3.5-turbo-0301.")
-			return self.num_tokens_from_messages(messages, model="gpt-3.5-turbo-0301")
-		elif model == "gpt-4":
-			print("Warning: gpt-4 may change over time. Returning num tokens assuming gpt-4-0314.")
-			return self.num_tokens_from_messages(messages, model="gpt-4-0314")
-		elif model == "gpt-3.5-turbo-0301":
-			tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-			tokens_per_name = -1  # if there's a name, the role is omitted
-		elif model == "gpt-4-0314":
-			tokens_per_message = 3
-			tokens_per_name = 1
+		key = (model, *message.items())
+		num_tokens = self._token_counts.get(key)
+		if num_tokens is not None:
+			self._token_counts.move_to_end(key)
 		else:
-			raise NotImplementedError(f"""num_tokens_from_messages() is not implemented for model {model}. See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens.""")
-		num_tokens = 0
-		for message in messages:
-			num_tokens += tokens_per_message
-			for key, value in message.items():
+			snapshot = _MODEL_SNAPSHOTS.get(model, model)
+			if snapshot not in _CHAT_FORMAT:
+				snapshot = _DEFAULT_SNAPSHOT
+			tokens_per_message, tokens_per_name = _CHAT_FORMAT[snapshot]
+			encoding = _encoding(snapshot)
+			num_tokens = tokens_per_message
+			for key_name, value in message.items():
 				num_tokens += len(encoding.encode(value))
-				if key == "name":
+				if key_name == "name":
 					num_tokens += tokens_per_name
-		num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
+			self._token_counts[key] = num_tokens
+			if len(self._token_counts) > TOKEN_COUNT_ENTRIES:
+				self._token_counts.popitem(last=False)
 		return num_tokens
 
+	def num_tokens_from_messages(self, messages, model="gpt-3.5-turbo-0301"):
+		"""Returns the number of tokens used by a list of messages.
+		
+		Args:
+			messages (list): A list of messages.
+			model (str): The model to use for tokenization. (default: "gpt-3.5-turbo-0301")
+
+		Returns:
+			num_tokens (int): The number of tokens that will be used by the messages.
+
+		"""
+		num_tokens = sum(self.num_tokens_from_message(message, model) for message in messages)
+		return num_tokens + _REPLY_TOKENS
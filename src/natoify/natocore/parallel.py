@@ -0,0 +1,335 @@
+"""
+Multi-core encoding and decoding of large messages.
+
+The message is cut into shards that are encoded or decoded by a pool of worker
+processes (each holding a pre-warmed Natoify engine), the results are put back
+together in order. The output is the same as Natoify.encode_stream/decode_stream.
+
+Shards are cut where no state crosses the boundary:
+    encode  : anywhere but right after a period (STOP or POINT depends on the next character)
+    decode  : after a line break
+    decrypt : after a double space (decrypted messages are a single line)
+
+A shard with no such place is cut by force once it reaches MAX_SHARD_FACTOR times
+the shard size (ex- a message that is a single long line):
+    encode          : between two periods (a period followed by a period is not a STOP)
+    decode, decrypt : between two code words (after a space followed by a code word)
+Decoded shards return the decoded start and end of their line (word when decrypting)
+apart, the parts are joined with the neighbouring shards once they are back in order.
+
+The Vigenere key position of an encrypted shard is its offset in the whole
+message. Encrypting happens in a second pass once the length of every earlier
+encoded shard is known, decrypting uses the offset of the shard in the input.
+"""
+
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+from .codec import _DECODE_ERROR, vigenere_cipher
+from .engine import Natoify
+
+
+# Shards without a place to cut are cut by force at this many times the shard size
+MAX_SHARD_FACTOR = 4
+
+# Natoify engine of a worker process and the Codec of its code, set up by _init_worker
+_worker_nato = None
+_worker_codec = None
+
+
+def _init_worker(code: str) -> None:
+    """Load the code library once per worker process."""
+    global _worker_nato, _worker_codec
+    _worker_nato = Natoify()
+    _worker_nato.set_code(code)
+    _worker_codec = _worker_nato.codec()
+
+
+def _encode_shard(shard: str) -> str:
+    """Encode a cleaned shard (not stripped, the caller handles the message ends)."""
+    return _worker_codec.encode_text(shard.upper())
+
+
+def _encrypt_shard(nato_text: str, offset: int) -> str:
+    """Encrypt an encoded shard found at offset in the whole NATO message."""
+    return vigenere_cipher(nato_text, _worker_codec.name, encrypt=True, offset=offset)
+
+
+def _decode_shard(shard: str, decrypt: bool, offset: int) -> tuple:
+    """Decode a shard found at offset in the whole message. The first and last line of
+    the shard (word when decrypting) may go on in the neighbouring shards, they are
+    returned apart to be joined with them (see _join_decoded).
+
+    Returns:
+        first : Decoded start of the shard, up to its first line break (double space)
+        body (str): Decoded complete lines (words) in between, None if there is no break
+        last : Decoded end of the shard, after its last line break (double space)
+    """
+
+    codec = _worker_codec
+    if decrypt:
+        text = vigenere_cipher(shard, codec.name, encrypt=False, offset=offset).upper()
+        # Decrypted text has no line breaks, the whole message is a single line of words
+        words = list(map(codec.decode_group, text.split("  ")))
+        if len(words) == 1:
+            return words[0], None, ""
+        return words[0], "".join(word + " " for word in words[1:-1] if word), words[-1]
+
+    # The words of the first and last line are kept as is, a word may go on in the next shard
+    lines = shard.upper().split("\n")
+    first = list(map(codec.decode_group, lines[0].split("  ")))
+    if len(lines) == 1:
+        return first, None, [""]
+    body = []
+    for line in lines[1:-1]:
+        words = [word + " " for word in map(codec.decode_group, line.split("  ")) if word]
+        if words:
+            body.append("".join(words).strip() + "\n")
+    return first, "".join(body), list(map(codec.decode_group, lines[-1].split("  ")))
+
+
+def _join_decoded(parts: Iterable[tuple], decrypt: bool) -> Iterator[str]:
+    """Join the decoded shards (see _decode_shard), in order, into the decoded message.
+
+    Yields:
+        str: The next piece of the decoded message, the decoded message is all of them joined and stripped
+    """
+
+    if decrypt:
+        finish = lambda word: word + " " if word else ""
+        carry = ""
+    else:
+        finish = lambda words: "".join(word + " " for word in words if word).strip() + "\n" if any(words) else ""
+        carry = [""]
+    for (first, body, last) in parts:
+        # The word cut between the shards is put back together
+        if decrypt:
+            carry += first
+        else:
+            carry[-1] += first[0]
+            carry += first[1:]
+        if body is None:
+            continue
+        yield finish(carry) + body
+        carry = last
+    yield finish(carry)
+
+
+def _map_batch_part(method: str, messages: list, codes: list, crypt: bool) -> list:
+    """Run Natoify.encode_many or decode_many on a part of a batch."""
+    return getattr(_worker_nato, method)(messages, codes, crypt)
+
+
+def map_batch(method: str, messages: list, codes: list, crypt: bool, jobs: int, code: str = "NATO") -> list:
+    """Split a batch of messages across worker processes (see Natoify.encode_many).
+
+    Args:
+        method (str): "encode_many" or "decode_many"
+        messages (list): The messages of the batch
+        codes (list): Code library name of each message
+        crypt (bool): Encrypt (or decrypt) the messages
+        jobs (int): Number of worker processes
+        code (str): Code library the workers load up front (the caller's current code)
+
+    Returns:
+        list: The results, in the same order as the messages
+    """
+
+    size = -(-len(messages) // jobs)
+    parts = range(0, len(messages), size)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(code.upper(),)) as executor:
+        tasks = ((_map_batch_part, (method, messages[i : i + size], codes[i : i + size], crypt)) for i in parts)
+        return [result for part in _in_order(executor, tasks, jobs) for result in part]
+
+
+def _cut_shards(chunks: Iterable[str], shard_size: int, cut: Callable[[str], int],
+                force: Callable[[str], int]) -> Iterator[str]:
+    """Join text chunks into shards of about shard_size characters. Only each new
+    chunk (and the character before it) is searched for the last place to cut.
+
+    Args:
+        chunks (Iterable[str]): The message, in pieces of any size
+        shard_size (int): Minimum size of a shard (except the last one)
+        cut (Callable): Returns where a text can be cut, the last place (0 if it can't be)
+        force (Callable): Returns the last place a text is cut by force (0 if none), used
+            once a shard with no place to cut reaches MAX_SHARD_FACTOR * shard_size
+
+    Yields:
+        str: The next shard
+    """
+
+    pieces = []  # The text not sent yet
+    size = 0  # Its length
+    end = 0  # The last place it can be cut (0 if none)
+    forced_end = 0  # The last place it can be cut by force (0 if none)
+    before = ""  # Its last character
+    for chunk in chunks:
+        if not chunk:
+            continue
+        window = before + chunk
+        found = cut(window)
+        if found > 0:
+            end = size - len(before) + found
+        found = force(window)
+        if found > 0:
+            forced_end = size - len(before) + found
+        pieces.append(chunk)
+        size += len(chunk)
+        before = chunk[-1]
+
+        if size < shard_size:
+            continue
+        if end <= 0:
+            if size < MAX_SHARD_FACTOR * shard_size or forced_end <= 0:
+                continue
+            end = forced_end
+        buffer = "".join(pieces)
+        yield buffer[:end]
+        rest = buffer[end:]
+        pieces, size, end, forced_end = [rest] if rest else [], len(rest), 0, 0
+    if pieces:
+        yield "".join(pieces)
+
+
+def _in_order(executor: ProcessPoolExecutor, tasks: Iterable, window: int) -> Iterator:
+    """Submit (function, args) tasks lazily and yield their results in order,
+    keeping at most window tasks in flight."""
+
+    running = collections.deque()
+    for (fn, args) in tasks:
+        running.append(executor.submit(fn, *args))
+        if len(running) >= window:
+            yield running.popleft().result()
+    while running:
+        yield running.popleft().result()
+
+
+def encode_parallel(chunks: Iterable[str], code: str = "NATO", encrypt: bool = False,
+                    jobs: int = 0, shard_size: int = 1 << 20) -> Iterator[str]:
+    """Encode a message using several processes, yielding the NATO message in order.
+    Output is the same as Natoify.encode_stream.
+
+    Args:
+        chunks (Iterable[str]): The message, in pieces of any size
+        code (str): Code library to use. Defaults to "NATO"
+        encrypt (bool): Encrypt the message after encoding. Defaults to False
+        jobs (int): Number of worker processes (default: number of CPUs)
+        shard_size (int): Approximate number of characters encoded per task
+
+    Raises:
+        ValueError: If the message is empty
+
+    Yields:
+        str: The next piece of the NATO message
+    """
+
+    jobs = jobs or os.cpu_count() or 1
+
+    def shards() -> Iterator[str]:
+        # Clean up the message, skip leading whitespace, and hold back shards
+        # of whitespace (stripped if they end the message)
+        nonlocal empty
+        started = False
+        pending = ""
+        cut = lambda text: len(text.rstrip("."))
+        # Before the last character of a run of periods
+        force = lambda text: len(text) - 1 if text.endswith("..") else 0
+        for shard in _cut_shards(chunks, shard_size, cut, force):
+            empty = False
+            if not shard.isascii():
+                shard = shard.encode("ascii", "ignore").decode("ascii")
+            if not started:
+                shard = shard.lstrip()
+                if not shard:
+                    continue
+                started = True
+            if pending and shard.strip():
+                yield pending
+                pending = ""
+            pending += shard
+        if pending:
+            # Add a space so a final period is treated as a STOP
+            yield pending.rstrip() + " "
+
+    empty = True
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(code.upper(),)) as executor:
+        encoded = _in_order(executor, ((_encode_shard, (shard,)) for shard in shards()), jobs * 2)
+
+        if encrypt:
+            def with_offsets(encoded: Iterator[str]) -> Iterator:
+                offset = 0
+                for nato_text in encoded:
+                    yield (_encrypt_shard, (nato_text, offset))
+                    offset += len(nato_text)
+
+            encoded = _in_order(executor, with_offsets(encoded), jobs * 2)
+
+        # Only the end of the last shard has spaces to strip (spaces encrypt to spaces)
+        held = ""
+        for nato_text in encoded:
+            nato_text = held + nato_text
+            ready = nato_text.rstrip(" ")
+            held = nato_text[len(ready):]
+            if ready:
+                yield ready
+
+    if empty:
+        raise ValueError("Message cannot be empty")
+
+
+def decode_parallel(chunks: Iterable[str], code: str = "NATO", decrypt: bool = False,
+                    jobs: int = 0, shard_size: int = 1 << 20) -> Iterator[str]:
+    """Decode a NATO message using several processes, yielding the decoded message in order.
+    Output is the same as Natoify.decode_stream.
+
+    Args:
+        chunks (Iterable[str]): The NATO message, in pieces of any size
+        code (str): Code library to use. Defaults to "NATO"
+        decrypt (bool): Decrypt the message before decoding. Defaults to False
+        jobs (int): Number of worker processes (default: number of CPUs)
+        shard_size (int): Approximate number of characters decoded per task
+
+    Raises:
+        ValueError: If the message is empty
+
+    Yields:
+        str: The next piece of the decoded message
+    """
+
+    jobs = jobs or os.cpu_count() or 1
+    if decrypt:
+        cut = lambda text: text.rfind("  ") + 2 if "  " in text else 0
+    else:
+        cut = lambda text: text.rfind("\n") + 1
+    # After the last space followed by a code word
+    force = lambda text: text.rstrip(" ").rfind(" ") + 1
+
+    def tasks() -> Iterator:
+        nonlocal empty
+        offset = 0
+        for shard in _cut_shards(chunks, shard_size, cut, force):
+            empty = False
+            yield (_decode_shard, (shard, decrypt, offset))
+            offset += len(shard)
+
+    empty = True
+    emitted = False
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(code.upper(),)) as executor:
+        # The decoded message is every shard joined and stripped
+        held = ""
+        for decoded in _join_decoded(_in_order(executor, tasks(), jobs * 2), decrypt):
+            if not emitted:
+                decoded = decoded.lstrip()
+            decoded = held + decoded
+            ready = decoded.rstrip()
+            held = decoded[len(ready):]
+            if ready:
+                emitted = True
+                yield ready
+
+    if empty:
+        raise ValueError("Message cannot be empty")
+    if not emitted:
+        yield _DECODE_ERROR
@@ -0,0 +1,245 @@
+"""
+Process-wide registry of the json code libraries available to Natoify.
+
+Library names are indexed from the precompiled bundle of a directory (see bundle.py)
+or, when no bundle is available, from the code.json files without parsing them. The
+code table of a library is only decoded the first time it is used. Parsed tables are
+shared (read-only) by every Natoify instance in the process.
+"""
+
+import glob
+import json
+import os
+import re
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from .bundle import load_bundle
+
+
+# Matches the first library name at the top of a code.json file, ex- '{ "NATO": {'
+_FIRST_NAME = re.compile(r'\s*\{\s*"((?:[^"\\]|\\.)*)"\s*:')
+# Number of bytes read from the top of a code.json file to find the library name
+_HEADER_SIZE = 256
+
+
+class CodeRegistry(Mapping):
+    """
+    Read-only mapping of code library names to their code tables (letter:word pairs).
+    Libraries are indexed by name from a directory and parsed on first access.
+
+    Methods:
+        index (directory str) -> list : Index the code libraries found in a directory
+        reverse (name str) -> Mapping : Letters of a library keyed by code word
+        libraries_by_word () -> Mapping : Names of the libraries using each code word
+        invalidate (name str) -> None : Forget a parsed library (or everything if no name)
+
+    Examples:
+        >>> registry = CodeRegistry()
+        >>> registry.index("../code_lib")
+        ['AFRICA', 'ALIENABDUCTION', ...]
+        >>> registry["NATO"]["A"]
+        'ALFA'
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._paths = {}  # Library name -> code.json file path
+        self._tables = {}  # Library name -> parsed (read-only) code table
+        self._reverse = {}  # Library name -> read-only reverse code table
+        self._bundles = {}  # Library name -> CodeBundle holding the library
+        self._directories = set()  # Directories already indexed
+        self._word_index = None  # Code word -> names of the libraries using it
+
+    def __getitem__(self, name: str) -> Mapping:
+        table = self._tables.get(name)
+        if table is None:
+            table = self._load(name)
+        return table
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._paths
+
+    def __iter__(self):
+        return iter(list(self._paths))
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def _read_name(self, json_file: str) -> str:
+        """Find the library name of a code.json file by peeking at the top of it,
+        falls back to the file name when the header can't be read.
+
+        Args:
+            json_file (str): Path to the code.json file
+
+        Returns:
+            name (str): The library name
+        """
+
+        with open(json_file, "r") as f:
+            header = f.read(_HEADER_SIZE)
+        match = _FIRST_NAME.match(header)
+        if match is None:
+            return os.path.splitext(os.path.basename(json_file))[0].upper()
+        return json.loads(f'"{match.group(1)}"')
+
+    def _load(self, name: str) -> Mapping:
+        """Parse the code.json file of a library and cache every library it contains.
+
+        Args:
+            name (str): The library name
+
+        Raises:
+            KeyError: If the library is not indexed (or missing from its file)
+            json.decoder.JSONDecodeError: If the code.json file is improperly formatted
+
+        Returns:
+            table (Mapping): Read-only code table of the library
+        """
+
+        with self._lock:
+            if name in self._tables:
+                return self._tables[name]
+
+            json_file = self._paths[name]
+            bundle = self._bundles.get(name)
+            if bundle is not None:
+                self._tables[name] = MappingProxyType(bundle.forward(name))
+                return self._tables[name]
+
+            with open(json_file, "r") as f:
+                codes = json.load(f)
+
+            # A file may hold more than one library, keep them all
+            for lib_name, table in codes.items():
+                if self._paths.setdefault(lib_name, json_file) == json_file:
+                    self._tables[lib_name] = MappingProxyType(dict(table))
+
+            return self._tables[name]
+
+    def reverse(self, name: str) -> Mapping:
+        """Letters of a library keyed by code word (read-only).
+        Later letters win when a code word is used twice.
+
+        Args:
+            name (str): The library name
+
+        Returns:
+            table (Mapping): Read-only reverse code table of the library
+        """
+
+        table = self._reverse.get(name)
+        if table is None:
+            # Locked so the bundle is not closed while it is read
+            with self._lock:
+                bundle = self._bundles.get(name)
+                if bundle is not None:
+                    table = bundle.reverse(name)
+                else:
+                    table = {word: letter for (letter, word) in self[name].items()}
+                table = self._reverse.setdefault(name, MappingProxyType(table))
+        return table
+
+    def libraries_by_word(self) -> Mapping:
+        """Inverted index of every indexed library: the names of the libraries
+        using each code word. Built once (parsing every library) until a
+        directory is indexed or a library invalidated.
+
+        Returns:
+            index (Mapping): Read-only frozensets of library names keyed by code word
+        """
+
+        index = self._word_index
+        if index is None:
+            with self._lock:
+                libraries = {}
+                for name in list(self._paths):
+                    for word in self.reverse(name):
+                        # Whitespace is a code word of its own in every library
+                        if word.strip():
+                            libraries.setdefault(word, []).append(name)
+                index = MappingProxyType({word: frozenset(names) for (word, names) in libraries.items()})
+                self._word_index = index
+        return index
+
+    def index(self, directory: str) -> list:
+        """Index the code libraries found in a directory of code.json files.
+        Names come from the precompiled bundle of the directory (built or refreshed
+        when needed) and otherwise from the top of each code.json file.
+        A directory is indexed once until invalidated. Names already indexed from
+        another file are kept.
+
+        Args:
+            directory (str): The directory containing the code.json files
+
+        Raises:
+            FileNotFoundError: If the directory has no code.json files
+
+        Returns:
+            names (list): Library names found in the directory
+        """
+
+        directory = os.path.realpath(directory)
+        with self._lock:
+            if directory in self._directories:
+                return [n for (n, p) in self._paths.items() if os.path.dirname(p) == directory]
+
+            # Get a list of all the json files in the directory
+            json_files = glob.glob(f"{directory}/*.json")
+
+            # If there is a problem with the directory, raise an error
+            if len(json_files) == 0:
+                raise FileNotFoundError(f"No code.json files found in: {directory}")
+
+            names = []
+            bundle = load_bundle(directory)
+            if bundle is not None:
+                for name in bundle.names():
+                    json_file = os.path.join(directory, bundle.source(name))
+                    if self._paths.setdefault(name, json_file) == json_file:
+                        self._bundles[name] = bundle
+                    names.append(name)
+            else:
+                for json_file in json_files:
+                    name = self._read_name(json_file)
+                    self._paths.setdefault(name, json_file)
+                    names.append(name)
+
+            self._directories.add(directory)
+            self._word_index = None
+            return names
+
+    def invalidate(self, name: str = "") -> None:
+        """Forget a parsed library so it is read again on next use. Without a name,
+        everything is forgotten and directories must be indexed again. Bundles no
+        library is read from anymore are closed.
+
+        Args:
+            name (str): The library name (default: all libraries)
+        """
+
+        with self._lock:
+            self._word_index = None
+            if name:
+                self._tables.pop(name, None)
+                self._reverse.pop(name, None)
+                bundles = [self._bundles.pop(name, None)]
+            else:
+                self._tables.clear()
+                self._reverse.clear()
+                bundles = list(self._bundles.values())
+                self._bundles.clear()
+                self._paths.clear()
+                self._directories.clear()
+
+            # A bundle holds every library of its directory, keep it open while one is left
+            in_use = set(map(id, self._bundles.values()))
+            for bundle in {id(bundle): bundle for bundle in bundles if bundle is not None}.values():
+                if id(bundle) not in in_use:
+                    bundle.close()
+
+
+# Registry shared by every Natoify instance
+CODE_REGISTRY = CodeRegistry()
@@ -0,0 +1,73 @@
+# Tests for the batch encode and decode functions
+
+import pytest
+
+from natoify import Natoify
+from natoify.natocore import engine
+
+nato = Natoify()
+
+messages = [
+    "Hello World!",
+    "This is a test message. 1234. STOP\nPi is 3.14. The end.",
+    "  &amp; escaped &lt;text&gt;  ",
+    "Café naïve.",
+    "",
+]
+
+
+@pytest.mark.parametrize("code", ["NATO", "REDNECK", "HARRYPOTTER"])
+@pytest.mark.parametrize("encrypt", [False, True])
+def test_encode_many_matches_encode(code, encrypt):
+    """Test that batch encoding gives the same messages as encode
+    """
+    batch = messages[:-1]
+    nato.set_code(code)
+    expected = [nato.encode(message, encrypt) for message in batch]
+    nato.set_code("NATO")
+    assert nato.encode_many(batch, code, encrypt) == expected
+    assert nato.current_code == "NATO"
+
+@pytest.mark.parametrize("decrypt", [False, True])
+def test_decode_many_matches_decode(decrypt):
+    """Test that batch decoding gives the same messages as decode
+    """
+    nato.set_code("NATO")
+    encoded = nato.encode_many(messages[:-1], encrypt=decrypt) + ["NOT A NATO MESSAGE"]
+    expected = [nato.decode(message, decrypt) for message in encoded]
+    assert nato.decode_many(encoded, decrypt=decrypt) == expected
+
+def test_mixed_codes():
+    """Test that every message of a batch can use its own code library
+    """
+    codes = ["NATO", "REDNECK", "NATO", "GHETTO"]
+    batch = ["Hello", "World!", "Foo bar.", "Baz"]
+    encoded = nato.encode_many(batch, codes)
+    for (message, code, nato_message) in zip(batch, codes, encoded):
+        nato.set_code(code)
+        assert nato.encode(message) == nato_message
+    assert nato.decode_many(encoded, codes) == [m.upper() for m in batch]
+
+def test_empty_message():
+    """Test that an empty message in a batch raises an error
+    """
+    with pytest.raises(ValueError):
+        nato.encode_many(messages)
+    with pytest.raises(ValueError):
+        nato.decode_many(["ALFA", None])
+
+def test_code_count_mismatch():
+    """Test that a list of codes must have one code per message
+    """
+    with pytest.raises(ValueError):
+        nato.encode_many(["A", "B"], ["NATO"])
+
+def test_process_pool(monkeypatch):
+    """Test that large batches split across processes give the same results
+    """
+    monkeypatch.setattr(engine, "BATCH_POOL_THRESHOLD", 4)
+    batch = messages[:-1] * 3
+    codes = ["NATO", "REDNECK", "GHETTO"] * 4
+    expected = nato.encode_many(batch, codes, encrypt=True)
+    assert nato.encode_many(batch, codes, encrypt=True, jobs=2) == expected
+    assert nato.decode_many(expected, codes, decrypt=True, jobs=2) == nato.decode_many(expected, codes, decrypt=True)
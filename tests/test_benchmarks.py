@@ -0,0 +1,33 @@
+# Tests for the benchmark runner
+
+from benchmarks import Case, corpus, format_size, parse_size
+from benchmarks.run import compare, time_case
+
+
+def test_sizes():
+    """Test that input sizes are read and written with units
+    """
+    assert parse_size("512") == 512
+    assert parse_size("1K") == 1024
+    assert parse_size("100mb") == 100 * 2**20
+    assert format_size(100 * 2**20) == "100M"
+    assert format_size(1500) == "1500"
+    assert len(corpus(5000)) == 5000
+
+def test_time_case():
+    """Test that a case is set up before every run and timed
+    """
+    calls = []
+    case = Case("test.case", lambda: calls.append("run"), size=2**20, repeat=3, setup=lambda: calls.append("setup"))
+    result = time_case(case)
+    assert calls == ["setup", "run"] * 4
+    assert result["name"] == "test.case"
+    assert result["min_s"] <= result["median_s"]
+    assert "mb_per_s" in result
+
+def test_compare():
+    """Test that only benchmarks slower than the tolerance are regressions
+    """
+    baseline = {"results": [{"name": "a", "median_s": 1.0}, {"name": "b", "median_s": 1.0}]}
+    report = {"results": [{"name": "a", "median_s": 1.1}, {"name": "b", "median_s": 2.0}, {"name": "c", "median_s": 9.0}]}
+    assert compare(report, baseline, tolerance=0.25) == [("b", 1.0, 2.0)]
@@ -0,0 +1,77 @@
+# Tests for the precompiled code library bundle
+
+import json
+import os
+import pytest
+
+from natoify import Natoify
+from natoify.natocore.bundle import BUNDLE_NAME, CodeBundle, build_bundle, load_bundle
+from natoify.natocore.registry import CodeRegistry
+
+
+@pytest.fixture
+def code_dir(tmp_path):
+    """Directory with two small code libraries (one reusing a code word)"""
+    (tmp_path / "alpha.json").write_text(json.dumps({"ALPHA": {"A": "APPLE", "B": "BANANA", "C": "APPLE"}}))
+    (tmp_path / "beta.json").write_text(json.dumps({"BETTER": {"A": "AXE", "B": "BÖW"}}))
+    return tmp_path
+
+
+def test_bundle_matches_json(code_dir):
+    """Test that the bundle holds the same forward and reverse tables as the json files
+    """
+    bundle = CodeBundle(build_bundle(str(code_dir)))
+    assert sorted(bundle.names()) == ["ALPHA", "BETTER"]
+    assert bundle.source("BETTER") == "beta.json"
+    assert bundle.forward("ALPHA") == {"A": "APPLE", "B": "BANANA", "C": "APPLE"}
+    assert bundle.forward("BETTER") == {"A": "AXE", "B": "BÖW"}
+    assert bundle.reverse("ALPHA") == {"APPLE": "C", "BANANA": "B"}
+    bundle.close()
+
+def test_bundle_library_code_lib():
+    """Test that every shipped code library survives the bundle unchanged
+    """
+    bundle = load_bundle(Natoify.CODE_LIB_DIR)
+    nato = Natoify()
+    for name in bundle.names():
+        with open(os.path.join(Natoify.CODE_LIB_DIR, bundle.source(name))) as f:
+            assert bundle.forward(name) == json.load(f)[name]
+    assert sorted(bundle.names()) == nato.list_codes()
+
+def test_bundle_rebuilt_when_stale(code_dir):
+    """Test that changing a code.json file rebuilds the bundle
+    """
+    bundle = load_bundle(str(code_dir))
+    assert bundle.forward("ALPHA")["A"] == "APPLE"
+    (code_dir / "alpha.json").write_text(json.dumps({"ALPHA": {"A": "AVOCADO!"}}))
+    (code_dir / "gamma.json").write_text(json.dumps({"GAMMA": {"A": "ARROW"}}))
+    bundle = load_bundle(str(code_dir))
+    assert bundle.forward("ALPHA") == {"A": "AVOCADO!"}
+    assert "GAMMA" in bundle.names()
+
+def test_bundle_corrupt_file_rebuilt(code_dir):
+    """Test that a damaged bundle file is replaced
+    """
+    (code_dir / BUNDLE_NAME).write_bytes(b"garbage")
+    bundle = load_bundle(str(code_dir))
+    assert sorted(bundle.names()) == ["ALPHA", "BETTER"]
+
+def test_bad_json_falls_back(code_dir):
+    """Test that an improperly formatted code.json file disables the bundle
+    """
+    (code_dir / "broken.json").write_text('{"BROKEN": {"A": ')
+    assert load_bundle(str(code_dir)) is None
+    registry = CodeRegistry()
+    registry.index(str(code_dir))
+    assert registry["ALPHA"]["B"] == "BANANA"
+    with pytest.raises(json.decoder.JSONDecodeError):
+        registry["BROKEN"]
+
+def test_registry_uses_bundle(code_dir):
+    """Test that the registry serves libraries and reverse tables from the bundle
+    """
+    registry = CodeRegistry()
+    registry.index(str(code_dir))
+    assert (code_dir / BUNDLE_NAME).exists()
+    assert registry["BETTER"]["B"] == "BÖW"
+    assert registry.reverse("ALPHA")["APPLE"] == "C"
@@ -0,0 +1,76 @@
+# Tests for the on-disk cache of chatGPT replies
+
+import os
+
+from natoify.natocore import ResponseCache
+
+messages = [{"role": "system", "content": "Be nice"}, {"role": "user", "content": "Hi"}]
+
+
+def test_key():
+    """Test that the key depends on the model, the messages and the parameters
+    """
+    key = ResponseCache.key("gpt-3.5-turbo", messages)
+    assert key == ResponseCache.key("gpt-3.5-turbo", [dict(m) for m in messages])
+    assert key != ResponseCache.key("gpt-4", messages)
+    assert key != ResponseCache.key("gpt-3.5-turbo", messages[1:])
+    assert key != ResponseCache.key("gpt-3.5-turbo", messages, temperature=0.5)
+    assert len(key) == 64
+
+def test_get_put(tmp_path):
+    """Test that cached replies are found again, and the hits and misses counted
+    """
+    cache = ResponseCache(str(tmp_path))
+    key = ResponseCache.key("gpt-3.5-turbo", messages)
+    assert cache.get(key) is None
+    cache.put(key, "Hello! ✓")
+    assert cache.get(key) == "Hello! ✓"
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert os.listdir(tmp_path) == [f"{key}.json"]
+
+def test_persistent(tmp_path):
+    """Test that replies are read back from disk by a new cache (ex- filled beforehand)
+    """
+    ResponseCache(str(tmp_path)).put("abc", "Cached reply")
+    cache = ResponseCache(str(tmp_path), memory_entries=1)
+    assert cache.get("abc") == "Cached reply"
+    cache.put("def", "Other reply")
+    # "abc" is no longer in memory, it is read from disk again
+    assert cache.get("abc") == "Cached reply"
+    assert cache.hits == 2
+
+def test_size_eviction(tmp_path):
+    """Test that the least recently used replies are evicted past max_bytes
+    """
+    reply = "x" * 100
+    cache = ResponseCache(str(tmp_path), max_bytes=350)
+    for key in ("a", "b", "c"):
+        cache.put(key, reply)
+    cache.get("a")
+    cache.put("d", reply)
+
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "c.json", "d.json"]
+    assert cache.get("b") is None
+    assert cache.get("a") == reply
+
+def test_size_eviction_new_cache(tmp_path):
+    """Test that a new cache evicts the files used least recently (oldest modification time)
+    """
+    reply = "x" * 100
+    cache = ResponseCache(str(tmp_path))
+    for (i, key) in enumerate(("a", "b", "c")):
+        cache.put(key, reply)
+        os.utime(tmp_path / f"{key}.json", ns=(i, 3 - i))
+
+    cache = ResponseCache(str(tmp_path), max_bytes=350)
+    cache.put("d", reply)
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "b.json", "d.json"]
+
+def test_clear(tmp_path):
+    """Test that clear removes every cached reply
+    """
+    cache = ResponseCache(str(tmp_path))
+    cache.put("abc", "Cached reply")
+    cache.clear()
+    assert os.listdir(tmp_path) == []
+    assert cache.get("abc") is None
@@ -0,0 +1,172 @@
+# Tests for the indexed store of saved chat sessions
+
+import json
+import os
+
+import pytest
+
+from natoify.natocore.chatstore import ChatLogStore
+
+
+def make_messages(n):
+    """A system message and n user messages"""
+    return [{"role": "system", "content": "Be nice"}] + [{"role": "user", "content": f"msg {i}"} for i in range(n)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChatLogStore(str(tmp_path / "chat_logs.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_save_and_load(store):
+    """Test that a saved session is indexed and loaded back in order
+    """
+    messages = make_messages(3)
+    messages[1]["name"] = "bob"
+    assert store.save_session("chat_1", messages, [1, 2, 3, 4], created=100.0) == "chat_1"
+
+    session = store.session("chat_1")
+    assert (session.name, session.created, session.updated) == ("chat_1", 100.0, 100.0)
+    assert (session.message_count, session.token_total) == (4, 10)
+    assert store.load_messages("chat_1") == messages
+    assert store.load_messages("chat_1", offset=1, limit=2) == messages[1:3]
+    assert store.session("chat_2") is None
+    with pytest.raises(KeyError):
+        store.load_messages("chat_2")
+
+def test_unique_names(store):
+    """Test that a taken session name gets a numbered suffix
+    """
+    assert store.save_session("chat", make_messages(1), [1, 1]) == "chat"
+    assert store.save_session("chat", make_messages(1), [1, 1]) == "chat-1"
+    assert store.save_session("chat", make_messages(1), [1, 1]) == "chat-2"
+
+def test_append_messages(store):
+    """Test that appended messages follow the saved ones and update the index
+    """
+    messages = make_messages(4)
+    store.save_session("chat_1", messages[:2], [1, 1], created=100.0)
+    store.append_messages("chat_1", messages[2:], [2, 2, 2])
+
+    session = store.session("chat_1")
+    assert (session.message_count, session.token_total) == (5, 8)
+    assert session.updated > session.created
+    assert store.load_messages("chat_1") == messages
+    with pytest.raises(KeyError):
+        store.append_messages("chat_2", messages, [1] * 5)
+
+def test_list_sessions_pages(store):
+    """Test that sessions are listed newest first, one page at a time
+    """
+    for i in range(7):
+        store.save_session(f"chat_{i}", make_messages(1), [1, 1], created=100.0 + i // 2)
+
+    pages = []
+    last = None
+    while True:
+        page = store.list_sessions(limit=3, before=last)
+        if not page:
+            break
+        pages.append([s.name for s in page])
+        last = page[-1]
+    assert pages == [["chat_6", "chat_5", "chat_4"], ["chat_3", "chat_2", "chat_1"], ["chat_0"]]
+
+    store.append_messages("chat_0", make_messages(0), [1])
+    assert store.list_sessions(limit=1)[0].name == "chat_0"
+
+def test_import_json_logs(store, tmp_path):
+    """Test that chat logs saved as json files are imported once, skipping broken files
+    """
+    messages = make_messages(2)
+    (tmp_path / "chat_old.json").write_text(json.dumps(messages))
+    (tmp_path / "chat_broken.json").write_text('[{"role": "user", "content": "cut')
+    (tmp_path / "chat_no_role.json").write_text('[{"content": "Hi"}]')
+    (tmp_path / "chat_no_content.json").write_text('[{"role": "user", "content": null}]')
+    os.utime(tmp_path / "chat_old.json", (50.0, 50.0))
+
+    assert store.import_json_logs(str(tmp_path), lambda m: 2) == ["chat_old"]
+    assert store.import_json_logs(str(tmp_path), lambda m: 2) == []
+    session = store.session("chat_old")
+    assert (session.created, session.message_count, session.token_total) == (50.0, 3, 6)
+    assert store.load_messages("chat_old") == messages
+
+    # Files looked at are not read again, broken files are once they change
+    (tmp_path / "chat_old.json").write_text("[]")
+    assert store.import_json_logs(str(tmp_path), lambda m: 2) == []
+    (tmp_path / "chat_broken.json").write_text(json.dumps(messages))
+    os.utime(tmp_path / "chat_broken.json", (60.0, 60.0))
+    assert store.import_json_logs(str(tmp_path), lambda m: 2) == ["chat_broken"]
+    assert store.load_messages("chat_broken") == messages
+
+def test_import_json_logs_recorded(store, tmp_path, monkeypatch):
+    """Test that sessions imported before files were recorded are not imported again,
+    and that recorded files are not opened again
+    """
+    store.save_session("chat_old", make_messages(0), [1])
+    (tmp_path / "chat_old.json").write_text(json.dumps(make_messages(2)))
+    assert store.import_json_logs(str(tmp_path), lambda m: 2) == []
+    assert store.session("chat_old").message_count == 1
+
+    monkeypatch.setattr("builtins.open", lambda *args, **kwargs: pytest.fail("opened a recorded file"))
+    assert store.import_json_logs(str(tmp_path), lambda m: 2) == []
+
+def test_persistent(tmp_path):
+    """Test that sessions are kept in the database file
+    """
+    path = str(tmp_path / "chat_logs.sqlite3")
+    store = ChatLogStore(path)
+    store.save_session("chat_1", make_messages(2), [1, 1, 1])
+    store.close()
+
+    store = ChatLogStore(path)
+    assert store.load_messages("chat_1") == make_messages(2)
+    store.close()
+
+def test_search(store):
+    """Test that a search finds the messages with every word, best match first, as they are saved
+    """
+    store.save_session("chat_1", [{"role": "user", "content": "Make a pirate code library"}], [1])
+    store.save_session("chat_2", [{"role": "assistant", "content": "Library of pirate words: pirate, parrot, plank"}], [1])
+    assert store.search("library") and store.search("LIBRARY") == store.search("library")
+
+    hits = store.search("pirate library")
+    assert [(hit.session, hit.seq, hit.role) for hit in hits] == [("chat_2", 0, "assistant"), ("chat_1", 0, "user")]
+    assert "[pirate]" in hits[0].snippet and hits[0].score <= hits[1].score
+    assert store.search("pirate", limit=1)[0].session == "chat_2"
+
+    assert store.search("robot") == []
+    store.append_messages("chat_1", [{"role": "user", "content": "Now a robot one"}], [1])
+    assert [(hit.session, hit.seq) for hit in store.search("robot")] == [("chat_1", 1)]
+
+def test_search_query_syntax(store):
+    """Test that search words are matched literally, a trailing * matching a prefix
+    """
+    store.save_session("chat_1", [{"role": "user", "content": 'He said "NEAR" OR AND (x)'}], [1])
+    assert len(store.search('"near" OR AND (x')) == 1
+    assert store.search("   ") == [] and store.search("*") == []
+    assert store.search("sa") == [] and len(store.search("sa*")) == 1
+
+def test_search_index_existing_store(tmp_path):
+    """Test that messages saved before the search index existed are indexed
+    """
+    path = str(tmp_path / "chat_logs.sqlite3")
+    store = ChatLogStore(path)
+    store.save_session("chat_1", make_messages(2), [1, 1, 1])
+    store._db.executescript("DROP TABLE messages_fts; DROP TRIGGER messages_fts_insert; DROP TRIGGER messages_fts_delete;")
+    store.close()
+
+    store = ChatLogStore(path)
+    assert store.full_text
+    assert [(hit.session, hit.seq) for hit in store.search("msg 1")] == [("chat_1", 2)]
+    store.close()
+
+def test_search_without_full_text(store):
+    """Test that searching scans the messages when FTS5 is not available
+    """
+    store.full_text = False
+    store.save_session("chat_1", [{"role": "user", "content": "100% pirate"}], [1])
+    store.save_session("chat_2", [{"role": "user", "content": "1000 pirates"}], [1])
+    assert [hit.session for hit in store.search("pirate")] == ["chat_2", "chat_1"]
+    assert [hit.session for hit in store.search("0% pirate")] == ["chat_1"]
@@ -0,0 +1,68 @@
+# Tests for the immutable per-library Codec
+
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+from natoify import Natoify
+from natoify.natocore import Codec
+
+nato = Natoify()
+
+message = "Hello World. Pi is 3.14\nThis is a test message."
+
+
+def test_codec_matches_natoify():
+    """Test that a Codec encodes and decodes like Natoify with the same code
+    """
+    codec = nato.codec("redneck")
+    nato.set_code("redneck")
+    assert codec.encode(message) == nato.encode(message)
+    assert codec.encode(message, encrypt=True) == nato.encode(message, encrypt=True)
+    encoded = codec.encode(message, encrypt=True)
+    assert codec.decode(encoded, decrypt=True) == nato.decode(encoded, decrypt=True)
+    assert "".join(codec.encode_stream([message[:7], message[7:]])) == codec.encode(message)
+    nato.set_code("nato")
+
+def test_codec_is_immutable():
+    """Test that codecs and their tables can't be changed
+    """
+    codec = nato.codec("nato")
+    with pytest.raises(AttributeError):
+        codec.name = "GHETTO"
+    with pytest.raises(TypeError):
+        codec.codes_by_letter["A"] = "APPLE"
+    with pytest.raises(TypeError):
+        codec.codes_by_word["APPLE"] = "A"
+
+def test_codec_shared():
+    """Test that every Natoify instance uses the same Codec for a library
+    """
+    other = Natoify()
+    other.set_code("ghetto")
+    assert other.codec() is nato.codec("GHETTO")
+    assert other.current_code == "GHETTO"
+    assert other.codes_by_word is other.codec().codes_by_word
+
+def test_codec_from_dict():
+    """Test building a Codec from a plain dictionary
+    """
+    codec = Codec("AB", {"A": "APPLE", "B": "BANANA", " ": " "})
+    assert codec.encode("ab ba.") == "APPLE BANANA  BANANA APPLE STOP"
+    assert codec.decode("APPLE BANANA  BANANA APPLE STOP") == "AB BA."
+    assert repr(codec) == "Codec('AB')"
+
+def test_shared_engine_threads():
+    """Test one engine used by many threads while another thread switches its code
+    """
+    codes = ["NATO", "REDNECK", "GHETTO", "HARRYPOTTER"]
+    expected = {code: nato.codec(code).encode(message, True) for code in codes}
+
+    def work(i):
+        code = codes[i % len(codes)]
+        if i % 5 == 0:
+            nato.set_code(codes[i % 3])
+        return nato.encode(message, True, code) == expected[code]
+
+    with ThreadPoolExecutor(8) as executor:
+        assert all(executor.map(work, range(400)))
+    nato.set_code("nato")
@@ -0,0 +1,49 @@
+# Import time benchmark for the natoify engine
+
+import subprocess
+import sys
+
+# Cumulative import time budget for "from natoify import Natoify" (microseconds),
+# twice the measured baseline (about 30ms, best of 3) to catch regressions
+ENGINE_IMPORT_BUDGET_US = 60_000
+# Modules only needed by the GUI or chatGPT features
+HEAVY_MODULES = {"openai", "tiktoken", "tkinter", "customtkinter", "aiohttp", "requests"}
+
+
+def import_times(statement: str) -> dict:
+    """Run a statement in a fresh interpreter with -X importtime and collect
+    the cumulative import time (microseconds) of every top level module imported
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        times[name] = int(cumulative)
+    return times
+
+
+def test_engine_import_skips_heavy_modules():
+    """Test that importing the engine doesn't load the GUI or chatGPT stacks
+    """
+    times = import_times("from natoify import Natoify")
+    assert "natoify.natocore.natogpt" not in times
+    assert "natoify.natocore.chatcache" not in times
+    assert HEAVY_MODULES.isdisjoint(times)
+
+def test_engine_import_budget():
+    """Test that importing the engine stays within its time budget (best of 3 runs)
+    """
+    best = min(import_times("from natoify import Natoify")["natoify"] for _ in range(3))
+    assert best < ENGINE_IMPORT_BUDGET_US, f"natoify import took {best / 1000:.1f}ms"
+
+def test_natogpt_still_importable():
+    """Test that NatoGPT is loaded on demand from the package
+    """
+    times = import_times("from natoify import NatoGPT")
+    assert "natoify.natocore.natogpt" in times
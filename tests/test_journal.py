@@ -0,0 +1,87 @@
+# Tests for the append-only journal of the chat session in progress
+
+import os
+import time
+
+import pytest
+
+from natoify.natocore.journal import ChatJournal
+
+messages = [{"role": "system", "content": "Be nice"}, {"role": "user", "content": "Hi ✓", "name": "bob"}]
+
+
+def test_append_and_read(tmp_path):
+    """Test that journaled messages are read back with their token counts
+    """
+    path = str(tmp_path / "journal" / "chat_1.jsonl")
+    journal = ChatJournal(path, "chat_0")
+    for (message, tokens) in zip(messages, [3, 4]):
+        journal.append(message, tokens)
+    assert ChatJournal.read(path) == ("chat_0", messages, [3, 4])
+    journal.discard()
+    assert not os.path.exists(path)
+    journal.close()
+
+def test_continue_journal(tmp_path):
+    """Test that opening an existing journal adds to it
+    """
+    path = str(tmp_path / "chat_1.jsonl")
+    with ChatJournal(path) as journal:
+        journal.append(messages[0], 3)
+    with ChatJournal(path) as journal:
+        journal.append(messages[1], 4)
+    assert ChatJournal.read(path) == ("", messages, [3, 4])
+
+def test_journal_locked(tmp_path):
+    """Test that a journal can't be opened again until the one writing it is closed
+    """
+    path = str(tmp_path / "chat_1.jsonl")
+    with ChatJournal(path) as journal:
+        journal.append(messages[0], 3)
+        with pytest.raises(BlockingIOError):
+            ChatJournal(path)
+    with ChatJournal(path) as journal:
+        journal.discard()
+    assert not os.path.exists(path)
+
+def test_read_skips_cut_line(tmp_path):
+    """Test that a line cut short by a crash is skipped
+    """
+    path = str(tmp_path / "chat_1.jsonl")
+    with ChatJournal(path) as journal:
+        journal.append(messages[0], 3)
+    with open(path, "a") as f:
+        f.write('{"role": "user", "cont')
+    assert ChatJournal.read(path) == ("", messages[:1], [3])
+
+def test_sync_batches(tmp_path, monkeypatch):
+    """Test that messages are fsync'ed in batches, and when the journal is closed
+    """
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or fsync(fd))
+
+    with ChatJournal(str(tmp_path / "chat_1.jsonl"), sync_every=4, sync_interval=3600) as journal:
+        assert len(synced) == 1  # The header
+        for _ in range(10):
+            journal.append(messages[1], 4)
+        assert len(synced) == 1 + 2
+        journal.sync()
+        assert len(synced) == 4
+        journal.append(messages[1], 4)
+    assert len(synced) == 5
+
+def test_sync_idle(tmp_path, monkeypatch):
+    """Test that the last message is fsync'ed after sync_interval even if no other message follows
+    """
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or fsync(fd))
+
+    with ChatJournal(str(tmp_path / "chat_1.jsonl"), sync_every=4, sync_interval=0.05) as journal:
+        journal.append(messages[1], 4)
+        assert len(synced) == 1
+        deadline = time.monotonic() + 5
+        while len(synced) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(synced) == 2
@@ -0,0 +1,108 @@
+# Tests for the natocli command line interface
+
+import pytest
+from click.testing import CliRunner
+
+from natoify import Natoify
+from natoify.natocli import run
+from natoify.natocore.chatstore import ChatLogStore
+
+nato = Natoify()
+
+message = "Héllo World. Pi is 3.14\nThis is a test message. 1234. STOP\n"
+
+
+def invoke(args, input_bytes):
+    """Run natocli with stdin/stdout and return its output"""
+    result = CliRunner().invoke(run, ["-m", "-", "-o", "-"] + args, input=input_bytes)
+    assert result.exit_code == 0, result.output
+    return result.stdout_bytes.decode("utf-8")
+
+
+def test_cli_encode():
+    """Test encoding stdin to stdout
+    """
+    assert invoke([], message.encode("utf-8")) == nato.encode(message)
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 65536])
+@pytest.mark.parametrize("args", [[], ["-e"], ["-c", "redneck"]])
+def test_cli_stream_encode(chunk_size, args):
+    """Test that stream mode gives the same output (multi-byte characters split between chunks)
+    """
+    expected = invoke(args, message.encode("utf-8"))
+    streamed = invoke(args + ["--stream", "--chunk-size", str(chunk_size)], message.encode("utf-8"))
+    assert streamed == expected
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 65536])
+@pytest.mark.parametrize("args", [[], ["-e"]])
+def test_cli_stream_decode(chunk_size, args):
+    """Test that stream mode decodes the same as the default mode
+    """
+    encoded = invoke(args, message.encode("utf-8")).encode("utf-8")
+    expected = invoke(["-d"] + args, encoded)
+    streamed = invoke(["-d", "-s", "--chunk-size", str(chunk_size)] + args, encoded)
+    assert streamed == expected
+    if not args:
+        assert streamed == "HLLO WORLD. PI IS 3.14\nTHIS IS A TEST MESSAGE. 1234. STOP"
+
+def test_cli_stream_empty():
+    """Test stream mode with empty input
+    """
+    result = CliRunner().invoke(run, ["-s"], input=b"")
+    assert result.exit_code == 1
+    assert "Input cannot be empty" in result.output
+
+def test_cli_stream_error():
+    """Test that stream mode reports errors other than empty input as they are
+    """
+    result = CliRunner().invoke(run, ["-s", "--chunk-size", "1"], input=b"caf\xff")
+    assert result.exit_code == 1
+    assert "Input cannot be empty" not in result.output
+    assert "can't decode byte 0xff" in result.output
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 16, 65536])
+@pytest.mark.parametrize("args", [[], ["-e"], ["-c", "ghetto", "-e"]])
+def test_cli_jobs(chunk_size, args):
+    """Test that encoding and decoding in several processes gives the same output
+    """
+    text = (message * 5 + "   \n\n").encode("utf-8")
+    expected = invoke(args, text)
+    parallel = invoke(args + ["-j", "3", "--chunk-size", str(chunk_size)], text)
+    assert parallel == expected
+
+    expected = invoke(["-d"] + args, expected.encode("utf-8"))
+    parallel = invoke(["-d", "-j", "3", "--chunk-size", str(chunk_size)] + args, parallel.encode("utf-8"))
+    assert parallel == expected
+
+@pytest.mark.parametrize("args", [[], ["-s", "--chunk-size", "3"], ["-j", "2"]])
+@pytest.mark.parametrize("encrypt", [[], ["-e"]])
+def test_cli_decode_auto(args, encrypt):
+    """Test decoding with the code library (and encryption) detected from the message
+    """
+    encoded = invoke(["-c", "redneck"] + encrypt, message.encode("utf-8")).encode("utf-8")
+    expected = invoke(["-d", "-c", "redneck"] + encrypt, encoded)
+    assert invoke(["-d", "-c", "auto"] + args, encoded) == expected
+
+def test_cli_encode_auto():
+    """Test that the code can't be detected when encoding
+    """
+    result = CliRunner().invoke(run, ["-c", "auto"], input=b"Hello")
+    assert result.exit_code == 1
+    assert "only be used when decoding" in result.output
+
+def test_cli_search_chats(tmp_path, monkeypatch):
+    """Test that --search-chats lists the matching saved chat messages
+    """
+    path = tmp_path / "chat_logs.sqlite3"
+    monkeypatch.setattr("natoify.natocli.CHAT_LOG_STORE", str(path))
+    result = CliRunner().invoke(run, ["--search-chats", "pirate"])
+    assert result.exit_code == 0 and "No saved chat logs" in result.output
+
+    store = ChatLogStore(str(path))
+    store.save_session("chat_1", [{"role": "user", "content": "Make a pirate code"}], [1])
+    store.close()
+    result = CliRunner().invoke(run, ["--search-chats", "pirate"])
+    assert result.exit_code == 0
+    assert result.output == "chat_1 [user #0]\n\tMake a [pirate] code\n"
+    result = CliRunner().invoke(run, ["--search-chats", "robot"])
+    assert "No saved chat log found for 'robot'" in result.output
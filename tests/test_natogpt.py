@@ -0,0 +1,518 @@
+# Tests for the chatGPT client, run against a local stub of the openai api (no network)
+
+import asyncio
+import json
+import os
+import re
+import threading
+import types
+
+import pytest
+from aiohttp import web
+
+from natoify.natocore import natogpt, ResponseCache
+from natoify.natocore.journal import ChatJournal
+from natoify.natocore.natogpt import NatoGPT
+
+
+class StubServer:
+    """A local stand-in for the openai chat completions api, running on its own
+    event loop thread. Replies echo the last prompt after an optional delay,
+    streamed replies are sent as server-sent events, one word per chunk."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []  # Messages of every request received
+        self.peers = set()  # Client (host, port) of every connection used
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        self.requests.append(body["messages"])
+        self.peers.add(request.transport.get_extra_info("peername"))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        reply = f"echo: {body['messages'][-1]['content']}"
+        if body.get("stream"):
+            return await self.stream(request, reply)
+        return web.json_response({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": reply}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    async def stream(self, request, reply):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        deltas = [{"role": "assistant"}] + [{"content": word} for word in re.findall(r"\S+\s*", reply)]
+        for delta in deltas + [{}]:
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None if delta else "stop"}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    def start(self) -> str:
+        self.thread.start()
+        port = asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        return f"http://127.0.0.1:{port}/v1"
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    server.url = server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(autouse=True)
+def offline_tokenizer(monkeypatch):
+    """tiktoken downloads its encodings, count words instead (and the texts encoded)"""
+    encoded = []
+
+    def encode(text):
+        encoded.append(text)
+        return text.split()
+
+    encoding = types.SimpleNamespace(encode=encode)
+    fake = types.SimpleNamespace(encoding_for_model=lambda model: encoding,
+                                 get_encoding=lambda name: encoding)
+    monkeypatch.setattr(natogpt, "tiktoken", fake)
+    natogpt._encoding.cache_clear()
+    yield encoded
+    natogpt._encoding.cache_clear()
+
+
+def test_add_to_chat(stub_server):
+    """Test that add_to_chat sends the history and keeps the reply
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url)
+    assert chat.add_to_chat("Hello there") == ("Hello there", "echo: Hello there")
+    assert chat.messages[-1] == {"role": "assistant", "content": "echo: Hello there"}
+    assert stub_server.requests[0][0]["role"] == "system"
+    assert stub_server.requests[0][-1] == {"role": "user", "content": "Hello there"}
+    assert chat.current_tokens > 0
+
+def test_add_to_chat_empty_message():
+    """Test that an empty message is not sent
+    """
+    chat = NatoGPT("sk-test", api_base="http://127.0.0.1:9/v1")
+    assert chat.add_to_chat("") == ("", "")
+    assert len(chat.messages) == 1
+
+def test_aadd_to_chat(stub_server):
+    """Test that aadd_to_chat gives the same replies as add_to_chat
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url)
+
+    async def talk():
+        replies = [await chat.aadd_to_chat("One"), await chat.aadd_to_chat("Two")]
+        await chat.aclose()
+        return replies
+
+    assert asyncio.run(talk()) == [("One", "echo: One"), ("Two", "echo: Two")]
+    assert [m["content"] for m in stub_server.requests[1][1:]] == ["One", "echo: One", "Two"]
+    assert len(chat.all_messages) == 5
+
+def test_aadd_to_chat_takes_turns(stub_server):
+    """Test that concurrent calls take turns, each prompt followed by its own reply,
+    over pooled connections
+    """
+    stub_server.delay = 0.05
+    chat = NatoGPT("sk-test", api_base=stub_server.url, max_requests=2)
+
+    async def talk():
+        replies = await asyncio.gather(*(chat.aadd_to_chat(f"Message {i}") for i in range(6)))
+        await chat.aclose()
+        return replies
+
+    replies = asyncio.run(talk())
+    assert [reply for (_, reply) in replies] == [f"echo: Message {i}" for i in range(6)]
+    assert len(stub_server.requests) == 6
+    assert stub_server.max_in_flight == 1
+    assert len(stub_server.peers) == 1
+    turns = chat.messages[1:]
+    assert len(turns) == 12
+    for (prompt, reply) in zip(turns[::2], turns[1::2]):
+        assert prompt["role"] == "user" and reply == {"role": "assistant", "content": f"echo: {prompt['content']}"}
+    # Every request was sent with the previous turns of the conversation
+    assert [len(messages) for messages in stub_server.requests] == [2, 4, 6, 8, 10, 12]
+
+def test_aadd_to_chat_timeout(stub_server):
+    """Test that a request gives up after request_timeout seconds
+    """
+    stub_server.delay = 1.0
+    chat = NatoGPT("sk-test", api_base=stub_server.url, request_timeout=0.1)
+
+    async def talk():
+        try:
+            await chat.aadd_to_chat("Too slow")
+        finally:
+            await chat.aclose()
+
+    with pytest.raises(Exception):
+        asyncio.run(talk())
+
+def test_aadd_to_chat_new_event_loop(stub_server):
+    """Test that the http session is recreated when used from another event loop,
+    the old one being closed with its loop
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url)
+    assert asyncio.run(chat.aadd_to_chat("First"))[1] == "echo: First"
+    first = chat._session
+    assert first.closed
+    assert asyncio.run(chat.aadd_to_chat("Second"))[1] == "echo: Second"
+    assert chat._session is not first and chat._session.closed
+
+def test_close_session_of_running_loop(stub_server):
+    """Test that close() closes the http session on the event loop running in another thread
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    chat = NatoGPT("sk-test", api_base=stub_server.url)
+    assert asyncio.run_coroutine_threadsafe(chat.aadd_to_chat("Hi"), loop).result(5)[1] == "echo: Hi"
+    session = chat._session
+    chat.close()
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop).result(5)
+    assert session.closed
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+def test_stream_chat(stub_server):
+    """Test that stream_chat yields the reply piece by piece and keeps the whole reply
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url)
+    assert list(chat.stream_chat("Stream this reply")) == ["echo: ", "Stream ", "this ", "reply"]
+    assert chat.messages[-1] == {"role": "assistant", "content": "echo: Stream this reply"}
+    assert list(chat.stream_chat("")) == []
+
+def test_stream_chat_closed_early(stub_server):
+    """Test that the part of the reply received is kept when the stream is closed early
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url)
+    stream = chat.stream_chat("Stop me early")
+    assert next(stream) == "echo: "
+    stream.close()
+    assert chat.messages[-2:] == [{"role": "user", "content": "Stop me early"},
+                                  {"role": "assistant", "content": "echo: "}]
+
+def test_astream_chat(stub_server):
+    """Test that astream_chat yields the same pieces as stream_chat
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url)
+
+    async def talk():
+        pieces = [delta async for delta in chat.astream_chat("Stream this reply")]
+        await chat.aclose()
+        return pieces
+
+    assert asyncio.run(talk()) == ["echo: ", "Stream ", "this ", "reply"]
+    assert chat.messages[-1] == {"role": "assistant", "content": "echo: Stream this reply"}
+
+def test_num_tokens_from_messages():
+    """Test the token count of messages for each chat format
+    """
+    chat = NatoGPT("sk-test")
+    messages = [{"role": "system", "content": "Be nice"},
+                {"role": "user", "name": "bob", "content": "Hi there you"}]
+    # Per message overhead + words of every value (+ name overhead) + reply priming
+    assert chat.num_tokens_from_messages(messages) == (4 + 1 + 2) + (4 + 1 + 1 + 3 - 1) + 3
+    assert chat.num_tokens_from_messages(messages, "gpt-3.5-turbo") == 18
+    assert chat.num_tokens_from_messages(messages, "gpt-4") == (3 + 1 + 2) + (3 + 1 + 1 + 3 + 1) + 3
+    # Other models are counted as gpt-4
+    assert chat.num_tokens_from_messages(messages, "gpt-4o-mini") == chat.num_tokens_from_messages(messages, "gpt-4")
+
+def test_token_counts_bounded(monkeypatch):
+    """Test that the token counts kept are bounded and cleared with a new session
+    """
+    monkeypatch.setattr(natogpt, "TOKEN_COUNT_ENTRIES", 3)
+    chat = NatoGPT("sk-test")
+    for i in range(5):
+        chat.num_tokens_from_message({"role": "user", "content": f"Message {i}"})
+    chat.num_tokens_from_message({"role": "user", "content": "Message 2"})
+    assert [key[-1][1] for key in chat._token_counts] == ["Message 3", "Message 4", "Message 2"]
+    chat.set_new_session()
+    assert not chat._token_counts
+
+def test_token_count_incremental(stub_server, offline_tokenizer):
+    """Test that each message is only tokenized once and the running total stays exact
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url)
+    for i in range(5):
+        chat.add_to_chat(f"Message number {i}")
+
+    # system prompt + 5 prompts and 5 replies, 2 values (role and content) each
+    assert len(offline_tokenizer) == 2 * 11
+    offline_tokenizer.clear()
+    chat.add_to_chat("One more")
+    assert len(offline_tokenizer) == 2 * 2
+    assert chat.current_tokens == NatoGPT("sk-test").num_tokens_from_messages(chat.messages)
+
+def chat_turns(n):
+    """n prompt/reply pairs of 8 tokens each (with the word counting tokenizer)"""
+    turns = []
+    for i in range(n):
+        turns.append({"role": "user", "content": f"prompt {i} words"})
+        turns.append({"role": "assistant", "content": f"reply {i} words"})
+    return turns
+
+def test_trim_messages():
+    """Test that trimming keeps the system message and drops only the oldest turns needed
+    """
+    chat = NatoGPT("sk-test", max_context_tokens=60)
+    messages = chat.messages + chat_turns(5) + [{"role": "user", "content": "last prompt"}]
+    trimmed = chat.trim_messages(messages)
+
+    assert trimmed[0] == messages[0]
+    assert trimmed[-1] == messages[-1]
+    assert trimmed[1]["role"] == "user"
+    assert trimmed == messages[:1] + messages[-len(trimmed) + 1:]
+    assert chat.num_tokens_from_messages(trimmed) <= 60
+    # One more message would not fit (and a reply is never kept without its prompt)
+    assert chat.num_tokens_from_messages(messages[:1] + messages[-len(trimmed) - 1:]) > 60
+    assert chat.trim_messages(messages[:3]) == messages[:3]
+
+def test_trim_messages_keeps_last_message():
+    """Test that the last message is kept even when it does not fit
+    """
+    chat = NatoGPT("sk-test", max_context_tokens=10)
+    messages = chat.messages + chat_turns(2)
+    assert chat.trim_messages(messages) == [messages[0], messages[-1]]
+
+def test_trim_messages_summarize():
+    """Test that the summarize hook replaces the dropped messages with a summary
+    """
+    summarized = []
+
+    def summarize(messages):
+        summarized.append(messages)
+        return f"{len(messages)} messages"
+
+    chat = NatoGPT("sk-test", max_context_tokens=60, summarize=summarize)
+    messages = chat.messages + chat_turns(5)
+    trimmed = chat.trim_messages(messages)
+
+    assert trimmed[0] == messages[0]
+    assert trimmed[1] == {"role": "system", "content": f"{len(summarized[0])} messages"}
+    assert summarized[0] + trimmed[2:] == messages[1:]
+    assert chat.num_tokens_from_messages(trimmed) <= 60
+
+def test_add_to_chat_trims_context(stub_server):
+    """Test that prompts are sent with the system message and the newest turns that fit
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url, max_context_tokens=60)
+    for i in range(6):
+        chat.add_to_chat(f"prompt {i} words")
+    sent = stub_server.requests[-1]
+    assert sent[0]["role"] == "system"
+    assert sent[-1] == {"role": "user", "content": "prompt 5 words"}
+    assert chat.num_tokens_from_messages(sent) <= 60
+    assert len(sent) < len(chat.all_messages)
+    assert chat.current_tokens == chat.num_tokens_from_messages(chat.messages)
+
+def test_load_chat_log_trims_context(tmp_path):
+    """Test that a loaded chat log is trimmed like a chat session
+    """
+    messages = [{"role": "system", "content": "Be nice"}] + chat_turns(10)
+    (tmp_path / "chat_test.json").write_text(json.dumps(messages))
+    chat = NatoGPT("sk-test", max_context_tokens=60)
+    chat.CHAT_LOG_DIR = str(tmp_path)
+
+    text = chat.load_chat_log("chat_test")
+    assert "prompt 0 words" in text
+    assert chat.all_messages == messages
+    assert chat.messages == chat.trim_messages(messages)
+    assert chat.messages[0] == messages[0]
+
+def test_save_and_load_chat_log(stub_server, tmp_path):
+    """Test that a saved session is listed and loaded, and that continuing it appends to it
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url)
+    chat.CHAT_LOG_DIR = str(tmp_path)
+    chat.save_chat_log()
+    assert chat.get_chat_logs() == []
+
+    chat.add_to_chat("Hello")
+    chat.save_chat_log()
+    name = chat.session_name
+    assert chat.get_chat_logs() == [name]
+    assert chat.chat_store.session(name).message_count == 3
+
+    chat.set_new_session()
+    text = chat.load_chat_log(name)
+    assert text.startswith("Hello\n")
+    chat.add_to_chat("Again")
+    chat.save_chat_log()
+    chat.save_chat_log()
+    assert chat.get_chat_logs() == [name]
+    assert [m["content"] for m in chat.chat_store.load_messages(name)[1:]] == \
+        ["Hello", "echo: Hello", "Again", "echo: Again"]
+
+def test_load_chat_log_last_messages(tmp_path):
+    """Test that only the system message and the last messages of a long session are loaded
+    """
+    chat = NatoGPT("sk-test")
+    chat.CHAT_LOG_DIR = str(tmp_path)
+    messages = [{"role": "system", "content": "Be nice"}] + chat_turns(10)
+    chat.chat_store.save_session("chat_long", messages, [1] * len(messages))
+
+    text = chat.load_chat_log("chat_long", max_messages=4)
+    assert chat.all_messages == messages[:1] + messages[-4:]
+    assert text.startswith("(17 earlier messages not shown)")
+    assert "prompt 8 words" in text and "prompt 7 words" not in text
+
+def test_get_chat_logs_pages(tmp_path):
+    """Test that saved sessions are listed a page at a time, newest first
+    """
+    chat = NatoGPT("sk-test")
+    chat.CHAT_LOG_DIR = str(tmp_path)
+    for i in range(5):
+        chat.chat_store.save_session(f"chat_{i}", chat_turns(1), [1, 1], created=100.0 + i)
+    assert chat.get_chat_logs(2) == ["chat_4", "chat_3"]
+    assert chat.get_chat_logs(2, "chat_3") == ["chat_2", "chat_1"]
+    assert chat.get_chat_logs(2, "chat_1") == ["chat_0"]
+
+def test_search_chat_logs(stub_server, tmp_path):
+    """Test that the messages of saved sessions are found by a search
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url)
+    chat.CHAT_LOG_DIR = str(tmp_path)
+    chat.add_to_chat("Make a pirate code library")
+    assert chat.search_chat_logs("pirate") == []
+    chat.save_chat_log()
+    hits = chat.search_chat_logs("pirate library")
+    assert {hit.session for hit in hits} == {chat.session_name}
+    assert sorted((hit.seq, hit.role) for hit in hits) == [(1, "user"), (2, "assistant")]
+
+def test_cached_replies(stub_server, tmp_path):
+    """Test that a repeated conversation is answered from the cache without an api call
+    """
+    cache = ResponseCache(str(tmp_path))
+    for _ in range(2):
+        chat = NatoGPT("sk-test", api_base=stub_server.url, cache=cache)
+        assert chat.add_to_chat("Make a code library")[1] == "echo: Make a code library"
+        assert "".join(chat.stream_chat("Again")) == "echo: Again"
+    assert len(stub_server.requests) == 2
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    # The same prompt later in another conversation is a different request
+    chat.add_to_chat("Make a code library")
+    assert len(stub_server.requests) == 3
+
+def test_cached_replies_offline(tmp_path):
+    """Test that a cache filled beforehand answers without a server
+    """
+    chat = NatoGPT("sk-test", api_base="http://127.0.0.1:9/v1", cache=ResponseCache(str(tmp_path)))
+    key = ResponseCache.key(chat.model, chat.messages + [{"role": "user", "content": "Hello"}])
+    chat.cache.put(key, "Hi from the cache")
+
+    assert chat.add_to_chat("Hello") == ("Hello", "Hi from the cache")
+    assert chat.messages[-1] == {"role": "assistant", "content": "Hi from the cache"}
+
+    chat.set_new_session()
+    assert asyncio.run(chat.aadd_to_chat("Hello"))[1] == "Hi from the cache"
+    chat.set_new_session()
+    assert list(chat.stream_chat("Hello")) == ["Hi from the cache"]
+    assert chat.cache.hits == 3
+
+def test_partial_stream_not_cached(stub_server, tmp_path):
+    """Test that a stream closed early is not cached
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url, cache=ResponseCache(str(tmp_path)))
+    stream = chat.stream_chat("Stop me early")
+    next(stream)
+    stream.close()
+    assert os.listdir(tmp_path) == []
+
+def test_journal(stub_server, tmp_path):
+    """Test that messages are journaled as they are produced and the journal compacted on save
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url, journal=True)
+    chat.CHAT_LOG_DIR = str(tmp_path)
+    chat.add_to_chat("Hello")
+    path = chat._journal.path
+    assert ChatJournal.read(path)[1] == chat.all_messages
+
+    chat.save_chat_log()
+    assert not os.path.exists(path)
+    chat.add_to_chat("Again")
+    assert ChatJournal.read(chat._journal.path) == (chat.session_name, chat.all_messages[-2:], [6, 7])
+    chat.close()
+
+def test_recover_chat_logs(stub_server, tmp_path):
+    """Test that the sessions left in the journal by a crash are saved on the next start
+    """
+    crashed = NatoGPT("sk-test", api_base=stub_server.url, journal=True)
+    crashed.CHAT_LOG_DIR = str(tmp_path)
+    crashed.add_to_chat("Lost session")
+    journal_name = os.path.splitext(os.path.basename(crashed._journal.path))[0]
+
+    saved = NatoGPT("sk-test", api_base=stub_server.url, journal=True)
+    saved.CHAT_LOG_DIR = str(tmp_path)
+    saved.add_to_chat("Saved session")
+    saved.save_chat_log()
+    saved.add_to_chat("Lost messages")
+
+    running = NatoGPT("sk-test", api_base=stub_server.url, journal=True)
+    running.CHAT_LOG_DIR = str(tmp_path)
+    running.add_to_chat("Still running")
+
+    # A crash releases the lock of the journals without removing them
+    crashed._journal.close()
+    saved._journal.close()
+
+    chat = NatoGPT("sk-test", journal=True)
+    chat.CHAT_LOG_DIR = str(tmp_path)
+    recovered = chat.recover_chat_logs()
+    assert len(recovered) == 2 and saved.session_name in recovered
+    # Saved under the name of its journal (with a suffix if the name was taken meanwhile)
+    new_name = [name for name in recovered if name != saved.session_name][0]
+    assert new_name.startswith(journal_name)
+    assert chat.chat_store.load_messages(new_name) == crashed.all_messages
+    assert chat.chat_store.load_messages(saved.session_name) == saved.all_messages
+    # The journal of the instance still running is left alone
+    assert os.path.exists(running._journal.path)
+    assert chat.recover_chat_logs() == []
+
+    for instance in (crashed, saved, running, chat):
+        instance.close()
+
+def test_journal_dropped_with_session(stub_server, tmp_path):
+    """Test that the journal of an unsaved session is dropped with it
+    """
+    chat = NatoGPT("sk-test", api_base=stub_server.url, journal=True)
+    chat.CHAT_LOG_DIR = str(tmp_path)
+    chat.add_to_chat("Hello")
+    chat.set_new_session()
+    chat.add_to_chat("Hello again")
+    chat.close()
+    assert os.listdir(tmp_path / "journal") == []
@@ -15,6 +15,7 @@ nato_out_lower = "tango hotel india sierra  india sierra  alfa  tango echo sierr
 nato_out_encrypt = "APAP RACSO OGNAT ARREIS  POTS RUOF EERHT OWT ENO  POTS OHCE FLOG AFLA ARREIS ARREIS OHCE EKIM  OGNAT ARREIS OHCE OGNAT  AFLA  ARREIS AIDNI  ARREIS AIDNI LETOH OGNAT"
 symb_output = "EXCLAMARK AT HASHTAG DOLLARSIGN PERCENT CARET AMPERSAND ASTERISK LEFTPAREN RIGHTPAREN UNDERSCORE PLUS EQUAL DASH APOSTROPHE QUOTMARK COLON SEMICOLON QUESTMARK SLASH POINT COMMA GREATERTHAN LESSTHAN BACKSLASH PIPE BACKTICK TILDE LEFTSQUARE RIGHTSQUARE LEFTCURLY RIGHTCURLY"
 numb_output = "ONE TWO THREE FOUR FIVE  SIX SEVEN EIGHT NINE ZERO"
+period_output = "PAPA INDIA  INDIA SIERRA  THREE POINT ONE FOUR STOP  TANGO HOTEL ECHO  ECHO NOVEMBER DELTA STOP \n NOVEMBER ECHO WHISKEY  LIMA INDIA NOVEMBER ECHO POINT POINT STOP"
 vulgar_output = "HOE EATME LAMEASS LAMEASS OHSNAP  WHODAT OHSNAP RIMJOB LAMEASS DOUCHBAG OSHIT"
 
 def test_nato_encode():
@@ -141,6 +142,21 @@ def test_nato_decode_lowercase():
     message = nato.decode(nato_message)
     assert message == "THIS IS A TEST MESSAGE. 1234. STOP"
 
+def test_nato_encode_periods():
+    """Test the encode function with sentence ending and inline periods
+    """
+    # Test message
+    message = "Pi is 3.14. The end.\nNew line..."
+    nato_message = nato.encode(message)
+    assert nato_message == period_output
+
+def test_nato_encode_unknown_char():
+    """Test the encode function with a character missing from the code library
+    """
+    # Test message
+    with pytest.raises(KeyError):
+        nato.encode("Hello\rWorld")
+
 def test_nato_encode_vulgar():
     """Test the encode function with vulgar codes
     """
@@ -177,3 +193,83 @@ def test_nato_wrong_code_lib():
     assert current_code == "NATO"
 
 
+
+def test_vigenere_cipher_quirks():
+    """Test that spaces pass through (still using a key letter) and any other
+    non-letter becomes a letter
+    """
+    # N=13 A=0 T=19 O=14, the space uses the key letter T
+    assert nato.vigenere_cipher("AA AA", "NATO", encrypt=True) == "NA ON"
+    assert nato.vigenere_cipher("1\né", "NATO", encrypt=True) == "MZS"
+    assert nato.vigenere_cipher("BB", "NATO", encrypt=True, offset=1) == "BU"
+    encrypted = nato.vigenere_cipher("HOTEL ECHO", "NATO", encrypt=True)
+    assert nato.vigenere_cipher(encrypted, "NATO", encrypt=False) == "HOTEL ECHO"
+
+def test_nato_decode_spacing():
+    """Test that extra spaces, blank lines and unknown code words are skipped
+    """
+    nato.set_code('nato')
+    message = nato.decode("  hotel echo   \n\n  lima  XX  lima XX oscar\nZULU ")
+    assert message == "HE\nL LO\nZ"
+    # Tabs between code words are decoded
+    assert nato.decode("LIMA \t OSCAR") == "L\tO"
+
+def test_nato_decode_compact():
+    """Test decoding a message written without spaces between code words
+    """
+    nato.set_code('nato')
+    assert nato.can_decode_compact()
+    assert nato.decode("HOTELECHO LIMALIMA\nOSCARSTOP", compact=True) == "HELLO."
+    assert nato.can_decode_compact("america") is False
+    nato.set_code('america')
+    with pytest.raises(ValueError):
+        nato.decode("ALFA", compact=True)
+
+def test_nato_detect_code():
+    """Test that the code library of a message is detected
+    """
+    text = "The quick brown fox jumps over the lazy dog. 0123456789"
+    nato.set_code('nato')
+    for code in ["REDNECK", "GHETTO", "HARRYPOTTER", "NATO"]:
+        encoded = nato.encode_many([text], code)[0]
+        assert nato.detect_code(encoded) == code
+        assert nato.decode(encoded, code="auto") == text.upper()
+    assert nato.current_code == "NATO"
+    assert nato.detect_code("1234 &&&") == ""
+
+def test_nato_detect_encryption():
+    """Test that the code library and encryption of a message are detected
+    """
+    text = "The quick brown fox jumps over the lazy dog. 0123456789"
+    nato.set_code('nato')
+    for code in ["REDNECK", "GHETTO", "NATO"]:
+        for encrypt in [False, True]:
+            encoded = nato.encode_many([text], code, encrypt)[0]
+            detection = nato.detect_encryption(encoded)
+            assert (detection.code, detection.encrypted) == (code, encrypt)
+            assert detection.confidence > 0.9
+            assert nato.decode(encoded, code="auto") == nato.decode(encoded, encrypt, code=code)
+    assert nato.detect_encryption("1234 &&&").code == ""
+
+def test_nato_set_code_shared_tables():
+    """Test that code tables are built once and shared by every instance
+    """
+    other = Natoify()
+    nato.set_code('redneck')
+    other.set_code('redneck')
+    assert nato.codes_by_word is other.codes_by_word
+    with pytest.raises(TypeError):
+        nato.codes_by_word["ALFA"] = "A"
+
+def test_nato_encode_explicit_code():
+    """Test encoding with a given code from several threads, without changing the current code
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    nato.set_code('nato')
+    codes = ["NATO", "REDNECK", "GHETTO", "HARRYPOTTER"] * 25
+    expected = {code: nato.encode_many(["Hello World."], code, True)[0] for code in set(codes)}
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda code: nato.encode("Hello World.", True, code), codes))
+    assert results == [expected[code] for code in codes]
+    assert nato.current_code == "NATO"
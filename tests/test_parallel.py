@@ -0,0 +1,66 @@
+# Tests for the multi-core encoding and decoding of large messages
+
+import pytest
+
+from natoify import Natoify
+from natoify.natocore import parallel
+from natoify.natocore.parallel import _cut_shards, decode_parallel, encode_parallel
+
+nato = Natoify()
+
+# A single long line (no line breaks to cut the NATO message at) with runs of periods
+line = "Pi is 3.14... and more... " * 40 + "." * 50 + " The end."
+
+
+def split_every(text, size):
+    """Split text into chunks of a given size"""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_cut_shards_scans_new_text():
+    """Test that each chunk is searched once for a place to cut, and that a shard
+    without one is cut by force
+    """
+    scanned = []
+
+    def cut(text):
+        scanned.append(len(text))
+        return text.rfind("\n") + 1
+
+    chunks = ["x" * 10] * 100 + ["\n"]
+    shards = list(_cut_shards(chunks, 20, cut, lambda text: len(text)))
+    assert "".join(shards) == "".join(chunks)
+    assert max(scanned) == 11
+    assert max(map(len, shards)) == 20 * parallel.MAX_SHARD_FACTOR
+
+    # Without a place to cut by force the shard goes on to the end
+    shards = list(_cut_shards(chunks, 20, cut, lambda text: 0))
+    assert shards == ["".join(chunks)]
+
+
+@pytest.mark.parametrize("encrypt", [False, True])
+@pytest.mark.parametrize("code", ["NATO", "REDNECK"])
+def test_long_line(encrypt, code):
+    """Test that a message without places to cut gives the same output as the stream functions
+    """
+    codec = nato.codec(code)
+    expected = "".join(codec.encode_stream([line], encrypt))
+    assert "".join(encode_parallel(split_every(line, 7), code, encrypt, jobs=2, shard_size=16)) == expected
+
+    decoded = "".join(codec.decode_stream([expected], encrypt))
+    chunks = split_every(expected, 5)
+    assert "".join(decode_parallel(chunks, code, encrypt, jobs=2, shard_size=16)) == decoded
+    # Some line breaks, so shards are cut both ways
+    multi_line = expected.replace("  ", "\n", 3) if not encrypt else expected
+    decoded = "".join(codec.decode_stream([multi_line], encrypt))
+    assert "".join(decode_parallel(split_every(multi_line, 5), code, encrypt, jobs=2, shard_size=16)) == decoded
+
+def test_map_batch_code(monkeypatch):
+    """Test that the worker processes load the code of the caller
+    """
+    loaded = []
+    monkeypatch.setattr(parallel, "ProcessPoolExecutor",
+                        lambda **kwargs: loaded.append(kwargs["initargs"]) or pytest.fail())
+    with pytest.raises(BaseException):
+        parallel.map_batch("encode_many", ["A"], ["REDNECK"], False, 2, "redneck")
+    assert loaded == [("REDNECK",)]
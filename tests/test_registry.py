@@ -0,0 +1,106 @@
+# Tests for the code library registry
+
+import json
+import pytest
+
+from natoify import Natoify
+from natoify.natocore.registry import CodeRegistry
+
+
+@pytest.fixture
+def code_dir(tmp_path):
+    """Directory with two small code libraries (one with a name differing from its file)"""
+    (tmp_path / "alpha.json").write_text(json.dumps({"ALPHA": {"A": "APPLE", "B": "BANANA"}}))
+    (tmp_path / "beta.json").write_text(json.dumps({"BETTER": {"A": "AXE", "B": "BOW"}}))
+    return tmp_path
+
+
+def test_index_reads_names_only(code_dir):
+    """Test that indexing finds library names without parsing the code tables
+    """
+    registry = CodeRegistry()
+    names = registry.index(str(code_dir))
+    assert sorted(names) == ["ALPHA", "BETTER"]
+    assert sorted(registry) == ["ALPHA", "BETTER"]
+    assert registry._tables == {}
+
+def test_lazy_load(code_dir):
+    """Test that a library is parsed on first use only
+    """
+    registry = CodeRegistry()
+    registry.index(str(code_dir))
+    assert registry["BETTER"]["A"] == "AXE"
+    assert list(registry._tables) == ["BETTER"]
+    assert registry["BETTER"] is registry["BETTER"]
+
+def test_tables_are_read_only(code_dir):
+    """Test that parsed tables can't be changed in place
+    """
+    registry = CodeRegistry()
+    registry.index(str(code_dir))
+    with pytest.raises(TypeError):
+        registry["ALPHA"]["A"] = "AVOCADO"
+
+def test_invalidate(code_dir):
+    """Test that invalidated libraries are read again from disk
+    """
+    registry = CodeRegistry()
+    registry.index(str(code_dir))
+    assert registry["ALPHA"]["A"] == "APPLE"
+    (code_dir / "alpha.json").write_text(json.dumps({"ALPHA": {"A": "AVOCADO"}}))
+    assert registry["ALPHA"]["A"] == "APPLE"
+    registry.invalidate("ALPHA")
+    assert registry["ALPHA"]["A"] == "AVOCADO"
+
+    (code_dir / "gamma.json").write_text(json.dumps({"GAMMA": {"A": "ARROW"}}))
+    registry.index(str(code_dir))
+    assert "GAMMA" not in registry
+    registry.invalidate()
+    registry.index(str(code_dir))
+    assert "GAMMA" in registry
+
+def test_invalidate_closes_bundles(code_dir):
+    """Test that a bundle is closed once none of its libraries are read from it
+    """
+    registry = CodeRegistry()
+    registry.index(str(code_dir))
+    bundle = registry._bundles["ALPHA"]
+    registry.invalidate("ALPHA")
+    assert not bundle._mm.closed
+    assert registry.reverse("BETTER")["AXE"] == "A"
+    registry.invalidate("BETTER")
+    assert bundle._mm.closed
+
+    registry.invalidate()
+    registry.index(str(code_dir))
+    bundle = registry._bundles["ALPHA"]
+    registry.invalidate()
+    assert bundle._mm.closed
+
+def test_empty_directory(tmp_path):
+    """Test that a directory without code libraries raises an error
+    """
+    with pytest.raises(FileNotFoundError):
+        CodeRegistry().index(str(tmp_path))
+
+def test_shared_between_instances():
+    """Test that every Natoify instance shares the parsed libraries
+    """
+    nato_a, nato_b = Natoify(), Natoify()
+    nato_a.set_code("REDNECK")
+    nato_b.set_code("REDNECK")
+    assert nato_a.codes_by_letter is nato_b.codes_by_letter
+
+def test_libraries_by_word(code_dir):
+    """Test the inverted index of code words to libraries
+    """
+    (code_dir / "gamma.json").write_text(json.dumps({"GAMMA": {"A": "APPLE", "B": "BOW", " ": " "}}))
+    registry = CodeRegistry()
+    registry.index(str(code_dir))
+    index = registry.libraries_by_word()
+    assert index["APPLE"] == {"ALPHA", "GAMMA"}
+    assert index["AXE"] == {"BETTER"}
+    assert " " not in index
+    assert registry.libraries_by_word() is index
+    registry.invalidate("ALPHA")
+    assert registry.libraries_by_word() is not index
@@ -0,0 +1,65 @@
+# Tests for the streaming encode and decode functions
+
+import itertools
+import pytest
+
+from natoify import Natoify
+
+nato = Natoify()
+
+message = "This is a test message. 1234. STOP\nPi is 3.14. The end.\n\nNew line...   "
+
+
+def split_every(text, size):
+    """Split text into chunks of a given size"""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+@pytest.mark.parametrize("encrypt", [False, True])
+def test_encode_stream_matches_encode(size, encrypt):
+    """Test that the joined stream output is the same as encode, whatever the chunk size
+    """
+    nato.set_code("NATO")
+    expected = nato.encode(message, encrypt)
+    assert "".join(nato.encode_stream(split_every(message, size), encrypt)) == expected
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+@pytest.mark.parametrize("decrypt", [False, True])
+def test_decode_stream_matches_decode(size, decrypt):
+    """Test that the joined stream output is the same as decode, whatever the chunk size
+    """
+    nato.set_code("NATO")
+    nato_message = nato.encode(message, decrypt)
+    expected = nato.decode(nato_message, decrypt)
+    assert "".join(nato.decode_stream(split_every(nato_message, size), decrypt)) == expected
+
+def test_encode_stream_period_across_chunks():
+    """Test that a period at the end of a chunk waits for the next character
+    """
+    nato.set_code("NATO")
+    assert "".join(nato.encode_stream(["3.", "14"])) == "THREE POINT ONE FOUR"
+    assert "".join(nato.encode_stream(["end.", " ok"])) == "ECHO NOVEMBER DELTA STOP  OSCAR KILO"
+
+def test_encode_stream_is_lazy():
+    """Test that output is produced before the input ends
+    """
+    nato.set_code("NATO")
+    chunks = itertools.repeat("ab ")
+    stream = nato.encode_stream(chunks)
+    assert next(stream) == "ALFA BRAVO"
+    assert next(stream) == "  ALFA BRAVO"
+
+def test_stream_empty():
+    """Test the stream functions with an empty message
+    """
+    with pytest.raises(ValueError):
+        list(nato.encode_stream([]))
+    with pytest.raises(ValueError):
+        list(nato.decode_stream(["", ""]))
+
+def test_decode_stream_unencoded():
+    """Test the decode stream with a message that can't be decoded
+    """
+    nato.set_code("NATO")
+    assert list(nato.decode_stream(["HELLO ", "WORLD!"])) == [nato.decode("HELLO WORLD!")]